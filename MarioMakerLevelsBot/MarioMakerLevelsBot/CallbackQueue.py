@@ -0,0 +1,134 @@
+import enum
+import time
+import threading
+import collections
+
+
+class QueuePolicy(enum.IntEnum):
+    """Enumerates what a CallbackQueue does when it is full.
+    """
+    DropOldest = 0 # Forget the oldest pending message to make room for the new one
+    Block = 1 # Wait (at most block_timeout seconds) for room, then drop the oldest
+    Coalesce = 2 # Merge the new message with an identical pending one if possible
+
+
+class CallbackQueue(object):
+    """Gives a single callback its own bounded queue and worker thread.
+
+    The ChatListener reading thread only pushes messages in the queue,
+    the callback is called from the worker thread. A slow callback
+    only delays its own messages, never the socket reading or the other callbacks.
+    """
+
+    def __init__(self, callback, maxsize=1024, policy=QueuePolicy.DropOldest,
+                 block_timeout=0.05, coalesce_key=None):
+        """Create the queue and start its worker thread.
+
+        coalesce_key is a function computing a key from the callback arguments,
+        messages with the same key are merged when the queue is full and the policy is Coalesce.
+        By default the whole message (channel, name, message) is the key.
+        """
+        super().__init__()
+        self.callback = callback
+        self.maxsize = maxsize
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.coalesce_key = coalesce_key or (lambda args: (args[0], args[1], args[3]))
+
+        self.pending = collections.deque() # (time queued, args) tuples
+        self.pending_keys = collections.Counter() # Keys of the pending messages, for coalescing
+        self.condition = threading.Condition()
+
+        # Statistics, to see how far behind the callback is
+        self.processed = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.last_latency = 0.0 # Seconds between queuing and calling for the last message
+        self.max_latency = 0.0
+
+        self.running = True
+        self.thread = threading.Thread(target=self._main,
+                                       name="callback-{}".format(getattr(callback, "__name__", "")))
+        self.thread.setDaemon(True)
+        self.thread.start()
+
+    def put(self, *args):
+        """Queue a message for the callback.
+
+        Never waits longer than block_timeout, whatever the policy.
+        """
+        with self.condition:
+            if(len(self.pending) >= self.maxsize):
+                if(self.policy == QueuePolicy.Block):
+                    self.condition.wait_for(lambda: len(self.pending) < self.maxsize,
+                                            self.block_timeout)
+                elif(self.policy == QueuePolicy.Coalesce):
+                    if(self.pending_keys[self.coalesce_key(args)] > 0):
+                        self.coalesced += 1
+                        return
+
+                if(len(self.pending) >= self.maxsize): # Still full, make room
+                    _, old_args = self.pending.popleft()
+                    self._forget_key(old_args)
+                    self.dropped += 1
+
+            self.pending.append((time.monotonic(), args))
+            if(self.policy == QueuePolicy.Coalesce):
+                self.pending_keys[self.coalesce_key(args)] += 1
+            self.condition.notify_all()
+
+    def stop(self):
+        """Stop the worker thread. Pending messages are forgotten.
+        """
+        with self.condition:
+            self.running = False
+            self.pending.clear()
+            self.pending_keys.clear()
+            self.condition.notify_all()
+
+    def lag(self):
+        """Return a dict describing how far behind the callback is.
+        """
+        with self.condition:
+            oldest = self.pending[0][0] if self.pending else None
+            return {
+                'pending': len(self.pending),
+                'oldest_pending_age': 0.0 if oldest is None else time.monotonic() - oldest,
+                'processed': self.processed,
+                'dropped': self.dropped,
+                'coalesced': self.coalesced,
+                'last_latency': self.last_latency,
+                'max_latency': self.max_latency,
+            }
+
+    def _forget_key(self, args):
+        """Remove a message from the pending keys counter when it leaves the queue.
+        """
+        if(self.policy == QueuePolicy.Coalesce):
+            key = self.coalesce_key(args)
+            self.pending_keys[key] -= 1
+            if(self.pending_keys[key] <= 0):
+                del self.pending_keys[key]
+
+    def _main(self):
+        """Main loop of the worker: calls the callback for each queued message.
+        """
+        while(True):
+            with self.condition:
+                self.condition.wait_for(lambda: self.pending or not self.running)
+                if(not self.running):
+                    return
+                queued, args = self.pending.popleft()
+                self._forget_key(args)
+                self.condition.notify_all() # Room was made for a blocked reader
+
+            try:
+                self.callback(*args)
+            except Exception as e: # A failing callback must not kill its worker
+                print("Callback {} failed:".format(self.callback))
+                print(e)
+
+            latency = time.monotonic() - queued
+            self.last_latency = latency
+            self.max_latency = max(self.max_latency, latency)
+            self.processed += 1
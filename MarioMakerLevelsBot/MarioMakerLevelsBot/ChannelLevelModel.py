@@ -0,0 +1,612 @@
+import heapq
+import random
+import bisect
+import functools
+import itertools
+import threading
+import collections
+
+from PySide import QtCore
+from PySide.QtCore import QModelIndex
+from PySide.QtCore import Qt
+
+import LevelListModel
+from LevelListModel import Columns, Sorting
+
+
+def normalize_channel(channel):
+    """Return a channel name as the chat listener gives it: lowercase, without the #.
+    """
+    return channel.strip().lower().replace("#", "")
+
+def _run(keys, number, start):
+    """Yield (key, number, index) for the keys of a partition from index start, for heapq.merge.
+    """
+    for index in range(start, len(keys)):
+        yield (keys[index], number, index)
+
+
+class ChannelLevelModel(QtCore.QAbstractTableModel):
+    """The Qt model for the levels list of several channels.
+
+    Each channel has its own LevelListModel (partition), with its own sorted view and indexes:
+    the levels of a busy channel are only inserted among its own, the other partitions
+    aren't touched. The model shows a single channel, or all of them: the combined view
+    is a k-way merge of the partitions' views by their sorting keys (unique, see
+    LevelListModel._view_key), done lazily for the rows the view asks for and never
+    copied to a list of its own.
+    """
+
+    channel_added = QtCore.Signal(str) # channel
+
+    quota_exceeded = QtCore.Signal(str, str) # user name, code refused
+    export_finished = QtCore.Signal(str, int) # filename, number of levels exported
+    export_failed = QtCore.Signal(str, str) # filename, error
+
+    WINDOW_SIZE = 256 # Rows of the combined view merged at once, around the ones asked for
+
+    def __init__(self, parent=None):
+        """Initialize the model, without any channel.
+        """
+        super().__init__(parent)
+
+        # Key: channel, value: LevelListModel of its levels
+        self.partitions = collections.OrderedDict()
+        self.shown_channel = None # Channel shown, None for all of them
+        self.shown = [] # Partitions shown
+        self.list_lock = threading.RLock() # Prevent access racing on the partitions and the merged rows
+
+        # Never shown, holds the settings (filters, sorting, quotas...) given to the new partitions
+        self.defaults = LevelListModel.LevelListModel()
+        self.defaults.export_finished.connect(self.export_finished)
+        self.defaults.export_failed.connect(self.export_failed)
+        self.queue = None
+
+        # Rows of the combined view merged last: levels from the ascending rank window_start
+        self.window_start = 0
+        self.window = [] # (partition, index in its view_keys) tuples
+
+        # Changes of the partitions being passed on to the view
+        self.muted = 0 # The partitions changes are part of a reset of this model
+        self.pending = None # 'insert', 'move', 'remove' or 'reset' between the partition's signals, list_lock held meanwhile
+
+    ###########################################################################
+    # Qt methods.
+    # Those will be used by the Qt View Widget to display the data
+    ###########################################################################
+
+    def columnCount(self, parent=QModelIndex()):
+        """Return the number of columns in the current model."""
+        return self.defaults.columnCount()
+
+    def rowCount(self, parent=QModelIndex()):
+        """Return the number of rows in the model."""
+        return sum(len(partition.view_list) for partition in self.shown)
+
+    def data(self, index, role=Qt.DisplayRole):
+        """Return the data for the index, given the corresponding role.
+        The partition of the row gives it, the row number aside.
+        """
+        row = index.row()
+        located = self._locate(row)
+        if(located is None):
+            return None
+        partition, partition_row = located
+
+        if(role == Qt.DisplayRole and index.column() == Columns.Date):
+            return "{}".format(row+1)
+        return partition.data(partition.index(partition_row, index.column()), role)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        """Return the data for the row and column headers."""
+        return self.defaults.headerData(section, orientation, role)
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        """Sort the indexes by column, in order, in all the partitions."""
+        self._reset_all("sort", column, order)
+
+    def reset(self):
+        """Reset the model. Removes all levels from all the channels, which are kept.
+        """
+        self._reset_all("reset")
+
+    ###########################################################################
+    # Channels
+    ###########################################################################
+
+    def partition(self, channel):
+        """Return the LevelListModel of a channel, created with the current settings
+        if it doesn't exist yet (channel_added is emitted).
+        """
+        channel = normalize_channel(channel)
+
+        self.list_lock.acquire()
+        partition = self.partitions.get(channel, None)
+        added = partition is None
+        if(added):
+            partition = self._new_partition()
+            self.partitions[channel] = partition
+            self._update_shown()
+        self.list_lock.release()
+
+        if(added):
+            self.channel_added.emit(channel)
+        return partition
+
+    def channels(self):
+        """Return the channels, in the order they were added.
+        """
+        return list(self.partitions.keys())
+
+    def show_channel(self, channel):
+        """Show the levels of a single channel, or of all of them if channel is None.
+        """
+        self.list_lock.acquire()
+        self.beginResetModel()
+        self.shown_channel = None if channel is None else normalize_channel(channel)
+        self._update_shown()
+        self.endResetModel()
+        self.list_lock.release()
+
+    ###########################################################################
+    # User methods.
+    # Those are used by the rest of the program to interact with the data,
+    # like with a LevelListModel
+    ###########################################################################
+
+    def add_level(self, code, name, tags=None, channel=""):
+        """Add a level submitted in a channel, see LevelListModel.add_level.
+        """
+        return self.partition(channel).add_level(code, name, tags)
+
+    def codes(self):
+        """Return the codes of the levels of all the channels.
+        """
+        self.list_lock.acquire()
+        partitions = list(self.partitions.values())
+        self.list_lock.release()
+        return [ code for partition in partitions for code in list(partition.levels_dict) ]
+
+    def hide_fake_levels(self, hide):
+        return self._reset_all("hide_fake_levels", hide)
+
+    def hide_already_played_levels(self, hide):
+        return self._reset_all("hide_already_played_levels", hide)
+
+    def hide_potentially_fake_levels(self, hide):
+        return self._reset_all("hide_potentially_fake_levels", hide)
+
+    def show_subs_levels_only(self, show):
+        return self._reset_all("show_subs_levels_only", show)
+
+    def show_mods_levels_only(self, show):
+        return self._reset_all("show_mods_levels_only", show)
+
+    def set_search(self, text):
+        return self._reset_all("set_search", text)
+
+    def sort_by_hotness(self, hot):
+        return self._reset_all("sort_by_hotness", hot)
+
+    def set_random_strategy(self, strategy):
+        self._apply_all("set_random_strategy", strategy)
+
+    def set_group_near_duplicates(self, group):
+        self._apply_all("set_group_near_duplicates", group)
+
+    def set_quota(self, tier, limit):
+        """Set the maximum number of levels a user of a Tier can have in each channel.
+        """
+        self._apply_all("set_quota", tier, limit)
+
+    def set_queue(self, queue):
+        """Put the new levels of all the channels in a LevelQueue, or stop if queue is None.
+        """
+        self.queue = queue
+        self._apply_all("set_queue", queue)
+
+    def check_fakes_again(self, codes):
+        """Check again the filters of the levels with these codes, in all the channels.
+        """
+        self._apply_all("check_fakes_again", codes)
+
+    def row_of_level(self, level):
+        """Return the row of a level in the view, or None if it isn't shown.
+        """
+        self.list_lock.acquire()
+        row = None
+        for partition in self.shown:
+            partition_row = self._partition_row(partition, level)
+            if(partition_row is not None):
+                row = self._row_in_view(partition, partition_row)
+                break
+        self.list_lock.release()
+        return row
+
+    def random_level(self):
+        """Return a random level among the shown ones, None if no level is shown.
+        Each channel gets its share of the draws by its number of shown levels,
+        the random strategy chooses among the levels of the channel.
+        """
+        self.list_lock.acquire()
+        partitions = [ partition for partition in self.shown if partition.view_list ]
+        self.list_lock.release()
+        if(not partitions):
+            return None
+
+        draw = random.randrange(sum(len(partition.view_list) for partition in partitions))
+        for partition in partitions:
+            if(draw < len(partition.view_list)):
+                return partition.random_level()
+            draw -= len(partition.view_list)
+        return partitions[-1].random_level()
+
+    def mark_played(self, levels):
+        """Mark levels as played, in the channel they were submitted in.
+        """
+        for partition, levels in self._by_partition(levels, list(self.partitions.values())):
+            # The levels in no partition anymore (from the queue) are still added to the history
+            (partition or self.defaults).mark_played(levels)
+
+    def remove_user_levels(self, user, channel=None):
+        """Remove all the levels of a user (login) in a channel, or in all of them.
+        Return the number of levels removed.
+        """
+        self.list_lock.acquire()
+        if(channel is None):
+            partitions = list(self.partitions.values())
+        else:
+            partition = self.partitions.get(normalize_channel(channel), None)
+            partitions = [] if partition is None else [ partition ]
+        self.list_lock.release()
+
+        return sum(partition.remove_user_levels(user) for partition in partitions)
+
+    def remove_message_level(self, message_id):
+        """Take back the submission of a deleted message, see LevelListModel.remove_message_level.
+        """
+        self.list_lock.acquire()
+        partitions = list(self.partitions.values())
+        self.list_lock.release()
+
+        return any(partition.remove_message_level(message_id) for partition in partitions)
+
+    def remove_indexes(self, indexes):
+        """Remove all the rows in the indexes list, from their channels.
+        """
+        levels = []
+        for row in set(index.row() for index in indexes):
+            located = self._locate(row)
+            if(located is not None):
+                levels.append(located[0].view_list[located[1]])
+
+        def remove():
+            for partition, levels_in in self._by_partition(levels, self.shown):
+                partition.remove_indexes([ partition.index(partition.row_of_level(level), 0)
+                                           for level in levels_in ])
+
+        if(len(levels) == 1): # The view is told which row goes
+            remove()
+        elif(levels): # The rows are all over the partitions
+            self._muted_reset(remove)
+
+    def export_view(self, filename):
+        """Export the levels currently shown, in the shown order, see LevelListModel.export_view.
+        """
+        self.defaults.export_view(filename, self._shown_levels())
+
+    def memory_usage(self, sample=None):
+        """Return the bytes used by the partitions, added up, see LevelListModel.memory_usage.
+        """
+        self.list_lock.acquire()
+        partitions = list(self.partitions.values())
+        self.list_lock.release()
+
+        usage = collections.Counter()
+        for partition in partitions:
+            usage.update(partition.memory_usage(sample))
+        usage = dict(usage)
+        for key in ("levels", "levels_dict", "view_list", "view_keys", "indexes", "total", "count"):
+            usage.setdefault(key, 0)
+        usage['per_level'] = usage['total'] / usage['count'] if usage['count'] else 0
+        return usage
+
+    ###########################################################################
+    # Private methods
+    # Used by the model for the model
+    ###########################################################################
+
+    def _new_partition(self):
+        """Return a new partition with the settings of the defaults, listened to.
+        """
+        partition = LevelListModel.LevelListModel()
+        partition.moveToThread(self.thread()) # May be created by a chat callback thread
+
+        partition.filters = self.defaults.filters
+        partition.sorting = self.defaults.sorting
+        partition.search_text = self.defaults.search_text
+        partition.quotas = dict(self.defaults.quotas)
+        partition.set_queue(self.defaults.queue)
+        partition.set_random_strategy(self.defaults.random_strategy)
+        partition.set_group_near_duplicates(self.defaults.group_near_duplicates)
+
+        # Called right away, in the thread changing the partition
+        for signal, slot in ((partition.rowsAboutToBeInserted, self._rows_about_to_be_inserted),
+                             (partition.rowsInserted, self._rows_inserted),
+                             (partition.rowsAboutToBeRemoved, self._rows_about_to_be_removed),
+                             (partition.rowsRemoved, self._rows_removed),
+                             (partition.modelAboutToBeReset, self._about_to_be_reset),
+                             (partition.modelReset, self._reset),
+                             (partition.dataChanged, self._data_changed),
+                             (partition.key_about_to_change, self._key_about_to_change),
+                             (partition.key_changed, self._key_changed)):
+            signal.connect(functools.partial(slot, partition), Qt.DirectConnection)
+        partition.quota_exceeded.connect(self.quota_exceeded)
+
+        return partition
+
+    def _update_shown(self):
+        """Update the partitions shown after the channel shown or the partitions changed.
+        """
+        if(self.shown_channel is None):
+            self.shown = list(self.partitions.values())
+        else:
+            partition = self.partitions.get(self.shown_channel, None)
+            self.shown = [] if partition is None else [ partition ]
+        self.window = []
+
+    def _apply_all(self, method, *args):
+        """Call a method of the defaults and of all the partitions, return the partitions' results.
+        """
+        self.list_lock.acquire()
+        partitions = list(self.partitions.values())
+        self.list_lock.release()
+
+        getattr(self.defaults, method)(*args)
+        return [ getattr(partition, method)(*args) for partition in partitions ]
+
+    def _reset_all(self, method, *args):
+        """Call a method of the defaults and of all the partitions, changing the view
+        of each one, with a single reset of this model.
+        """
+        self._muted_reset(functools.partial(self._apply_all, method, *args))
+
+    def _muted_reset(self, change):
+        """Call change, which changes partitions, as a reset of this model.
+        list_lock isn't held during the change: the partitions take it after their own locks.
+        """
+        self.list_lock.acquire()
+        self.beginResetModel()
+        self.muted += 1
+        self.list_lock.release()
+
+        change()
+
+        self.list_lock.acquire()
+        self.muted -= 1
+        self.window = []
+        self.endResetModel()
+        self.list_lock.release()
+
+    def _reversed(self):
+        return bool(self.defaults.sorting & Sorting.Reversed)
+
+    def _rank(self, partition, index):
+        """Return the rank in the combined view, in ascending keys order,
+        of the level at index in the view_keys of a shown partition.
+        """
+        key = partition.view_keys[index]
+        return index + sum(bisect.bisect_left(other.view_keys, key)
+                           for other in self.shown if other is not partition)
+
+    def _partition_row(self, partition, level):
+        """Return the row of a level in a shown partition, None if it isn't shown.
+        Same as partition.row_of_level without taking the partition's lock:
+        list_lock is held, the partition changes wait for it.
+        """
+        if(level.view_key is None):
+            return None
+        index = bisect.bisect_left(partition.view_keys, level.view_key)
+        row = len(partition.view_list) - 1 - index if self._reversed() else index
+        if(not 0 <= row < len(partition.view_list) or partition.view_list[row] is not level):
+            return None
+        return row
+
+    def _row_in_view(self, partition, partition_row):
+        """Return the row in this model of a row of a shown partition.
+        """
+        if(len(self.shown) == 1):
+            return partition_row
+
+        count = len(partition.view_list)
+        index = count - 1 - partition_row if self._reversed() else partition_row
+        rank = self._rank(partition, index)
+        return self.rowCount() - 1 - rank if self._reversed() else rank
+
+    def _positions(self, rank):
+        """Return, for each shown partition, how many of its levels come before
+        the one at rank in the combined view (ascending keys order).
+        """
+        for partition in self.shown:
+            low, high = 0, len(partition.view_keys)
+            while(low < high): # The other partitions are searched for each key tried
+                middle = (low + high) // 2
+                middle_rank = self._rank(partition, middle)
+                if(middle_rank < rank):
+                    low = middle + 1
+                elif(middle_rank > rank):
+                    high = middle
+                else:
+                    key = partition.view_keys[middle]
+                    return [ middle if other is partition else bisect.bisect_left(other.view_keys, key)
+                             for other in self.shown ]
+
+        return [ len(partition.view_keys) for partition in self.shown ] # Past the last level
+
+    def _locate(self, row):
+        """Return (partition, row in the partition) of a row of this model, None if there is none.
+
+        Rows of the combined view are merged WINDOW_SIZE at a time around the row asked for,
+        from the positions of the partitions found by binary searches: O(k log² n) then O(log k)
+        per row for k channels, and only for the rows shown.
+        """
+        self.list_lock.acquire()
+
+        located = None
+        count = self.rowCount()
+        if(not 0 <= row < count):
+            pass
+        elif(len(self.shown) == 1):
+            located = (self.shown[0], row)
+        else:
+            rank = count - 1 - row if self._reversed() else row
+            if(not self.window_start <= rank < self.window_start + len(self.window)):
+                self.window_start = max(0, rank - self.WINDOW_SIZE // 2)
+                runs = [ _run(partition.view_keys, number, position) for number, (partition, position)
+                         in enumerate(zip(self.shown, self._positions(self.window_start))) ]
+                self.window = [ (self.shown[number], index) for key, number, index
+                                in itertools.islice(heapq.merge(*runs), self.WINDOW_SIZE) ]
+
+            if(rank - self.window_start < len(self.window)):
+                partition, index = self.window[rank - self.window_start]
+                if(self._reversed()):
+                    index = len(partition.view_list) - 1 - index
+                if(0 <= index < len(partition.view_list)):
+                    located = (partition, index)
+
+        self.list_lock.release()
+
+        return located
+
+    def _shown_levels(self):
+        """Return the levels shown, in the shown order.
+        """
+        self.list_lock.acquire()
+        runs = []
+        for partition in self.shown:
+            levels = partition.view_list[::-1] if self._reversed() else partition.view_list
+            runs.append([ (level.view_key, level) for level in levels ])
+        self.list_lock.release()
+
+        levels = [ level for key, level in heapq.merge(*runs) ]
+        if(self._reversed()):
+            levels.reverse()
+        return levels
+
+    def _by_partition(self, levels, partitions):
+        """Return (partition, levels) pairs grouping levels by the partition they are in,
+        the partition being None for the levels in none of them.
+        """
+        groups = collections.OrderedDict()
+        for level in levels:
+            owner = None
+            for partition in partitions:
+                if(partition.levels_dict.get(level.code, None) is level):
+                    owner = partition
+                    break
+            groups.setdefault(owner, []).append(level)
+        return list(groups.items())
+
+    ###########################################################################
+    # Slots of the partitions' signals
+    # Run in the thread changing the partition, they pass the changes on to the view
+    # before they are made. A level shown or moved is told by key_about_to_change,
+    # the rows signals are for the other changes. Several rows inserted or removed at once
+    # are a reset: they may be anywhere in the combined view.
+    # list_lock is held from each "about to" signal to its matching one: the changes
+    # of all the partitions are made one at a time, whatever thread makes them.
+    # The partitions' locks are taken first, so list_lock is never held
+    # while waiting for the lock of a partition.
+    ###########################################################################
+
+    def _key_about_to_change(self, partition, level, key):
+        self.list_lock.acquire() # Released by _key_changed
+        if(self.muted or self.pending is not None or partition not in self.shown):
+            return
+
+        count = self.rowCount()
+        rank = sum(bisect.bisect_left(other.view_keys, key) for other in self.shown)
+        partition_row = self._partition_row(partition, level)
+        if(partition_row is None): # Shown
+            row = count - rank if self._reversed() else rank
+            self.pending = "insert"
+            self.beginInsertRows(QModelIndex(), row, row)
+            return
+
+        old_row = self._row_in_view(partition, partition_row)
+        if(level.view_key < key): # Counted in the rank, before the key
+            rank -= 1
+        row = count - 1 - rank if self._reversed() else rank
+        if(row != old_row):
+            self.pending = "move"
+            # Qt wants the row the level goes before, counted before the move
+            self.beginMoveRows(QModelIndex(), old_row, old_row, QModelIndex(), row + 1 if row > old_row else row)
+
+    def _key_changed(self, partition, level):
+        if(self.pending in ("insert", "move")):
+            pending, self.pending = self.pending, None
+            self.window = []
+            if(pending == "insert"):
+                self.endInsertRows()
+            else:
+                self.endMoveRows()
+        self.list_lock.release()
+
+    def _rows_about_to_be_inserted(self, partition, parent, first, last):
+        self.list_lock.acquire() # Released by _rows_inserted
+        if(self.muted or self.pending is not None or partition not in self.shown):
+            return
+        self.pending = "reset"
+        self.beginResetModel()
+
+    def _rows_inserted(self, partition, parent, first, last):
+        self._end_reset()
+        self.list_lock.release()
+
+    def _rows_about_to_be_removed(self, partition, parent, first, last):
+        self.list_lock.acquire() # Released by _rows_removed
+        if(self.muted or self.pending is not None or partition not in self.shown):
+            return
+        if(first != last):
+            self.pending = "reset"
+            self.beginResetModel()
+        else:
+            row = self._row_in_view(partition, first)
+            self.pending = "remove"
+            self.beginRemoveRows(QModelIndex(), row, row)
+
+    def _rows_removed(self, partition, parent, first, last):
+        if(self.pending == "remove"):
+            self.pending = None
+            self.window = []
+            self.endRemoveRows()
+        else:
+            self._end_reset()
+        self.list_lock.release()
+
+    def _about_to_be_reset(self, partition):
+        self.list_lock.acquire() # Released by _reset
+        if(self.muted or self.pending is not None or partition not in self.shown):
+            return
+        self.pending = "reset"
+        self.beginResetModel()
+
+    def _reset(self, partition):
+        self._end_reset()
+        self.list_lock.release()
+
+    def _end_reset(self):
+        if(self.pending == "reset"):
+            self.pending = None
+            self.window = []
+            self.endResetModel()
+
+    def _data_changed(self, partition, top_left, bottom_right):
+        self.list_lock.acquire()
+        if(not self.muted and partition in self.shown):
+            if(top_left.row() == bottom_right.row()):
+                row = self._row_in_view(partition, top_left.row())
+                self.dataChanged.emit(self.index(row, top_left.column()), self.index(row, bottom_right.column()))
+            elif(self.rowCount()):
+                self.dataChanged.emit(self.index(0, 0), self.index(self.rowCount() - 1, self.columnCount() - 1))
+        self.list_lock.release()
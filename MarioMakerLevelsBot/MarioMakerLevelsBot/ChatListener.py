@@ -6,6 +6,7 @@ import threading
 from PySide import QtCore
 
 import TwitchTags
+from CallbackQueue import CallbackQueue, QueuePolicy
 
 class ChatListener(QtCore.QObject):
     """Connects to a Twitch chat channel and listens to the messages.
@@ -21,15 +22,29 @@ class ChatListener(QtCore.QObject):
     connection_failed = QtCore.Signal()
     connection_successful = QtCore.Signal(str)
 
-    def __init__(self, name, oauth, channels, parent=None):
+    # Moderation events, with twitch.tv/commands
+    user_cleared = QtCore.Signal(str, str, int) # channel, user name, timeout in seconds (0: banned)
+    chat_cleared = QtCore.Signal(str) # channel
+    message_deleted = QtCore.Signal(str, str, str) # channel, user name, message id
+    room_state = QtCore.Signal(str, object) # channel, dict of the room settings that changed
+
+    def __init__(self, name, oauth, channels, parent=None, host=None, port=None):
         """Create the ChatListener object.
+
+        host and port default to the standard Twitch chat server.
         """
         super().__init__()
         self.name = name
         self.oauth = oauth
-        self.channels = channels
+        self.channels = list(channels)
         self.parent = parent
-        self.callbacks = []
+        if(host is not None):
+            self.HOST = host
+        if(port is not None):
+            self.PORT = port
+        self.callbacks = {} # Key: callback, value: its CallbackQueue
+        self.command_callbacks = {} # Key: (command, callback), value: the callback filtering the messages
+        self.socket_lock = threading.Lock() # The callbacks may send messages from their threads
         self.thread = threading.Thread(target=self._main)
         self.thread.setDaemon(True)
 
@@ -60,24 +75,72 @@ class ChatListener(QtCore.QObject):
         """Return True if listening is active, False otherwise)."""
         return self.thread.isAlive()
 
-    def add_callback(self, callback):
+    def add_callback(self, callback, maxsize=1024, policy=QueuePolicy.DropOldest):
         """Add a callback to give messages information to.
 
         The callback prototype must be compatible with:
-        callback(channel, name, tags, message)"""
+        callback(channel, name, tags, message)
+
+        Each callback gets its own queue of at most maxsize messages and its own thread,
+        policy tells what to do with new messages when the queue is full."""
         if(callback not in self.callbacks):
-            self.callbacks.append(callback)
+            self.callbacks[callback] = CallbackQueue(callback, maxsize, policy)
 
     def remove_callback(self, callback):
         """Remove a callback from the list of callbacks."""
         try:
-            self.callbacks.remove(callback)
+            self.callbacks.pop(callback).stop()
         except:
             pass
 
     def reset_callbacks(self):
         """Remove all callbacks"""
-        self.callbacks = []
+        for queue in self.callbacks.values():
+            queue.stop()
+        self.callbacks = {}
+        self.command_callbacks = {}
+
+    def add_command_callback(self, command, callback):
+        """Add a callback for the messages starting with a command (like !position).
+
+        The callback prototype must be compatible with:
+        callback(channel, name, tags, message)"""
+        command = command.lower()
+
+        def on_message(channel, name, tags, message):
+            if(message.split(" ", 1)[0].lower() == command):
+                callback(channel, name, tags, message)
+        on_message.__name__ = command
+
+        if((command, callback) not in self.command_callbacks):
+            self.command_callbacks[(command, callback)] = on_message
+            self.add_callback(on_message)
+
+    def remove_command_callback(self, command, callback):
+        """Remove a callback added by add_command_callback."""
+        on_message = self.command_callbacks.pop((command.lower(), callback), None)
+        if(on_message is not None):
+            self.remove_callback(on_message)
+
+    def send_message(self, channel, message):
+        """Send a message to a channel's chat.
+
+        Return True if it was sent, False otherwise (not connected)."""
+        self.socket_lock.acquire()
+        try:
+            self.socket.send("PRIVMSG #{0} :{1}\r\n".format(
+                channel.lower().replace("#", ""), message).encode())
+            return True
+        except (AttributeError, OSError): # No socket yet, or connection lost
+            return False
+        finally:
+            self.socket_lock.release()
+
+    def callbacks_lag(self):
+        """Return how far behind each callback is, as a dict.
+
+        Key: callback, value: the dict returned by CallbackQueue.lag()"""
+        return { callback: queue.lag() for callback, queue in list(self.callbacks.items()) }
 
 
     def _connect(self):
@@ -114,8 +177,8 @@ class ChatListener(QtCore.QObject):
             self.wrong_password.emit()
             return False
 
-        # Requesting tags
-        self.socket.send("CAP REQ :twitch.tv/tags\r\n".encode())
+        # Requesting tags, and the moderation events
+        self.socket.send("CAP REQ :twitch.tv/tags twitch.tv/commands\r\n".encode())
 
         # Joining the channel.
         for channel in self.channels:
@@ -163,8 +226,31 @@ class ChatListener(QtCore.QObject):
                     name = line[1].split("!")[0][1:].lower()
                     tags = TwitchTags.get_tags(line[0], channel)
                     message = " ".join(line[4:])[1:]
-                    for callback in self.callbacks:
-                        callback(channel, name, tags, message)
+                    # Only queue the message, the callbacks run on their own threads
+                    for queue in list(self.callbacks.values()):
+                        queue.put(channel, name, tags, message)
+
+                # Timeouts and bans: the user's messages are cleared, or the whole chat
+                elif(len(line) >= 4 and line[2] == "CLEARCHAT"):
+                    channel = line[3][1:].lower()
+                    if(len(line) >= 5):
+                        tags = TwitchTags.parse_tags(line[0])
+                        self.user_cleared.emit(channel, line[4][1:].lower(),
+                                               int(tags.get("ban-duration", 0) or 0))
+                    else:
+                        self.chat_cleared.emit(channel)
+
+                # A single message deleted by a moderator
+                elif(len(line) >= 4 and line[2] == "CLEARMSG"):
+                    tags = TwitchTags.parse_tags(line[0])
+                    self.message_deleted.emit(line[3][1:].lower(), tags.get("login", "").lower(),
+                                              tags.get("target-msg-id", ""))
+
+                # Room settings (slow mode, subs only...), all of them when joining then the changes
+                elif(len(line) >= 4 and line[2] == "ROOMSTATE"):
+                    tags = TwitchTags.parse_tags(line[0])
+                    tags.pop("room-id", None)
+                    self.room_state.emit(line[3][1:].lower(), tags)
 
                 # Checks if it's a channel joined message
                 elif (len(line) >= 6 and
@@ -182,4 +268,6 @@ class ChatListener(QtCore.QObject):
                 # IRC checks connectiond with ping.
                 # Every ping has to be replied to with a Pong.
                 elif(line[0] == "PING"):
+                    self.socket_lock.acquire()
                     self.socket.send("PONG {0}\r\n".format(line[1]).encode())
+                    self.socket_lock.release()
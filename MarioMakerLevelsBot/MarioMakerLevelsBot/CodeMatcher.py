@@ -0,0 +1,394 @@
+import re
+import enum
+import collections
+
+
+class CodeFormat(enum.IntEnum):
+    """Enumerates the formats of course IDs.
+    """
+    SMM1 = 0 # Super Mario Maker: XXXX-XXXX-XXXX-XXXX, hexadecimal
+    SMM2 = 1 # Super Mario Maker 2: XXX-XXX-XXX, digits and consonants
+
+
+# RegExp used to find Super Mario Maker codes. Pre-compiled to go faster when receiving
+# messages.
+code_re = re.compile(
+    "[0-9A-F]{4}[ \-_][0-9A-F]{4}[ \-_][0-9A-F]{4}[ \-_][0-9A-F]{4}")
+
+# Super Mario Maker 2 IDs use the digits and the consonants but Z, with the same separator twice
+SMM2_ALPHABET = "0123456789BCDFGHJKLMNPQRSTVWXY"
+_SMM2_DIGITS = { char: index for index, char in enumerate(SMM2_ALPHABET) }
+smm2_re = re.compile(
+    "[0-9BCDFGHJ-NP-TV-Y]{3}(?P<separator>[ \-_])"
+    "[0-9BCDFGHJ-NP-TV-Y]{3}(?P=separator)[0-9BCDFGHJ-NP-TV-Y]{3}(?![0-9A-Z])")
+
+# Both formats in a single regexp, so each message is scanned once.
+# An ID doesn't start in the middle of a word, and both formats start with 3 characters
+# then a 4th hex digit or separator: checking that first rejects most positions
+# before trying the formats.
+# Case insensitive, for the messages not uppercased.
+_id_re = re.compile("(?<![0-9A-Z])(?=[0-9A-Y]{3}[ \-_0-9A-F])"
+                    "(?:(?P<smm1>" + code_re.pattern + ")|(?P<smm2>" + smm2_re.pattern + "))",
+                    re.IGNORECASE)
+
+VALUE_BITS = 64 # Bits of the value of a code in its integer key, the format is above
+
+def _accept(s):
+    """Return True if a match of _id_re is taken as a course ID.
+
+    Three groups of three letters separated by spaces are most likely words
+    ("hmm hmm hmm"), so Super Mario Maker 2 IDs separated by spaces need a digit.
+    """
+    if(s.lastgroup == "smm1"):
+        return True
+    text = s.group(0)
+    return " " not in text or any(char.isdigit() for char in text)
+
+def _shifted(message, s, end):
+    """Return the match to use instead of s, an accepted match of _id_re.
+
+    A word can pass for the first group of a Super Mario Maker 2 ID separated by spaces
+    ("try 4B7 Y2K 0QG"): when that first group has no digit and the three next groups
+    are an ID too, they are taken instead.
+    """
+    if(s.lastgroup != "smm2" or s.group("separator") != " " or
+       any(char.isdigit() for char in s.group(0)[:3])):
+        return s
+
+    shifted = _id_re.match(message, s.start() + 4, end)
+    if(shifted is not None and shifted.lastgroup == "smm2" and _accept(shifted)):
+        return shifted
+    return s
+
+def scan(message, start=0, end=None):
+    """Return the match of the first course ID (of any format) in message[start:end],
+    or None if there is none.
+    """
+    end = len(message) if end is None else end
+    s = _id_re.search(message, start, end)
+    if(s is None or s.lastgroup == "smm1"): # Most messages stop here
+        return s
+
+    while(s is not None and not _accept(s)):
+        s = _id_re.search(message, s.start() + 1, end)
+    return None if s is None else _shifted(message, s, end)
+
+def scan_at(message, position):
+    """Return the match of a course ID starting exactly at position in message, or None.
+    """
+    s = _id_re.match(message, position)
+    return _shifted(message, s, len(message)) if s is not None and _accept(s) else None
+
+def normalized(s):
+    """Return the course ID of a match of scan, normalized
+    (XXXX-XXXX-XXXX-XXXX or XXX-XXX-XXX, uppercase).
+    """
+    return s.group(0).upper().replace(" ", "-").replace("_", "-")
+
+def find_code(message):
+    """Return the first course ID found in the message, normalized.
+    Return None if the message contains no course ID.
+    """
+    s = scan(message)
+    return None if s is None else normalized(s)
+
+def code_format(code):
+    """Return the CodeFormat of a normalized code.
+    """
+    return CodeFormat.SMM2 if len(code) == 11 else CodeFormat.SMM1
+
+def encode_code(code):
+    """Return a normalized code as an integer key: the value of the code in the
+    VALUE_BITS low bits, tagged with its format in the bits above.
+    Raise ValueError if the code isn't a valid code.
+    """
+    if(code_format(code) == CodeFormat.SMM2):
+        value = 0
+        for char in code.replace("-", ""):
+            try:
+                value = value * len(SMM2_ALPHABET) + _SMM2_DIGITS[char]
+            except KeyError:
+                raise ValueError("Invalid Super Mario Maker 2 ID: {}".format(code))
+        return (CodeFormat.SMM2 << VALUE_BITS) | value
+
+    return int(code.replace("-", ""), 16)
+
+def decode_code(key):
+    """Return the normalized code of an integer key given by encode_code.
+    """
+    id_format, value = split_key(key)
+    if(id_format == CodeFormat.SMM2):
+        chars = []
+        for i in range(9):
+            value, digit = divmod(value, len(SMM2_ALPHABET))
+            chars.append(SMM2_ALPHABET[digit])
+        digits = "".join(reversed(chars))
+        return "-".join((digits[0:3], digits[3:6], digits[6:9]))
+
+    digits = "{:016X}".format(value)
+    return "-".join((digits[0:4], digits[4:8], digits[8:12], digits[12:16]))
+
+def split_key(key):
+    """Return (format, value) of an integer key given by encode_code.
+    """
+    return CodeFormat(key >> VALUE_BITS), key & ((1 << VALUE_BITS) - 1)
+
+def join_key(id_format, value):
+    """Return the integer key of a code from its format and value, the opposite of split_key.
+    """
+    return (id_format << VALUE_BITS) | value
+
+def is_potentially_fake(code):
+    """Return True if a normalized code looks fake because of its form.
+
+    These are plausibility checks, not validations: the IDs have no known public checksum.
+    - Super Mario Maker: real codes have 0000 as second group.
+    - Super Mario Maker 2: random IDs with only digits (5 out of 100,000 real IDs)
+      or less than 3 different characters are much more likely phone numbers,
+      placeholders or jokes than real IDs.
+    """
+    if(code_format(code) == CodeFormat.SMM2):
+        digits = code.replace("-", "")
+        return digits.isdigit() or len(set(digits)) < 3
+
+    return code[5:9] != "0000"
+
+
+class RuleKind(enum.IntEnum):
+    """Enumerates the kinds of matching rules.
+    """
+    Code = 0 # A code anywhere in the message
+    Command = 1 # A command (like !add) at the start of the message, followed by a code
+    Keyword = 2 # A keyword anywhere in the message, followed by a code
+
+
+class MatchRule(object):
+    """A rule telling which messages are level submissions.
+    """
+
+    def __init__(self, kind, text="", channels=None):
+        """Create a rule.
+
+        text is the command or the keyword, channels the list of channels
+        the rule is used in (None for all of them).
+        """
+        super().__init__()
+        self.kind = kind
+        self.text = text
+        self.channels = None if channels is None else { channel.lower().replace("#", "") for channel in channels }
+
+    def __repr__(self):
+        return "MatchRule({}, {!r}, {!r})".format(self.kind.name, self.text, self.channels)
+
+    @property
+    def name(self):
+        """Name of the rule as written in a rules description (see parse_rules).
+        """
+        if(self.kind == RuleKind.Code):
+            return "code"
+        if(self.kind == RuleKind.Keyword):
+            return "keyword:" + self.text
+        return self.text
+
+    def used_in(self, channel):
+        """Return True if the rule is used in the channel.
+        """
+        return self.channels is None or channel is None or channel in self.channels
+
+
+def parse_rules(text):
+    """Return the list of MatchRule described by text.
+
+    Rules are separated by semicolons, and may end with @channel1,channel2
+    to be used in these channels only:
+    - code: a code anywhere in the message
+    - !add (anything starting with !): the command followed by a code
+    - keyword:word: the word followed by a code
+    An empty text gives the default rule, code.
+    """
+    rules = []
+    for description in text.split(";"):
+        description, at, channels = description.strip().partition("@")
+        description = description.strip()
+        channels = [ x.strip() for x in channels.split(",") if x.strip() ] or None
+        if(description == ""):
+            continue
+
+        if(description.lower() == "code"):
+            rules.append(MatchRule(RuleKind.Code, "", channels))
+        elif(description.startswith("!")):
+            rules.append(MatchRule(RuleKind.Command, description, channels))
+        elif(description.lower().startswith("keyword:")):
+            rules.append(MatchRule(RuleKind.Keyword, description[len("keyword:"):].strip(), channels))
+        else:
+            raise ValueError("Unknown matching rule: {}".format(description))
+
+    return rules or [MatchRule(RuleKind.Code)]
+
+
+class RepeatCounting(enum.IntEnum):
+    """How the copies of a message seen again count toward the times a level was requested.
+    """
+    Every = 0 # Each copy is a request, like any other message
+    PerUser = 1 # The copies count once for each user
+    Once = 2 # The copies count once, whoever sends them
+
+
+class MessageMatcher(object):
+    """Finds the submissions in chat messages according to a list of MatchRule.
+
+    Every rule needs a code, so each message is first scanned once for a code:
+    most messages have none and cost the same whatever the number of rules.
+    Then the rules used in the channel are checked all at once: the commands
+    by looking up the first word in a dict, the keywords with a single regexp
+    of all of them. When several rules match, the first one in the list wins.
+
+    The results of the last messages are remembered (least recently seen dropped first):
+    the copies of a message pasted over and over in chat, during raids for instance,
+    aren't scanned again, and count toward the times requested as repeats says.
+    """
+
+    CACHE_SIZE = 1024 # Distinct messages remembered
+
+    def __init__(self, rules=None, repeats=RepeatCounting.Every, cache_size=CACHE_SIZE):
+        """cache_size is the number of messages remembered, 0 to scan every message.
+        """
+        super().__init__()
+        self.repeats = repeats
+        self.cache_size = cache_size
+        self.set_rules(rules or [MatchRule(RuleKind.Code)])
+
+    def set_rules(self, rules):
+        """Replace the rules, resetting the hit counts.
+        """
+        self.rules = list(rules)
+        self.hits = [0] * len(self.rules) # Messages matched by each rule
+        self.compiled = {} # Key: channel, value: _CompiledRules of the rules used in it
+        self._clear_cache()
+
+    def set_repeat_counting(self, repeats):
+        """Change how the copies of a message count, from the next messages on.
+        """
+        self.repeats = repeats
+        self._clear_cache() # Who sent the copies seen until now isn't known with Every
+
+    def match(self, message, channel=None, user=None):
+        """Return (normalized code, index of the matching rule) for the first submission
+        in the message, or None if the message matches no rule.
+
+        user is the user sending the message: a copy of a message seen recently
+        also returns None if it doesn't count as a request (see RepeatCounting).
+        """
+        self.lookups += 1
+        key = (channel, message)
+        recent = self.recent # Replaced when the rules change, maybe in another thread
+        entry = recent.get(key, None)
+        if(entry is not None):
+            self.cache_hits += 1
+            recent.move_to_end(key)
+            result, users = entry
+            if(result is None):
+                return None
+            if(self.repeats == RepeatCounting.Once
+               or (self.repeats == RepeatCounting.PerUser and user in users)):
+                self.repeats_dropped += 1
+                return None
+            if(users is not None):
+                users.add(user)
+        else:
+            result = self._scan(message, channel)
+            if(self.cache_size > 0):
+                users = { user } if result is not None and self.repeats == RepeatCounting.PerUser else None
+                recent[key] = (result, users)
+                if(len(recent) > self.cache_size):
+                    recent.popitem(last=False)
+            if(result is None):
+                return None
+
+        code, best = result
+        if(best < len(self.hits)): # The rules may be changing in another thread
+            self.hits[best] += 1
+        return result
+
+    def hit_counts(self):
+        """Return the list of (rule name, hits) of the rules.
+        """
+        return [ (rule.name, hits) for rule, hits in zip(self.rules, self.hits) ]
+
+    def cache_stats(self):
+        """Return a dict of the messages seen again: 'lookups' (messages matched),
+        'hits' (copies of a message remembered), 'hit_rate' and 'dropped'
+        (copies not counted as requests). Reset with the rules.
+        """
+        return { 'lookups': self.lookups, 'hits': self.cache_hits,
+                 'hit_rate': self.cache_hits / self.lookups if self.lookups else 0.0,
+                 'dropped': self.repeats_dropped }
+
+    def _clear_cache(self):
+        self.recent = collections.OrderedDict() # Key: (channel, message), value: (result, users who sent it)
+        self.lookups = 0
+        self.cache_hits = 0
+        self.repeats_dropped = 0
+
+    def _scan(self, message, channel):
+        """Return (normalized code, index of the matching rule) for the message, or None.
+        """
+        compiled = self.compiled.get(channel, None)
+        if(compiled is None):
+            compiled = self.compiled[channel] = _CompiledRules(self.rules, channel)
+
+        s = scan(message)
+        if(s is None):
+            return None
+
+        best = compiled.code_rule # None if there is no code rule
+        code = s
+
+        # Command: the first word, then the code
+        command, space, rest = message.partition(" ")
+        index = compiled.commands.get(command.lower(), None)
+        if(index is not None and (best is None or index < best)):
+            command_code = scan_at(message, len(message) - len(rest.lstrip()))
+            if(command_code is not None):
+                best, code = index, command_code
+
+        # Keyword: the first keyword before the code
+        if(compiled.keywords is not None):
+            keyword = compiled.keywords.search(message, 0, s.start())
+            if(keyword is not None):
+                index = compiled.keyword_rules[keyword.group(0).lower()]
+                if(best is None or index < best):
+                    best, code = index, s
+
+        if(best is None):
+            return None
+        return normalized(code), best
+
+
+class _CompiledRules(object):
+    """The rules of a MessageMatcher used in a channel, ready to be checked at once.
+    """
+
+    def __init__(self, rules, channel):
+        super().__init__()
+        self.code_rule = None # Index of the first code rule
+        self.commands = {} # Key: lowercase command, value: index of its first rule
+        self.keyword_rules = {} # Key: lowercase keyword, value: index of its first rule
+        self.keywords = None # Regexp of all the keywords
+
+        for index, rule in enumerate(rules):
+            if(not rule.used_in(channel)):
+                continue
+            if(rule.kind == RuleKind.Code):
+                if(self.code_rule is None):
+                    self.code_rule = index
+            elif(rule.kind == RuleKind.Command):
+                self.commands.setdefault(rule.text.lower(), index)
+            else:
+                self.keyword_rules.setdefault(rule.text.lower(), index)
+
+        if(self.keyword_rules):
+            # Longest first, so a keyword isn't hidden by one of its prefixes
+            keywords = sorted(self.keyword_rules, key=len, reverse=True)
+            self.keywords = re.compile(
+                r"\b(?:" + "|".join(re.escape(keyword) for keyword in keywords) + r")\b", re.IGNORECASE)
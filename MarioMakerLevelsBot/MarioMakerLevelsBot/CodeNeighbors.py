@@ -0,0 +1,62 @@
+
+class HammingIndex(object):
+    """Index of level codes to find the codes differing by exactly one character.
+
+    Uses a deletion neighborhood: each code is stored under one key per character
+    (16 for Super Mario Maker codes, 9 for Super Mario Maker 2 IDs),
+    each one being the code with one of its characters masked.
+    Two codes differing by a single character share the key masking that character,
+    so finding the neighbors of a code costs one dict lookup per character
+    whatever the number of codes in the index.
+    Codes of different formats have different lengths, so they never share a key.
+    """
+
+    def __init__(self):
+        super().__init__()
+        # Key: code characters with one of them masked
+        # Value: set of codes (strings) sharing that key
+        self.buckets = {}
+        self.codes = set()
+
+    def __len__(self):
+        return len(self.codes)
+
+    def add(self, code):
+        """Add a code to the index.
+        """
+        self.codes.add(code)
+        for key in self._keys(code):
+            self.buckets.setdefault(key, set()).add(code)
+
+    def remove(self, code):
+        """Remove a code from the index. Does nothing if it isn't in.
+        """
+        self.codes.discard(code)
+        for key in self._keys(code):
+            codes = self.buckets.get(key)
+            if(codes is not None):
+                codes.discard(code)
+                if(not codes):
+                    del self.buckets[key]
+
+    def clear(self):
+        """Remove all codes from the index.
+        """
+        self.buckets = {}
+        self.codes = set()
+
+    def neighbors(self, code):
+        """Return the set of indexed codes differing from code by exactly one digit.
+        """
+        result = set()
+        for key in self._keys(code):
+            result.update(self.buckets.get(key, ()))
+        result.discard(code)
+        return result
+
+    @staticmethod
+    def _keys(code):
+        """Return the masked keys of a code.
+        """
+        chars = code.replace("-", "")
+        return [ chars[:position] + "*" + chars[position + 1:] for position in range(len(chars)) ]
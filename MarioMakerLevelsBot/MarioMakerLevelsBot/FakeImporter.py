@@ -0,0 +1,184 @@
+import sys
+import time
+import array
+import bisect
+
+try:
+    import numpy
+except ImportError: # Optional, the codes are parsed one by one without it
+    numpy = None
+
+
+# Separators between the entries of the lists (lines, CSV fields), all made newlines
+_FIELD_SEPARATORS = b"\r,;\t"
+# Separators inside the codes and CSV quotes, removed
+_DROPPED = b"-_ \"'"
+_NORMALIZE = bytes.maketrans(_FIELD_SEPARATORS, b"\n" * len(_FIELD_SEPARATORS))
+
+CODE_LENGTH = 16 # Hex digits of a Super Mario Maker code
+
+if(numpy is not None):
+    # Value of each byte as a hex digit, 255 if it isn't one
+    _HEX_VALUES = numpy.full(256, 255, dtype=numpy.uint8)
+    for _index, _char in enumerate(b"0123456789ABCDEF"):
+        _HEX_VALUES[_char] = _index
+    _OFFSETS = numpy.arange(CODE_LENGTH)
+
+
+def _unique(values):
+    """Return the sorted unique values of a numpy array.
+    Sorting then comparing neighbors, much faster than numpy.unique for uint64 here.
+    """
+    values = numpy.sort(values)
+    if(len(values) == 0):
+        return values
+    return values[numpy.concatenate(([True], values[1:] != values[:-1]))]
+
+
+class CodeSet(object):
+    """Set of Super Mario Maker codes as sorted unique uint64 values (see CodeMatcher.encode_code),
+    8 bytes per code and no Python object for each of them.
+
+    Kept in a numpy array when numpy is available, an array.array otherwise.
+    A lookup is a binary search.
+    """
+
+    def __init__(self, values=None):
+        """values must be sorted and unique.
+        """
+        super().__init__()
+        if(values is None):
+            values = numpy.zeros(0, dtype=numpy.uint64) if numpy is not None else array.array("Q")
+        self.values = values
+
+    def __len__(self):
+        return len(self.values)
+
+    def __contains__(self, value):
+        if(numpy is not None):
+            index = int(numpy.searchsorted(self.values, numpy.uint64(value)))
+        else:
+            index = bisect.bisect_left(self.values, value)
+        return index < len(self.values) and int(self.values[index]) == value
+
+    def union(self, other):
+        """Return a CodeSet of the codes of both sets, and the number of codes of other not in self.
+        """
+        if(numpy is not None):
+            values = _unique(numpy.concatenate((self.values, other.values)))
+        else:
+            values = array.array("Q", sorted(set(self.values).union(other.values)))
+        return CodeSet(values), len(values) - len(self.values)
+
+    def save(self, filename):
+        """Write the codes to a file, as little-endian uint64.
+        """
+        with open(filename, "wb") as outfile:
+            if(numpy is not None):
+                self.values.astype("<u8").tofile(outfile)
+            else:
+                values = array.array("Q", self.values)
+                if(sys.byteorder == "big"):
+                    values.byteswap()
+                values.tofile(outfile)
+
+    @classmethod
+    def load(cls, filename):
+        """Return the CodeSet saved to a file by save.
+        """
+        with open(filename, "rb") as infile:
+            data = infile.read()
+        if(numpy is not None):
+            return cls(numpy.frombuffer(data, dtype="<u8").astype(numpy.uint64))
+        values = array.array("Q")
+        values.frombytes(data)
+        if(sys.byteorder == "big"):
+            values.byteswap()
+        return cls(values)
+
+
+def _parse_fields(data):
+    """Return (values, malformed) of the normalized fields of data (codes without separators,
+    each one ending with a newline): the uint64 values of the valid codes
+    and the number of other non-empty fields.
+    """
+    if(numpy is None):
+        values = []
+        malformed = 0
+        for field in data.split(b"\n"):
+            if(not field):
+                continue
+            try:
+                if(len(field) != CODE_LENGTH):
+                    raise ValueError()
+                values.append(int(field, 16))
+            except ValueError:
+                malformed += 1
+        return values, malformed
+
+    # The fields are found from the positions of the newlines, no Python object for each of them
+    buffer = numpy.frombuffer(data, dtype=numpy.uint8)
+    ends = numpy.flatnonzero(buffer == ord("\n"))
+    starts = numpy.concatenate(([0], ends[:-1] + 1))
+    lengths = ends - starts
+    code_starts = starts[lengths == CODE_LENGTH]
+    digits = _HEX_VALUES[buffer[code_starts[:, None] + _OFFSETS]]
+    digits = digits[(digits != 255).all(axis=1)]
+    # Two hex digits per byte, the 8 bytes read as a big-endian integer
+    packed = numpy.ascontiguousarray((digits[:, 0::2] << 4) | digits[:, 1::2])
+    values = packed.view(">u8").ravel().astype(numpy.uint64)
+    malformed = int(numpy.count_nonzero(lengths)) - len(values)
+    return values, malformed
+
+def read_codes(infile, chunk_size=1 << 22, progress=None):
+    """Read a list of Super Mario Maker codes from a binary file object: text or CSV,
+    the codes separated by lines, commas, semicolons or tabs, with or without dashes,
+    spaces or underscores inside, in any case. Anything else is counted as malformed
+    (Super Mario Maker 2 IDs included, the list holds hex codes only).
+
+    The file is read by chunks of chunk_size bytes, parsed with numpy when available.
+    progress is called with the number of bytes read after each chunk.
+
+    Return (CodeSet of the codes, stats), stats being a dict of:
+    'valid', 'malformed', 'duplicates' (codes found more than once),
+    'codes' (unique), 'bytes', 'seconds', 'codes_per_s' (valid codes read per second).
+    """
+    start = time.perf_counter()
+    parts = []
+    valid = malformed = size = 0
+    remainder = b""
+
+    while(True):
+        chunk = infile.read(chunk_size)
+        size += len(chunk)
+        data = remainder + chunk.upper().translate(_NORMALIZE, _DROPPED)
+        if(chunk):
+            # The last field may continue in the next chunk
+            cut = data.rfind(b"\n") + 1
+            data, remainder = data[:cut], data[cut:]
+        else:
+            data = data + b"\n"
+
+        values, bad = _parse_fields(data)
+        valid += len(values)
+        malformed += bad
+        if(numpy is not None):
+            parts.append(_unique(values)) # Deduplicated as it goes, to keep less in memory
+        else:
+            parts.append(values)
+
+        if(progress is not None):
+            progress(size)
+        if(not chunk):
+            break
+
+    if(numpy is not None):
+        codes = CodeSet(_unique(numpy.concatenate(parts)))
+    else:
+        codes = CodeSet(array.array("Q", sorted(set(value for part in parts for value in part))))
+
+    seconds = time.perf_counter() - start
+    stats = { 'valid': valid, 'malformed': malformed, 'duplicates': valid - len(codes),
+              'codes': len(codes), 'bytes': size, 'seconds': seconds,
+              'codes_per_s': valid / seconds if seconds > 0 else 0.0 }
+    return codes, stats
@@ -0,0 +1,144 @@
+import time
+import threading
+
+
+class _CountBucket(object):
+    """Items of a SpaceSaving summary having the same count,
+    in a doubly linked list of the counts in ascending order.
+    """
+    __slots__ = ("count", "items", "previous", "next")
+
+    def __init__(self, count):
+        self.count = count
+        self.items = set()
+        self.previous = None
+        self.next = None
+
+
+class SpaceSaving(object):
+    """Space-Saving summary: approximate counts of the most frequent items
+    using at most capacity counters.
+
+    When a new item arrives and all counters are used, the item with the
+    lowest count is replaced, the new item inheriting its count.
+    Any item more frequent than total / capacity is guaranteed to be kept.
+
+    The items are kept in buckets of the same count, linked in ascending order
+    (stream-summary): an item counted moves to the next bucket, and the item replaced
+    is taken from the first one, in O(1) whatever the capacity.
+    """
+
+    def __init__(self, capacity):
+        super().__init__()
+        self.capacity = capacity
+        self.bucket_of = {} # Key: item, value: its _CountBucket (count overestimated by at most the evicted count)
+        self.lowest = None # Bucket of the lowest count, None when empty
+
+    def add(self, item):
+        """Count one occurrence of item. O(1).
+        """
+        bucket = self.bucket_of.get(item, None)
+        if(bucket is None):
+            if(len(self.bucket_of) < self.capacity):
+                if(self.lowest is None or self.lowest.count != 0):
+                    self._link(_CountBucket(0), None)
+            else:
+                del self.bucket_of[self.lowest.items.pop()] # Replaced, its count goes on
+            bucket = self.lowest
+            bucket.items.add(item)
+
+        # Moved to the bucket of the next count
+        following = bucket.next
+        if(following is None or following.count != bucket.count + 1):
+            following = _CountBucket(bucket.count + 1)
+            self._link(following, bucket)
+        bucket.items.remove(item)
+        following.items.add(item)
+        self.bucket_of[item] = following
+        if(not bucket.items):
+            self._unlink(bucket)
+
+    def items(self):
+        """Return the (item, count) pairs counted.
+        """
+        return [ (item, bucket.count) for item, bucket in self.bucket_of.items() ]
+
+    def clear(self):
+        """Forget all counts.
+        """
+        self.bucket_of = {}
+        self.lowest = None
+
+    def _link(self, bucket, previous):
+        """Put a bucket in the list after previous, first if previous is None.
+        """
+        bucket.previous = previous
+        bucket.next = self.lowest if previous is None else previous.next
+        if(bucket.next is not None):
+            bucket.next.previous = bucket
+        if(previous is None):
+            self.lowest = bucket
+        else:
+            previous.next = bucket
+
+    def _unlink(self, bucket):
+        """Take an empty bucket out of the list.
+        """
+        if(bucket.previous is None):
+            self.lowest = bucket.next
+        else:
+            bucket.previous.next = bucket.next
+        if(bucket.next is not None):
+            bucket.next.previous = bucket.previous
+
+
+class SlidingTopK(object):
+    """Most frequent items over the last window seconds, in constant memory.
+
+    The window is split in buckets, each one being a SpaceSaving summary.
+    Buckets older than the window are recycled, so the memory only depends
+    on the number of buckets and their capacity, not on the chat volume.
+    """
+
+    def __init__(self, window=60, buckets=6, capacity=64, clock=time.monotonic):
+        super().__init__()
+        self.window = window
+        self.bucket_width = window / buckets
+        self.clock = clock
+        self.buckets = [ SpaceSaving(capacity) for i in range(buckets) ]
+        self.current = int(self.clock() // self.bucket_width) # Number of the current bucket
+        self.lock = threading.Lock()
+
+    def add(self, item):
+        """Count one occurrence of item now.
+        """
+        with self.lock:
+            self._rotate()
+            self.buckets[self.current % len(self.buckets)].add(item)
+
+    def top(self, k=5):
+        """Return the k most frequent items in the window, as a list of (item, count).
+        """
+        with self.lock:
+            self._rotate()
+            totals = {}
+            for bucket in self.buckets:
+                for item, count in bucket.items():
+                    totals[item] = totals.get(item, 0) + count
+
+        return sorted(totals.items(), key=lambda x: x[1], reverse=True)[:k]
+
+    def clear(self):
+        """Forget all counts.
+        """
+        with self.lock:
+            for bucket in self.buckets:
+                bucket.clear()
+
+    def _rotate(self):
+        """Clear the buckets that went out of the window since the last call.
+        """
+        now = int(self.clock() // self.bucket_width)
+        for number in range(max(self.current + 1, now - len(self.buckets) + 1), now + 1):
+            self.buckets[number % len(self.buckets)].clear()
+        self.current = max(self.current, now)
@@ -0,0 +1,419 @@
+import sys
+import time
+import uuid
+import queue
+import struct
+import multiprocessing
+from multiprocessing import shared_memory
+
+from PySide import QtCore
+
+import ChatListener
+import CodeMatcher
+import TwitchTags
+
+
+CACHE_STATS_INTERVAL = 256 # Messages matched between two cache statistics sent to the GUI
+
+
+class LevelEventRing(object):
+    """Ring buffer of level events in shared memory, for one writing and one reading process.
+
+    The writer only moves the head, the reader only moves the tail,
+    so neither has to lock. When the ring is full, new events are dropped and counted:
+    the writer (reading the chat) never waits for the reader.
+    """
+
+    HEADER = struct.Struct("<QQQQ") # head, tail, capacity, dropped events
+    # code value, user id, channel index, tag bits, matching rule index, code format, timestamp,
+    # message id (a UUID, zeros if unknown)
+    EVENT = struct.Struct("<QQHHHBxd16s")
+
+    def __init__(self, name=None, capacity=65536):
+        """Create a new ring if name is None, or attach to the existing ring name.
+        """
+        super().__init__()
+        self.owner = name is None
+        if(self.owner):
+            self.memory = shared_memory.SharedMemory(
+                create=True, size=self.HEADER.size + capacity * self.EVENT.size)
+            self.HEADER.pack_into(self.memory.buf, 0, 0, 0, capacity, 0)
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+        self.capacity = self.HEADER.unpack_from(self.memory.buf, 0)[2]
+
+    @property
+    def name(self):
+        return self.memory.name
+
+    def put(self, code, user_id, channel, tag_bits, rule, timestamp, message_id=""):
+        """Write an event, code being an integer key (see CodeMatcher.encode_code)
+        and message_id the id tag of the message.
+        Return False if the ring was full and the event dropped.
+        Only called by the writing process.
+        """
+        head, tail, capacity, dropped = self.HEADER.unpack_from(self.memory.buf, 0)
+        if(head - tail >= capacity):
+            struct.pack_into("<Q", self.memory.buf, 24, dropped + 1)
+            return False
+
+        try:
+            message_bytes = uuid.UUID(message_id).bytes
+        except ValueError: # Not a UUID, the message can't be found when deleted
+            message_bytes = bytes(16)
+
+        id_format, value = CodeMatcher.split_key(code)
+        self.EVENT.pack_into(self.memory.buf, self.HEADER.size + (head % capacity) * self.EVENT.size,
+                             value, user_id, channel, tag_bits, rule, id_format, timestamp, message_bytes)
+        struct.pack_into("<Q", self.memory.buf, 0, head + 1) # Publish once the event is written
+        return True
+
+    def drain(self, limit=None):
+        """Return the list of the events written since the last drain, oldest first,
+        at most limit of them, as (code, user id, channel, tag bits, rule, timestamp, message id) tuples.
+        Only called by the reading process.
+        """
+        head, tail, capacity, dropped = self.HEADER.unpack_from(self.memory.buf, 0)
+        if(limit is not None):
+            head = min(head, tail + limit)
+
+        events = []
+        for index in range(tail, head):
+            value, user_id, channel, bits, rule, id_format, timestamp, message_bytes = self.EVENT.unpack_from(
+                self.memory.buf, self.HEADER.size + (index % capacity) * self.EVENT.size)
+            message_id = str(uuid.UUID(bytes=message_bytes)) if any(message_bytes) else ""
+            events.append((CodeMatcher.join_key(id_format, value), user_id, channel, bits, rule, timestamp,
+                           message_id))
+        struct.pack_into("<Q", self.memory.buf, 8, head)
+        return events
+
+    def pending(self):
+        """Return the number of events written and not read yet.
+        """
+        head, tail, capacity, dropped = self.HEADER.unpack_from(self.memory.buf, 0)
+        return head - tail
+
+    def dropped(self):
+        """Return the number of events dropped because the ring was full.
+        """
+        return self.HEADER.unpack_from(self.memory.buf, 0)[3]
+
+    def close(self):
+        """Detach from the ring, and destroy it if it was created here.
+        """
+        self.memory.close()
+        if(self.owner):
+            self.memory.unlink()
+
+
+def tag_bits(tags):
+    """Pack the tags used by the levels list in an integer.
+    Bit 0: subscriber, bits 1 to 3: user type.
+    """
+    if(tags is None):
+        return 0
+    return int(bool(tags.get('subscriber', False))) | (int(tags.get('user-type', 0)) << 1)
+
+def tags_from_bits(bits, display_name, message_id=""):
+    """Return the tags packed by tag_bits, as a dict like TwitchTags.get_tags.
+    """
+    return { 'subscriber': bool(bits & 1),
+             'user-type': TwitchTags.user_type((bits >> 1) & 0x7),
+             'display-name': display_name,
+             'id': message_id }
+
+
+def _ingestion_main(ring_name, events, control, name, oauth, channels, host, port, rules, repeats, commands):
+    """Main function of the ingestion process: reads the chat, finds the codes
+    with the matching rules and writes them as level events in the ring.
+
+    The user names, connection signals, chat commands and other rare events go through
+    the events queue, with the cache statistics of the matcher now and then. New rules,
+    repeat counting and commands, messages to send and the stop command come through
+    the control queue.
+    """
+    if(sys.stdout is None): # Started from the GUI executable: no console, like the main process
+        logfile = open("log_ingestion.txt", "w")
+        sys.stdout = logfile
+        sys.stderr = logfile
+
+    ring = LevelEventRing(ring_name)
+    channel_ids = { channel.lower().replace("#", ""): index for index, channel in enumerate(channels) }
+    user_ids = {} # Key: user name, value: user id in the events
+    matcher = CodeMatcher.MessageMatcher(rules, repeats)
+    commands = set(commands) # Lowercase commands forwarded to the GUI
+
+    listener = ChatListener.ChatListener(name, oauth, channels, host=host, port=port)
+    # No event loop in this process: the signals are emitted from the listener thread,
+    # so they have to call the functions directly
+    direct = QtCore.Qt.DirectConnection
+    listener.wrong_password.connect(lambda: events.put(("wrong_password",)), direct)
+    listener.connection_failed.connect(lambda: events.put(("connection_failed",)), direct)
+    listener.connection_successful.connect(
+        lambda channel: events.put(("connection_successful", channel)), direct)
+    listener.user_cleared.connect(
+        lambda channel, user, duration: events.put(("user_cleared", channel, user, duration)), direct)
+    listener.chat_cleared.connect(lambda channel: events.put(("chat_cleared", channel)), direct)
+    listener.message_deleted.connect(
+        lambda channel, user, message_id: events.put(("message_deleted", channel, user, message_id)), direct)
+    listener.room_state.connect(lambda channel, state: events.put(("room_state", channel, state)), direct)
+
+    def publish(channel, name, tags, message):
+        if(commands and message.split(" ", 1)[0].lower() in commands):
+            display_name = tags.get("display-name", "") if tags is not None else ""
+            events.put(("command", channel, name, display_name, tag_bits(tags), message))
+            return
+
+        match = matcher.match(message, channel, name)
+        if(matcher.lookups % CACHE_STATS_INTERVAL == 0):
+            events.put(("cache_stats", matcher.cache_stats()))
+        if(match is None):
+            return
+        code, rule = match
+
+        user_id = user_ids.get(name, None)
+        if(user_id is None):
+            user_id = user_ids[name] = len(user_ids)
+            display_name = tags.get("display-name", "") if tags is not None else ""
+            events.put(("user", user_id, name, display_name))
+
+        message_id = tags.get("id", "") if tags is not None else ""
+        ring.put(CodeMatcher.encode_code(code), user_id, channel_ids.get(channel, 0),
+                 tag_bits(tags), rule, time.time(), message_id)
+
+    listener.add_callback(publish)
+    listener.start()
+
+    while(True):
+        command = control.get()
+        if(command == "stop"):
+            break
+        if(command[0] == "rules"):
+            matcher.set_rules(command[1])
+        elif(command[0] == "repeats"):
+            matcher.set_repeat_counting(command[1])
+        elif(command[0] == "commands"):
+            commands = set(command[1])
+        elif(command[0] == "send"):
+            listener.send_message(command[1], command[2])
+
+    listener.reset_callbacks()
+    ring.close()
+
+
+class IngestionProcess(QtCore.QObject):
+    """Reads the Twitch chat and finds the codes in a separate process,
+    not to compete with the GUI for the Python interpreter.
+
+    Has the same interface as a ChatListener, but the callbacks only receive
+    the messages matched by the matcher's rules (the code as message), and are called
+    from the GUI thread when the events are drained from the ring.
+    The hits of the rules and the cache statistics are counted in the matcher.
+    """
+
+    wrong_password = QtCore.Signal()
+    connection_failed = QtCore.Signal()
+    connection_successful = QtCore.Signal(str)
+    user_cleared = QtCore.Signal(str, str, int)
+    chat_cleared = QtCore.Signal(str)
+    message_deleted = QtCore.Signal(str, str, str)
+    room_state = QtCore.Signal(str, object)
+
+    DRAIN_INTERVAL = 15 # milliseconds between two reads of the ring
+    DRAIN_LIMIT = 2000 # events handled at most per read, to keep the GUI responsive
+
+    def __init__(self, name, oauth, channels, parent=None, host=None, port=None, capacity=65536,
+                 matcher=None):
+        """Create the IngestionProcess object. The process starts with start().
+
+        matcher is the CodeMatcher.MessageMatcher whose rules are used to find the codes.
+        """
+        super().__init__()
+        self.name = name
+        self.oauth = oauth
+        self.channels = [ channel.lower().replace("#", "") for channel in channels ]
+        self.parent = parent
+        self.host = host
+        self.port = port
+        self.capacity = capacity
+        self.matcher = matcher or CodeMatcher.MessageMatcher()
+
+        self.callbacks = []
+        self.command_callbacks = {} # Key: lowercase command, value: list of callbacks
+        self.users = {} # Key: user id, value: (name, display name)
+        self.backlog = [] # Events drained before their user was known
+        self.last_latency = 0.0
+
+        self.ring = None
+        self.process = None
+        self.events = multiprocessing.Queue()
+        self.control = multiprocessing.Queue()
+        self.timer = QtCore.QTimer(self)
+        self.timer.timeout.connect(self._drain)
+
+    def start(self):
+        """Start the ingestion process.
+        """
+        if(self.process is not None):
+            return
+
+        self.ring = LevelEventRing(capacity=self.capacity)
+        self.process = multiprocessing.Process(
+            target=_ingestion_main,
+            args=(self.ring.name, self.events, self.control, self.name, self.oauth,
+                  self.channels, self.host, self.port, self.matcher.rules, self.matcher.repeats,
+                  list(self.command_callbacks)))
+        self.process.daemon = True
+        self.process.start()
+        self.timer.start(self.DRAIN_INTERVAL)
+
+    def stop(self):
+        """Stop the ingestion process.
+        """
+        if(self.process is None):
+            return
+
+        self.timer.stop()
+        self.control.put("stop")
+        self.process.join(1)
+        if(self.process.is_alive()):
+            self.process.terminate()
+        self.process = None
+        self.ring.close()
+        self.ring = None
+
+    def set_rules(self, rules):
+        """Change the matching rules, in the matcher and the ingestion process.
+        """
+        self.matcher.set_rules(rules)
+        if(self.process is not None):
+            self.control.put(("rules", self.matcher.rules))
+
+    def set_repeat_counting(self, repeats):
+        """Change how the copies of a message count, in the matcher and the ingestion process.
+        """
+        self.matcher.set_repeat_counting(repeats)
+        if(self.process is not None):
+            self.control.put(("repeats", repeats))
+
+    def isAlive(self):
+        """Return True if the ingestion process is running, False otherwise."""
+        return self.process is not None and self.process.is_alive()
+
+    def add_callback(self, callback, *args, **kwargs):
+        """Add a callback to give codes to.
+
+        The callback prototype must be compatible with:
+        callback(channel, name, tags, message)"""
+        if(callback not in self.callbacks):
+            self.callbacks.append(callback)
+
+    def remove_callback(self, callback):
+        """Remove a callback from the list of callbacks."""
+        try:
+            self.callbacks.remove(callback)
+        except ValueError:
+            pass
+
+    def reset_callbacks(self):
+        """Remove all callbacks"""
+        self.callbacks = []
+        self.command_callbacks = {}
+        self._send_commands()
+
+    def add_command_callback(self, command, callback):
+        """Add a callback for the messages starting with a command (like !position),
+        forwarded by the ingestion process. Called from the GUI thread.
+
+        The callback prototype must be compatible with:
+        callback(channel, name, tags, message)"""
+        callbacks = self.command_callbacks.setdefault(command.lower(), [])
+        if(callback not in callbacks):
+            callbacks.append(callback)
+            self._send_commands()
+
+    def remove_command_callback(self, command, callback):
+        """Remove a callback added by add_command_callback."""
+        callbacks = self.command_callbacks.get(command.lower(), [])
+        if(callback in callbacks):
+            callbacks.remove(callback)
+            if(not callbacks):
+                del self.command_callbacks[command.lower()]
+            self._send_commands()
+
+    def send_message(self, channel, message):
+        """Send a message to a channel's chat, through the ingestion process.
+
+        Return True if it was given to the process, False otherwise (not running)."""
+        if(self.process is None):
+            return False
+        self.control.put(("send", channel, message))
+        return True
+
+    def callbacks_lag(self):
+        """Return how far behind the GUI is, for each callback (same for all of them).
+        """
+        pending = 0 if self.ring is None else self.ring.pending()
+        dropped = 0 if self.ring is None else self.ring.dropped()
+        lag = { 'pending': pending + len(self.backlog), 'dropped': dropped,
+                'last_latency': self.last_latency }
+        return { callback: lag for callback in self.callbacks }
+
+    def _send_commands(self):
+        """Tell the ingestion process which commands to forward.
+        """
+        if(self.process is not None):
+            self.control.put(("commands", list(self.command_callbacks)))
+
+    def _drain(self):
+        """Read the events sent by the ingestion process and call the callbacks.
+        Called regularly by the timer, in the GUI thread.
+        """
+        signals = [] # Emitted after the levels, a ban has to remove the levels posted before it
+        while(True):
+            try:
+                event = self.events.get_nowait()
+            except queue.Empty:
+                break
+
+            if(event[0] == "user"):
+                self.users[event[1]] = (event[2], event[3])
+            elif(event[0] == "cache_stats"): # Shown with the matcher's own
+                stats = event[1]
+                self.matcher.lookups = stats['lookups']
+                self.matcher.cache_hits = stats['hits']
+                self.matcher.repeats_dropped = stats['dropped']
+            elif(event[0] == "command"):
+                command, channel, name, display_name, bits, message = event
+                tags = tags_from_bits(bits, display_name)
+                for callback in list(self.command_callbacks.get(message.split(" ", 1)[0].lower(), ())):
+                    callback(channel, name, tags, message)
+            else:
+                signals.append(event)
+
+        if(self.ring is not None):
+            self._drain_ring()
+
+        for event in signals:
+            getattr(self, event[0]).emit(*event[1:])
+
+    def _drain_ring(self):
+        """Read the level events of the ring and call the callbacks.
+        """
+        events = self.backlog + self.ring.drain(self.DRAIN_LIMIT)
+        self.backlog = []
+
+        for index, (code, user_id, channel, bits, rule, timestamp, message_id) in enumerate(events):
+            user = self.users.get(user_id, None)
+            if(user is None): # The user name is still in the events queue
+                self.backlog = events[index:]
+                break
+
+            name, display_name = user
+            tags = tags_from_bits(bits, display_name, message_id)
+            code = CodeMatcher.decode_code(code)
+            if(rule < len(self.matcher.hits)): # The rules may have changed since
+                self.matcher.hits[rule] += 1
+            for callback in list(self.callbacks):
+                callback(self.channels[channel], name, tags, code)
+            self.last_latency = time.time() - timestamp
@@ -1,25 +1,42 @@
 ﻿
+import os
+import sys
+import csv
 import enum
+import json
+import math
+import functools
 import pickle
 import bisect
 import datetime
+import itertools
 import threading
+import collections
 
 from PySide import QtCore, QtGui
 from PySide.QtCore import QModelIndex
 from PySide.QtCore import Qt
 
+import CodeMatcher
+import TwitchTags
+import FakeImporter
+import MemoryUsage
+from CodeNeighbors import HammingIndex
+from RandomSelection import WeightedSampler
+from PrefixIndex import PrefixIndex
+
 class Filters(enum.IntEnum):
     """Enumerates all the filters.
     The numbers are powers of two to enable bitwise operations to select filters.
     AllFilters should be the number of all filters enabled bitwise.
     """
     NoFilter = 0
-    AllFilters = 0x0F
+    AllFilters = 0x1F
     Fake = 1
     PotentiallyFake = 2
     NonSubs = 4
     NonMods = 8
+    AlreadyPlayed = 16 # In the PlayedHistory, played in this session or an earlier one
 
 class Sorting(enum.IntEnum):
     """Enumerates all the sorting options.
@@ -27,49 +44,147 @@ class Sorting(enum.IntEnum):
     in case multiple sorting options can be selected at the same time.
     """
     NoSorting = 0 # Unlikely but to keep boolean logic
-    AllSorting = 0x3F # Even more unlikely but may be used in bitwise operations maybe
+    AllSorting = 0x7F # Even more unlikely but may be used in bitwise operations maybe
     Reversed = 1 # This flag means the sorting is reversed, or in descending order.
     Date = 2
     Code = 4
     User = 8
     Priviledges = 16
     TimesRequested = 32
+    Hotness = 64 # Recently and repeatedly requested first, see Level.request
+
+# Shared text colors, not to create a QColor at each repaint
+FAKE_COLOR = QtGui.QColor("red")
+POTENTIALLY_FAKE_COLOR = QtGui.QColor("orange")
+ALREADY_PLAYED_COLOR = QtGui.QColor("gray")
+
+class RandomStrategy(enum.IntEnum):
+    """Enumerates the ways a random level can be chosen.
+    """
+    Uniform = 0 # All levels have the same chance
+    TimesRequested = 1 # The more a level was requested, the more chance it has
+    Priviledges = 2 # Levels from subs and mods have more chance
+    Recency = 3 # Recent levels have more chance
+
+class Tier(enum.IntEnum):
+    """Enumerates the privilege tiers of the users, each with its own submission quota.
+    """
+    Viewer = 0
+    Sub = 1
+    Mod = 2 # Mods and above (broadcaster, staff...), subscribed or not
+
+def tier_of(tags):
+    """Return the Tier of a user from the tags of their message (None if there are none).
+    """
+    if(tags is None):
+        return Tier.Viewer
+    if(tags.get('user-type', 0) > 0):
+        return Tier.Mod
+    if(tags.get('subscriber', False)):
+        return Tier.Sub
+    return Tier.Viewer
 
 
 class Level(object):
     """The class representing a Mario Maker Level for the following model."""
 
-    def __init__(self, date, code, name, tags):
+    _sequence = itertools.count() # Order of creation, to break ties when sorting
+
+    RECENCY_HALF_LIFE = 300 # In seconds, for the Recency random strategy
+
+    # Hotness: each request counts 1, halved every HOTNESS_HALF_LIFE seconds after it.
+    # All the hotnesses decay at the same rate, so their order only changes with new requests:
+    # the log of the hotness at HOTNESS_EPOCH is kept instead, and never recomputed as time passes.
+    HOTNESS_HALF_LIFE = 600
+    HOTNESS_EPOCH = datetime.datetime(2015, 9, 11) # Any fixed date, Super Mario Maker's release
+
+    history = None # PlayedHistory of the codes already played, if any
+
+    def __init__(self, date, code, name, tags, user=None):
+        """Create a level. name is the name shown, user the login of the user (lowercase),
+        name in lowercase by default.
+        """
         super().__init__()
+        self.seq = next(Level._sequence)
+        self.view_key = None # Key of the level in the view_keys of its model, if shown
         self.date = date
         self.code = code
         self.name = name
-        self.tags = tags
+        self.user = name.lower() if user is None else user
+        self.tags = TwitchTags.compact_tags(tags) # Only the tags read again, shared with the other levels of the user
         self.times_requested = 1
+        self.hotness = self._log_heat(date) # Log of the hotness at HOTNESS_EPOCH
         self.filters = Filters.NoFilter
+        self.variants = None # When grouping near-duplicates: key: code, value: times requested
+        self.rendered = None # Cache of the texts and color shown in the view
 
         self.check_filters()
 
     def __repr__(self):
         return str(self.__dict__)
 
+    def __setstate__(self, state):
+        """Restore a pickled Level.
+        Gives default values to the attributes older versions didn't have.
+        """
+        self.variants = None
+        self.user = state['name'].lower()
+        self.hotness = None
+        self.__dict__.update(state)
+        if(self.hotness is None): # As if all the requests were made when it was added
+            self.hotness = self._log_heat(self.date) + math.log(self.times_requested)
+        self.tags = TwitchTags.compact_tags(self.tags) # Older versions kept all the tags
+        self.seq = next(Level._sequence)
+        self.view_key = None
+        self.rendered = None
+
+    def __getstate__(self):
+        """Return the Level state to pickle, without what is specific to a model or a view.
+        """
+        state = self.__dict__.copy()
+        del state['view_key']
+        del state['rendered']
+        return state
+
+    def request(self, date):
+        """Count one more request of the level, made at date.
+        """
+        self.times_requested += 1
+        # log(e^hotness + e^heat), without overflowing
+        heat = self._log_heat(date)
+        high, low = max(self.hotness, heat), min(self.hotness, heat)
+        self.hotness = high + math.log1p(math.exp(low - high))
+        self.invalidate_render()
+
+    @classmethod
+    def _log_heat(cls, date):
+        """Return the log of the hotness at HOTNESS_EPOCH of a request made at date.
+        """
+        if(date is None):
+            return 0.0
+        return (date - cls.HOTNESS_EPOCH).total_seconds() * math.log(2) / cls.HOTNESS_HALF_LIFE
+
     def check_filters(self):
         """Check which filters may apply to this Level.
         """
+        self.invalidate_render()
+
         try:
             if(self.fakes_model.check_code_in_model(self.code)):
                 self.filters |= Filters.Fake
         except AttributeError: # No fakes model has been set.
             pass
 
+        if(self.history is not None and self.history.check_code_in_model(self.code)):
+            self.filters |= Filters.AlreadyPlayed
+
         self.check_potentially_fake()
         self.check_tags()
 
     def check_potentially_fake(self):
-        """Check if the code is potentially fake due to its form.
+        """Check if the code is potentially fake due to its form (depends on the format).
         """
-        # Check if the second group of numbers is different than 0000
-        if(self.code[5:9] != "0000"):
+        if(CodeMatcher.is_potentially_fake(self.code)):
             self.filters |= Filters.PotentiallyFake
 
     def check_tags(self):
@@ -81,6 +196,46 @@ class Level(object):
         if(self.tags is None or not self.tags.get('user-type', 0) > 0):
             self.filters |= Filters.NonMods
 
+    def render(self):
+        """Return the texts shown in each column and the text color of the level.
+
+        Computed once and cached until invalidate_render is called.
+        The row number column is left to the model.
+        """
+        if(self.rendered is None):
+            if(self.filters & Filters.Fake): # Fake flag is on
+                color = FAKE_COLOR
+            elif(self.filters & Filters.PotentiallyFake): # Potentially fake flag is on
+                color = POTENTIALLY_FAKE_COLOR
+            elif(self.filters & Filters.AlreadyPlayed):
+                color = ALREADY_PLAYED_COLOR
+            else:
+                color = None
+
+            self.rendered = ((None, self.code, self.name, self.privileges(), self.times_requested), color)
+
+        return self.rendered
+
+    def privileges(self):
+        """Return the text describing the privileges of the user who requested the level.
+        """
+        tags = self.tags
+        if(tags is None):
+            return ""
+        elif(tags.get('subscriber', False) and tags.get('user-type', 0)): # tags['user-type'] > 0
+            return "Sub and Mod"
+        elif(tags.get('subscriber', False)):
+            return "Sub"
+        elif(tags.get('user-type')): # tags['user-type'] > 0
+            return "Mod"
+        else:
+            return ""
+
+    def invalidate_render(self):
+        """Forget the cached texts and color, after the filters or counts changed.
+        """
+        self.rendered = None
+
     @classmethod
     def key(self, sorting):
         """Return a key function to sort a Level according to the sorting parameter.
@@ -104,12 +259,93 @@ class Level(object):
         if(sorting & Sorting.TimesRequested):
             return (lambda x: x.times_requested)
 
+        if(sorting & Sorting.Hotness):
+            return (lambda x: -x.hotness) # Hottest first
+
+    @classmethod
+    def weight(self, strategy):
+        """Return a weight function to draw a random Level according to the strategy parameter.
+        The weight function prototype is weight(level, epoch).
+        """
+        if(strategy == RandomStrategy.TimesRequested):
+            return (lambda x, epoch: x.times_requested)
+
+        if(strategy == RandomStrategy.Priviledges):
+            # Each priviledge doubles the chance
+            return (lambda x, epoch: 4 >> ((x.filters & Filters.NonSubs != 0) + (x.filters & Filters.NonMods != 0)))
+
+        if(strategy == RandomStrategy.Recency):
+            # Chance divided by two every RECENCY_HALF_LIFE seconds, relative to the epoch
+            return (lambda x, epoch: math.exp(
+                (x.date - epoch).total_seconds() / self.RECENCY_HALF_LIFE * math.log(2)))
+
+        return (lambda x, epoch: 1)
+
     @classmethod
     def set_fake_model(cls, model):
         """Set a model as containing all the fake levels.
         """
         cls.fakes_model = model
 
+    @classmethod
+    def set_history(cls, history):
+        """Set the PlayedHistory of the codes already played.
+        """
+        cls.history = history
+
+class _ProgressReader(object):
+    """File wrapper reporting the percentage read, for loading in the background.
+    """
+
+    def __init__(self, infile, callback):
+        super().__init__()
+        self.infile = infile
+        self.callback = callback
+        self.size = max(os.fstat(infile.fileno()).st_size, 1)
+        self.percent = -1
+
+    def read(self, size=-1):
+        return self._report(self.infile.read(size))
+
+    def readline(self, size=-1):
+        return self._report(self.infile.readline(size))
+
+    def readinto(self, buffer):
+        count = self.infile.readinto(buffer)
+        self._report(None)
+        return count
+
+    def _report(self, data):
+        percent = self.infile.tell() * 100 // self.size
+        if(percent != self.percent):
+            self.percent = percent
+            self.callback(percent)
+        return data
+
+@functools.lru_cache(maxsize=4096)
+def _row_label(row):
+    """Return the text shown in the row number column.
+    Cached as the same rows are repainted again and again.
+    """
+    return "{}".format(row+1)
+
+def _store_codes(levels):
+    """Return the codes of the levels as integers for a SharedFakeStore,
+    skipping the codes it can't hold (saved by older versions).
+    """
+    codes = []
+    for level in levels:
+        try:
+            codes.append(CodeMatcher.encode_code(level.code))
+        except ValueError:
+            pass
+    return codes
+
+def normalize_code(code):
+    """Return the code in upper case without separators, to compare codes or parts of codes.
+    """
+    return code.upper().replace("-", "").replace(" ", "").replace("_", "")
+
 class Columns(enum.IntEnum):
     """Names the columns in the model
     """
@@ -118,12 +354,30 @@ class Columns(enum.IntEnum):
     User = 2
     Tags = 3
     TimesRequested = 4
+    Submissions = 5 # Of the user, all levels included
 
 
 
 class LevelListModel(QtCore.QAbstractTableModel):
     """The Qt model for the levels list"""
 
+    export_finished = QtCore.Signal(str, int) # filename, number of levels exported
+    export_failed = QtCore.Signal(str, str) # filename, error
+
+    quota_exceeded = QtCore.Signal(str, str) # user name, code refused
+
+    load_progress = QtCore.Signal(int) # percentage of the file loaded
+    load_finished = QtCore.Signal(set) # codes looked up while loading that are in the model
+    _loaded = QtCore.Signal(object) # levels dict unpickled by the loading thread
+
+    import_finished = QtCore.Signal(object) # import statistics, see FakeImporter.read_codes
+    import_failed = QtCore.Signal(str, str) # filename, error
+    _imported = QtCore.Signal(object, object) # CodeSet and statistics of the importing thread
+
+    # Around a level being shown or moved in the view, see _add_level_to_view and _move_level_in_view
+    key_about_to_change = QtCore.Signal(object, object) # Level, its new key in view_keys
+    key_changed = QtCore.Signal(object) # Level
+
     def __init__(self, parent=None):
         """Initialize the model.
         Loading the levels from a file?"""
@@ -133,6 +387,18 @@ class LevelListModel(QtCore.QAbstractTableModel):
         self.filters = Filters.NoFilter
         self.sorting = Sorting.Date
 
+        # Background loading
+        self.loading = False
+        self.loading_codes = None # Temporary lookup of the codes in the file being loaded
+        self.looked_up_while_loading = set() # Codes checked before the loading finished
+        self.loading_lock = threading.Lock() # The chat threads look codes up while the loading ends
+        self._loaded.connect(self._finish_loading)
+        self.loaded_imported_codes = None # Imported codes read by the loading thread
+
+        # Codes imported from external lists, without a Level for each of them
+        self.imported_codes = FakeImporter.CodeSet()
+        self._imported.connect(self._finish_import)
+
         # Contains all the submitted levels.
         # Key: level code
         # Value: Level instance
@@ -145,6 +411,34 @@ class LevelListModel(QtCore.QAbstractTableModel):
         self.view_keys = [] # keys for sorting the view
         self.list_lock = threading.RLock() # Prevent access racing on view list
 
+        # Indexes to search levels by code or user name prefix
+        self.code_index = PrefixIndex(normalize_code)
+        self.name_index = PrefixIndex(str.lower)
+        self.search_text = "" # Only levels matching it are shown, if not empty
+
+        # Near-duplicate grouping: codes differing by one digit count as the same level
+        self.group_near_duplicates = False
+        self.neighbor_index = HammingIndex() # All the codes of the levels, variants included
+        self.variant_of = {} # Key: variant code, value: Level it is grouped with
+
+        # Weights of the levels in the view, to draw random levels
+        self.random_strategy = RandomStrategy.Uniform
+        self.sampler = WeightedSampler(Level.weight(self.random_strategy))
+
+        # SharedFakeStore the codes of the model are written to, if any
+        self.shared_store = None
+
+        # LevelQueue the new levels are put in, in queue mode
+        self.queue = None
+
+        # Levels of each user, to enforce the quotas without going through all the levels
+        self.user_levels = {} # Key: user login, value: set of their levels in the model
+        self.user_submissions = {} # Key: user login, value: number of submissions
+        self.quotas = {} # Key: Tier, value: max levels per user (missing or 0: no limit)
+
+        # Levels of the last messages, to remove them when a moderator deletes a message
+        self.message_levels = collections.OrderedDict() # Key: message id, value: Level
+
     ###########################################################################
     # Qt methods.
     # Those will be used by the Qt View Widget to display the data
@@ -152,51 +446,37 @@ class LevelListModel(QtCore.QAbstractTableModel):
 
     def columnCount(self, parent=QModelIndex()):
         """Return the number of columns in the current model."""
-        return 5 #Date added, level code, request name, tags, times requested
+        return 6 #Date added, level code, request name, tags, times requested, user submissions
 
     def rowCount(self, parent=QModelIndex()):
         """Return the number of rows in the model."""
         return len(self.view_list)
 
     def data(self, index, role=Qt.DisplayRole):
-        """Return the data for the index, given the corresponding role."""
-        if(not self._is_valid_index(index)):
+        """Return the data for the index, given the corresponding role.
+
+        Called for every visible cell at each repaint: the texts and colors
+        come from the levels' render caches.
+        """
+        row = index.row()
+        if(not 0 <= row < len(self.view_list)):
             return None
+        level = self.view_list[row]
 
         if(role == Qt.DisplayRole):
-            row = index.row()
             col = index.column()
             if(col == Columns.Date): # Number requested
-                return "{}".format(row+1) # self.view_list[row].date
-            elif(col == Columns.Code): # Code
-                return self.view_list[row].code
-            elif(col == Columns.User): # Name the level was requested by
-                return self.view_list[row].name
-            elif(col == Columns.Tags): # Tags (sub and/or mod)
-                tags = self.view_list[row].tags
-                if(tags is None):
-                    return ""
-                elif(tags.get('subscriber', False) and tags.get('user-type', 0)): # tags['user-type'] > 0
-                    return "Sub and Mod"
-                elif(tags.get('subscriber', False)):
-                    return "Sub"
-                elif(tags.get('user-type')): # tags['user-type'] > 0
-                    return "Mod"
-                else:
-                    return ""
-            elif(col == Columns.TimesRequested): # Number of times requested
-                return self.view_list[row].times_requested
+                return _row_label(row)
+            elif(col == Columns.Submissions): # Changes with the other levels of the user, not cached
+                return self.user_submissions.get(level.user, 0)
+            elif(0 < col < self.columnCount()):
+                return level.render()[0][col]
 
         elif(role == Qt.TextColorRole):
-            row = index.row()
-            if(self.view_list[row].filters & Filters.Fake): # Fake flag is on
-                return QtGui.QColor("red")
-            elif(self.view_list[row].filters & Filters.PotentiallyFake): # Potentially fake flag is on
-                return QtGui.QColor("orange")
+            return level.render()[1]
 
         elif(role == Level):
-            row = index.row()
-            return self.view_list[row]
+            return level
 
 
     def headerData(self, section, orientation, role=Qt.DisplayRole):
@@ -212,6 +492,8 @@ class LevelListModel(QtCore.QAbstractTableModel):
                 return "Privileges"
             elif(section == Columns.TimesRequested):
                 return "Times requested"
+            elif(section == Columns.Submissions):
+                return "User submissions"
 
     def sort(self, column, order=Qt.AscendingOrder):
         """Sort the indexes by column, in order."""
@@ -225,6 +507,8 @@ class LevelListModel(QtCore.QAbstractTableModel):
             self.sorting = Sorting.Priviledges
         elif(column == Columns.TimesRequested):
             self.sorting = Sorting.TimesRequested
+        else: # The submission counts change too often to keep the view sorted by them
+            return
 
         if(order == Qt.DescendingOrder):
             self.sorting |= Sorting.Reversed
@@ -244,6 +528,9 @@ class LevelListModel(QtCore.QAbstractTableModel):
         for offset in range(count):
             level = self.view_list[row + offset]
             del self.levels_dict[level.code]
+            self._unindex_level(level)
+            self.sampler.remove(level)
+            level.view_key = None
 
         del self.view_list[row:row+count]
         if(not self.sorting & Sorting.Reversed):
@@ -266,14 +553,27 @@ class LevelListModel(QtCore.QAbstractTableModel):
         return self.removeRows(row, 1, parent)
 
     def reset(self):
-        """Reset the model. Removes all levels from it.
+        """Reset the model. Removes all levels from it, not from the shared store.
         """
         self.dict_lock.acquire()
         self.list_lock.acquire()
 
         self.beginResetModel()
+        # The codes stay in the shared store: the other instances may have them too
         self.levels_dict = {}
         self.view_list = []
+        self.view_keys = []
+        self.code_index.clear()
+        self.name_index.clear()
+        self.neighbor_index.clear()
+        self.variant_of = {}
+        self.sampler.clear()
+        self.user_levels = {}
+        self.user_submissions = {}
+        self.message_levels.clear()
+        self.imported_codes = FakeImporter.CodeSet()
+        if(self.queue is not None): # The levels waiting go with the list, the one being played stays
+            self.queue.clear(keep_current=True)
         self.endResetModel()
         
         self.list_lock.release()
@@ -285,8 +585,12 @@ class LevelListModel(QtCore.QAbstractTableModel):
     ###########################################################################
 
     def add_level(self, code, name, tags=None):
-        """Add a new level to the list if it isn't already in."""
+        """Add a new level to the list if it isn't already in.
+
+        Return False if the level was refused because the user reached their quota
+        (quota_exceeded is emitted), True otherwise."""
 
+        user = name.lower()
         if(tags is not None):
             display_name = tags.get("display-name", "")
             if(display_name != ""):
@@ -296,32 +600,130 @@ class LevelListModel(QtCore.QAbstractTableModel):
 
         level = self.levels_dict.get(code, None)
 
+        if(level is None and self.group_near_duplicates):
+            level = self._find_near_duplicate(code)
+
         if(level is not None):
-            level.times_requested += 1
+            level.request(datetime.datetime.now())
+            if(self.group_near_duplicates):
+                self._count_variant(level, code)
 
             # Check if the level is (probably) in the list using filters
             if(self._check_filters(level)): # Filters are comaptible
-                try:
-                    index = self.createIndex(self.view_list.index(level), 4)
+                row = self.row_of_level(level)
+                if(row is not None):
+                    self.sampler.update(level)
+                    row = self._move_level_in_view(level, row) # Its sorting key may have changed
+                    index = self.createIndex(row, 4)
                     self.dataChanged.emit(index, index)
-                except ValueError: # It wasn't actually in the list, why?
+                else: # It wasn't actually in the list, why?
                     self._add_level_to_view(level)
 
 
         else:
-            level = Level(datetime.datetime.now(), code, name, tags)
+            if(self._quota_reached(user, tags)):
+                self.dict_lock.release()
+                self.quota_exceeded.emit(name, code)
+                return False
+
+            level = Level(datetime.datetime.now(), code, name, tags, user)
             self.levels_dict[code] = level
+            self._index_level(level)
 
             if(self._check_filters(level)):
                 self._add_level_to_view(level)
 
+            # The search only changes what is shown, not what is queued
+            if(self.queue is not None and self.filters & level.filters == 0):
+                self.queue.push(level)
+
+        self._count_submission(user)
+
+        message_id = tags.get("id", "") if tags is not None else ""
+        if(message_id):
+            self.message_levels[message_id] = level
+            if(len(self.message_levels) > self.MESSAGE_INDEX_SIZE):
+                self.message_levels.popitem(last=False)
+
         self.dict_lock.release()
 
+        return True
+
+    def add_levels(self, levels):
+        """Add levels (from another model for instance) all at once.
+
+        Like add_level for each of them, the quotas aside: the levels already in
+        are requested once more, the others are added as new levels.
+        The new levels are sorted once and merged into the view and the indexes,
+        with a single notification to the view instead of one per level.
+        Return the number of levels added.
+        """
+        now = datetime.datetime.now()
+        added = []
+        changed = [] # Levels already in, requested once more
+        seen = set() # Ids of the levels in added or changed: a code (or a near-duplicate) may come twice
+
+        self.dict_lock.acquire()
+
+        for source in levels:
+            level = self.levels_dict.get(source.code, None)
+
+            if(level is None and self.group_near_duplicates):
+                level = self._find_near_duplicate(source.code)
+
+            if(level is not None):
+                level.request(now)
+                if(self.group_near_duplicates):
+                    self._count_variant(level, source.code)
+                if(id(level) not in seen):
+                    seen.add(id(level))
+                    changed.append(level)
+            else:
+                level = Level(now, source.code, source.name, source.tags, source.user)
+                self.levels_dict[level.code] = level
+                if(self.group_near_duplicates): # The next ones may be near-duplicates of it
+                    self.neighbor_index.add(level.code)
+                seen.add(id(level))
+                added.append(level)
+
+            self.user_submissions[source.user] = self.user_submissions.get(source.user, 0) + 1
+
+        self._index_levels(added)
+
+        shown = [ level for level in added if self._check_filters(level) ]
+        for level in changed:
+            row = self.row_of_level(level)
+            if(row is not None):
+                self.sampler.update(level)
+                self._move_level_in_view(level, row)
+            elif(self._check_filters(level)):
+                shown.append(level)
+        self._add_levels_to_view(shown)
+
+        if(self.queue is not None):
+            for level in added:
+                if(self.filters & level.filters == 0):
+                    self.queue.push(level)
+
+        self.dict_lock.release()
+
+        # The times requested and submissions counts of any row may have changed
+        if(changed and self.view_list):
+            self.dataChanged.emit(self.createIndex(0, 0),
+                                  self.createIndex(len(self.view_list) - 1, self.columnCount() - 1))
+
+        return len(added)
+
     def hide_fake_levels(self, hide):
         """Show or hide the levels that are labeled as fake.
         """
         return self._toggle_filter(Filters.Fake, hide)
 
+    def hide_already_played_levels(self, hide):
+        """Show or hide the levels that were already played, in this session or an earlier one.
+        """
+        return self._toggle_filter(Filters.AlreadyPlayed, hide)
+
     def hide_potentially_fake_levels(self, hide):
         """Show or hide the levels that are labeled as potentially fake.
         """
@@ -337,25 +739,231 @@ class LevelListModel(QtCore.QAbstractTableModel):
         """
         return self._toggle_filter(Filters.NonMods, show)
 
+    def row_of_level(self, level):
+        """Return the row of a level in the view, or None if it isn't shown.
+
+        O(log n): the row is found from the level's sorting key.
+        """
+        if(level.view_key is None):
+            return None
+
+        self.list_lock.acquire()
+
+        index = bisect.bisect_left(self.view_keys, level.view_key)
+        if(self.sorting & Sorting.Reversed):
+            row = len(self.view_list) - 1 - index
+        else:
+            row = index
+
+        if(not 0 <= row < len(self.view_list) or self.view_list[row] is not level):
+            row = None
+
+        self.list_lock.release()
+
+        return row
+
+    def random_level(self):
+        """Return a random level among the shown ones, according to the random strategy.
+        Return None if no level is shown.
+        """
+        self.list_lock.acquire()
+        level = self.sampler.draw()
+        self.list_lock.release()
+        return level
+
+    def set_random_strategy(self, strategy):
+        """Change how random levels are chosen.
+        """
+        self.list_lock.acquire()
+        self.random_strategy = RandomStrategy(strategy)
+        self.sampler.set_weight(Level.weight(self.random_strategy))
+        self.list_lock.release()
+
+    def sort_by_hotness(self, hot):
+        """Sort the levels hottest first (see Level.request), or back by date
+        if they were sorted by hotness.
+        """
+        if(hot):
+            self.sorting = Sorting.Hotness
+        elif(self.sorting & Sorting.Hotness):
+            self.sorting = Sorting.Date
+        else: # Already sorted by a column
+            return
+
+        self._reset_view()
+
+    def set_group_near_duplicates(self, group):
+        """Group or not the codes differing by a single digit with the most requested one.
+
+        Only affects the levels requested after the change.
+        """
+        self.dict_lock.acquire()
+
+        group = bool(group)
+        if(group != self.group_near_duplicates):
+            self.group_near_duplicates = group
+            self._rebuild_indexes() # Index the levels already in the model
+
+        self.dict_lock.release()
+
+    def mark_played(self, levels):
+        """Mark levels as played, adding their codes to the history if there is one.
+        """
+        self.dict_lock.acquire()
+
+        hidden = False
+        for level in levels:
+            if(Level.history is not None):
+                Level.history.add(level.code)
+            level.filters |= Filters.AlreadyPlayed
+            level.invalidate_render()
+
+            row = self.row_of_level(level)
+            if(row is None):
+                continue
+            if(self._check_filters(level)):
+                self.dataChanged.emit(self.createIndex(row, 0), self.createIndex(row, Columns.Submissions))
+            else:
+                hidden = True
+
+        self.dict_lock.release()
+
+        if(hidden): # Some levels aren't shown anymore
+            self._reset_view()
+
+    def set_quota(self, tier, limit):
+        """Set the maximum number of levels a user of a Tier can have in the model
+        (in the queue, in queue mode). 0 means no limit.
+        Only affects the levels submitted after the change.
+        """
+        self.quotas[Tier(tier)] = int(limit)
+
+    def remove_user_levels(self, user):
+        """Remove all the levels of a user (login) at once, like when they are banned.
+        Return the number of levels removed.
+        """
+        self.dict_lock.acquire()
+        levels = list(self.user_levels.get(user.lower(), ()))
+        self._remove_levels(levels)
+        self.dict_lock.release()
+
+        return len(levels)
+
+    def remove_message_level(self, message_id):
+        """Take back the submission of a deleted message: the level is removed,
+        or requested one time less if it was requested by other messages.
+        Return True if the message had submitted a level still in the model.
+        """
+        self.dict_lock.acquire()
+
+        level = self.message_levels.pop(message_id, None)
+        found = level is not None and self.levels_dict.get(level.code, None) is level
+        if(found):
+            self.user_submissions[level.user] = max(self.user_submissions.get(level.user, 0) - 1, 0)
+            if(level.times_requested > 1):
+                level.times_requested -= 1
+                level.invalidate_render()
+                row = self.row_of_level(level)
+                if(row is not None):
+                    self.dataChanged.emit(self.createIndex(row, 0), self.createIndex(row, Columns.Submissions))
+            else:
+                self._remove_levels([level])
+
+        self.dict_lock.release()
+
+        return found
+
+    def set_queue(self, queue):
+        """Put the new levels in a LevelQueue (queue mode), or stop if queue is None.
+        """
+        self.queue = queue
+
+    def set_search(self, text):
+        """Only show the levels whose code or user name starts with text.
+        An empty text shows all levels.
+        """
+        text = text.strip()
+        if(text != self.search_text):
+            self.search_text = text
+            self._reset_view()
+
     def remove_indexes(self, indexes):
         """Remove all the rows in the indexes list.
         """
+        # Same order as add_level, not to deadlock with it
+        self.dict_lock.acquire()
+        self.list_lock.acquire()
+
         # Create a set of the rows (as int) to delete
         selected_rows = set()
         for index in indexes:
             selected_rows.add(index.row())
 
-        # Delete all of them one by one (easy but maybe not the best performance-wise)
-        for index, row in enumerate(sorted(selected_rows)):
-            self.removeRow(row - index) # The actual target row to be removed decreases by one when a previous is removed
+        # Removed by runs of consecutive rows, and from the queue too
+        self._remove_levels([ self.view_list[row] for row in selected_rows ])
+
+        self.list_lock.release()
+        self.dict_lock.release()
+
+    def memory_usage(self, sample=None):
+        """Return the bytes used by the model, as a dict:
+        'levels' (the Level objects, with their codes, names, dates, tags and view keys),
+        'levels_dict', 'view_list', 'view_keys' (the containers themselves),
+        'indexes' (search, near-duplicates, random draws, users and messages),
+        'total', 'count' (of levels) and 'per_level'.
+
+        Objects shared by several levels (interned tags and strings) are counted once.
+        With more than sample (default MEMORY_SAMPLE) levels, the levels and indexes
+        are estimated from a sample of them.
+        """
+        sample = sample or self.MEMORY_SAMPLE
+
+        self.dict_lock.acquire()
+        self.list_lock.acquire()
+
+        levels = list(self.levels_dict.values())
+        seen = set()
+        usage = { 'levels': MemoryUsage.deep_sizeof(levels, seen, sample) - sys.getsizeof(levels) }
+        seen.update(id(level) for level in levels) # The levels not in the sample too
+        usage['levels_dict'] = sys.getsizeof(self.levels_dict)
+        usage['view_list'] = sys.getsizeof(self.view_list)
+        usage['view_keys'] = sys.getsizeof(self.view_keys) # The keys are counted with the levels
+        usage['indexes'] = MemoryUsage.deep_sizeof(
+            [ self.code_index.keys, self.code_index.levels, self.name_index.keys, self.name_index.levels,
+              self.neighbor_index.buckets, self.neighbor_index.codes, self.variant_of,
+              self.sampler.tree.weights, self.sampler.tree.tree, self.sampler.slots, self.sampler.levels,
+              self.user_levels, self.user_submissions, self.message_levels ], seen, sample)
+
+        self.list_lock.release()
+        self.dict_lock.release()
+
+        usage['total'] = sum(usage.values())
+        usage['count'] = len(levels)
+        usage['per_level'] = usage['total'] / len(levels) if levels else 0
+        return usage
 
     def save_model_to_file(self, filename):
         """Save the model's contents to the file given as argument.
         """
+        if(self.loading): # The file wasn't read completely, don't overwrite it
+            return
+
+        # Only copy the dict while holding the lock, pickling may take a while
+        self.dict_lock.acquire()
+        levels = dict(self.levels_dict)
+        self.dict_lock.release()
+
         with open(filename, "wb") as outfile:
-            self.dict_lock.acquire()
-            pickle.dump(self.levels_dict, outfile)
-            self.dict_lock.release()
+            pickle.dump(levels, outfile)
+
+        # The codes alone, much faster to read than the levels when loading
+        with open(filename + ".codes", "w") as outfile:
+            outfile.write("\n".join(levels.keys()))
+
+        if(len(self.imported_codes)):
+            self.imported_codes.save(filename + ".imported")
+        elif(os.path.isfile(filename + ".imported")): # Reset since
+            os.remove(filename + ".imported")
 
     def load_model_from_file(self, filename):
         """Load the model's contents from the file given as argument.
@@ -364,33 +972,115 @@ class LevelListModel(QtCore.QAbstractTableModel):
             with open(filename, "rb") as infile:
                 self.dict_lock.acquire()
                 self.levels_dict = pickle.load(infile)
+                self._rebuild_indexes()
                 self.dict_lock.release()
 
-                self._reset_view()
+            if(os.path.isfile(filename + ".imported")):
+                self.imported_codes = FakeImporter.CodeSet.load(filename + ".imported")
+
+            self._reset_view()
 
         except Exception as e: # Failed to load the model
             print("Failed to load the model from {filename}".format(filename=filename))
             print(e)
 
+    def load_model_from_file_async(self, filename):
+        """Load the model's contents from the file given as argument, in a separate thread.
+
+        The model stays usable while loading: levels added meanwhile are kept,
+        and check_code_in_model answers from the codes file written along the levels.
+        Emits load_progress while reading and load_finished when done.
+        """
+        self.loading_lock.acquire()
+        self.loading = True
+        self.looked_up_while_loading = set()
+        self.loading_lock.release()
+
+        thread = threading.Thread(target=self._load_levels, args=(filename,))
+        thread.setDaemon(True)
+        thread.start()
+        return thread
+
+    def import_codes_async(self, filename):
+        """Import the codes of an external list (text or CSV, see FakeImporter.read_codes)
+        into the model, in a separate thread.
+
+        The codes are kept apart from the levels, 8 bytes each: check_code_in_model finds them,
+        but they aren't shown. Emits import_finished with the statistics of the import,
+        'added' being the number of codes that weren't imported yet, or import_failed.
+        """
+        thread = threading.Thread(target=self._import_codes, args=(filename,))
+        thread.setDaemon(True)
+        thread.start()
+        return thread
+
+    def export_view(self, filename, levels=None):
+        """Export the levels currently shown, in the shown order, to a CSV or JSON Lines file.
+        The format depends on the file extension (.csv or .jsonl/.json).
+        levels are exported instead if given (the view of a ChannelLevelModel for instance).
+
+        The view is copied (a list of references) and written to disk by a separate thread,
+        so neither the GUI nor the chat have to wait for the export.
+        Emits export_finished or export_failed when done.
+        """
+        if(levels is not None):
+            snapshot = list(levels)
+        else:
+            self.list_lock.acquire()
+            snapshot = list(self.view_list)
+            self.list_lock.release()
+
+        thread = threading.Thread(target=self._export_levels, args=(filename, snapshot))
+        thread.setDaemon(True)
+        thread.start()
+        return thread
+
+    def set_shared_store(self, store):
+        """Write the codes of the model to a SharedFakeStore, starting with the ones already in.
+        """
+        self.shared_store = store
+        if(store is not None):
+            self.dict_lock.acquire()
+            store.add_many(_store_codes(self.levels_dict.values()))
+            self.dict_lock.release()
+
     def check_code_in_model(self, code):
         """Return true if the code is in the model, false otherwise.
         """
-        return code in self.levels_dict.keys()
+        loading = self.loading # Before the levels loaded replace levels_dict
+        if(code in self.levels_dict):
+            return True
+
+        imported_codes = self.imported_codes # Replaced, never changed, when importing
+        if(len(imported_codes) and CodeMatcher.code_format(code) == CodeMatcher.CodeFormat.SMM1):
+            try:
+                if(CodeMatcher.encode_code(code) in imported_codes):
+                    return True
+            except ValueError: # Not a hex code
+                pass
+
+        if(not loading):
+            return False
+
+        self.loading_lock.acquire()
+        found = False
+        if(self.loading):
+            loading_codes = self.loading_codes
+            if(loading_codes is not None and code in loading_codes):
+                found = True
+            else:
+                self.looked_up_while_loading.add(code) # To check again once loaded
+        else: # The loading ended meanwhile, the levels loaded are in
+            found = code in self.levels_dict
+        self.loading_lock.release()
+
+        return found
 
     ###########################################################################
     # Private methods
     # Used by the model for the model
     ###########################################################################
 
-    def _is_valid_index(self, index):
-        """Check if the provided index is valid in the model.
-        """
-        row = index.row()
-        column = index.column()
-        return not (row < 0 or column < 0 or
-                    row >= len(self.view_list) or column > 4 or
-                    index == QModelIndex())
-
     def _check_filters(self, level):
         """Check if the filters on the model and the ones on a level are
         compatible.
@@ -400,32 +1090,440 @@ class LevelListModel(QtCore.QAbstractTableModel):
         Because of the values chosen for the filters, this means the bit by bit
         logical AND has to be zero.
         """
+        if(self.search_text and not self._matches_search(level)):
+            return False
+
         if(self.filters == Filters.NoFilter):
             return True
         else:
             return (self.filters & level.filters == 0)
 
+    def _matches_search(self, level):
+        """Check if the level's code or user name starts with the searched text.
+        """
+        return (normalize_code(level.code).startswith(normalize_code(self.search_text)) or
+                level.name.lower().startswith(self.search_text.lower()))
+
+    def _search_candidates(self):
+        """Return the levels that may be shown according to the searched text.
+
+        Uses the prefix indexes, so it is proportional to the number of matches.
+        """
+        if(not self.search_text):
+            return self.levels_dict.values()
+
+        candidates = { id(level): level for level in self.code_index.search(self.search_text) }
+        candidates.update((id(level), level) for level in self.name_index.search(self.search_text))
+        return candidates.values()
+
     def _add_level_to_view(self, level):
-        """Adds the level to the view, at the correct position.
+        """Adds the level to the view, at the correct position,
+        between key_about_to_change and key_changed.
         """
-        key = Level.key(self.sorting)(level)
+        key = self._view_key(level)
+        self.key_about_to_change.emit(level, key)
+
+        self.list_lock.acquire()
+
         index = bisect.bisect(self.view_keys, key)
+        # If sorting is reversed, the key list and view are in different orders
+        row = len(self.view_list) - index if self.sorting & Sorting.Reversed else index
+
+        self.beginInsertRows(QModelIndex(), row, row)
         self.view_keys[index:index] = [key]
+        level.view_key = key
+        self.view_list[row:row] = [level]
+        self.sampler.add(level)
+
+        self.endInsertRows()
+
+        self.list_lock.release()
+        self.key_changed.emit(level)
+
+    def _add_levels_to_view(self, levels):
+        """Adds levels to the view, sorting them then merging them with the levels shown.
+
+        When they all go between the same two rows (new levels sorted by date for instance),
+        they are inserted as a single run of rows, otherwise the view is reset.
+        """
+        if(not levels):
+            return
+
+        for level in levels:
+            level.view_key = self._view_key(level)
+        levels = sorted(levels, key=lambda x: x.view_key)
+        keys = [ level.view_key for level in levels ]
+
+        self.list_lock.acquire()
+
+        first = bisect.bisect(self.view_keys, keys[0])
+        if(first == bisect.bisect(self.view_keys, keys[-1])):
+            # If sorting is reversed, the key list and view are in different orders
+            index = first
+            if(self.sorting & Sorting.Reversed):
+                index = len(self.view_list) - first
+                levels.reverse()
+
+            self.beginInsertRows(QModelIndex(), index, index + len(levels) - 1)
+            self.view_keys[first:first] = keys
+            self.view_list[index:index] = levels
+            for level in levels:
+                self.sampler.add(level)
+            self.endInsertRows()
+
+        else:
+            self.beginResetModel()
+
+            # Two sorted runs: the sort merges them in linear time
+            merged = self.view_list[::-1] if self.sorting & Sorting.Reversed else list(self.view_list)
+            merged.extend(levels)
+            merged.sort(key=lambda x: x.view_key)
+            self.view_keys = [ level.view_key for level in merged ]
+            if(self.sorting & Sorting.Reversed):
+                merged.reverse()
+            self.view_list = merged
+            self.sampler.rebuild(self.view_list)
+
+            self.endResetModel()
+
+        self.list_lock.release()
+
+    def _move_level_in_view(self, level, row):
+        """Move a shown level to its place after its sorting key changed (times requested, hotness).
+        Only this level moves, the others keep their keys. Return its new row.
+        key_about_to_change and key_changed are emitted around the change even if the row
+        stays the same: it may move among the levels of other models (see ChannelLevelModel).
+        """
+        key = self._view_key(level)
+        if(key == level.view_key):
+            return row
+
+        self.key_about_to_change.emit(level, key)
+        self.list_lock.acquire()
+
+        # The key list is in ascending order, the view may be reversed
+        old_index = bisect.bisect_left(self.view_keys, level.view_key)
+        del self.view_keys[old_index]
+        index = bisect.bisect(self.view_keys, key)
+        self.view_keys.insert(index, key)
+        level.view_key = key
 
-        # If sorting is reversed, the key list and view are in different orders
         if(self.sorting & Sorting.Reversed):
-            index = len(self.view_list) - index
+            index = len(self.view_list) - 1 - index
+
+        if(index != row):
+            # Qt wants the row the level goes before, counted before the move
+            self.beginMoveRows(QModelIndex(), row, row, QModelIndex(), index + 1 if index > row else index)
+            del self.view_list[row]
+            self.view_list.insert(index, level)
+            self.endMoveRows()
 
+        self.list_lock.release()
+        self.key_changed.emit(level)
+
+        return index
 
+    def _index_level(self, level):
+        """Add a level that was just put in levels_dict to the model's indexes.
+        """
+        self.code_index.add(level.code, level)
+        self.name_index.add(level.name, level)
+        self.user_levels.setdefault(level.user, set()).add(level)
+        if(self.shared_store is not None):
+            self.shared_store.add_many(_store_codes((level,)))
+
+        if(self.group_near_duplicates):
+            for code in (level.variants or (level.code,)):
+                self.neighbor_index.add(code)
+                if(code != level.code):
+                    self.variant_of[code] = level
+
+    def _index_levels(self, levels):
+        """Add levels that were just put in levels_dict to the model's indexes, all at once.
+        The near-duplicates index aside, add_levels fills it as it goes.
+        """
+        self.code_index.add_many((level.code, level) for level in levels)
+        self.name_index.add_many((level.name, level) for level in levels)
+        for level in levels:
+            self.user_levels.setdefault(level.user, set()).add(level)
+        if(self.shared_store is not None):
+            self.shared_store.add_many(_store_codes(levels))
+
+    def _unindex_level(self, level):
+        """Remove a level that was just removed from levels_dict from the model's indexes.
+        """
+        self.code_index.remove(level.code, level)
+        self.name_index.remove(level.name, level)
+        user_levels = self.user_levels.get(level.user, None)
+        if(user_levels is not None):
+            user_levels.discard(level)
+            if(not user_levels):
+                del self.user_levels[level.user]
+        if(self.shared_store is not None):
+            self.shared_store.remove_many(_store_codes((level,)))
+
+        if(self.group_near_duplicates):
+            for code in (level.variants or (level.code,)):
+                self.neighbor_index.remove(code)
+                self.variant_of.pop(code, None)
+
+    def _rebuild_indexes(self):
+        """Rebuild all the model's indexes from levels_dict.
+        """
+        self.code_index.rebuild((level.code, level) for level in self.levels_dict.values())
+        self.name_index.rebuild((level.name, level) for level in self.levels_dict.values())
+        self.user_levels = {}
+        for level in self.levels_dict.values():
+            self.user_levels.setdefault(level.user, set()).add(level)
+        if(self.shared_store is not None):
+            self.shared_store.add_many(_store_codes(self.levels_dict.values()))
+
+        self.neighbor_index.clear()
+        self.variant_of = {}
+        if(self.group_near_duplicates):
+            for level in self.levels_dict.values():
+                for code in (level.variants or (level.code,)):
+                    self.neighbor_index.add(code)
+                    if(code != level.code):
+                        self.variant_of[code] = level
+
+    def _remove_levels(self, levels):
+        """Remove levels from the model and the queue.
+
+        The rows of the levels are found from their keys and removed from the last one,
+        each run of consecutive rows at once: the levels not removed aren't looked at.
+        Must be called holding dict_lock (taken before list_lock, like everywhere else).
+        """
         self.list_lock.acquire()
 
-        self.beginInsertRows(QModelIndex(), index, index)
-        self.view_list[index:index] = [level]
+        if(self.queue is not None):
+            for level in levels:
+                self.queue.remove(level)
 
-        self.endInsertRows()
+        rows = [ self.row_of_level(level) for level in levels ]
+        for level, row in zip(levels, rows):
+            if(row is None): # Not shown
+                del self.levels_dict[level.code]
+                self._unindex_level(level)
+
+        rows = sorted(row for row in rows if row is not None) # Taken from the end, the last one first
+        while(rows):
+            last = first = rows.pop()
+            while(rows and rows[-1] == first - 1):
+                first = rows.pop()
+            self.removeRows(first, last - first + 1)
 
         self.list_lock.release()
 
+    def _quota_reached(self, user, tags):
+        """Return True if the user can't submit another level. O(1).
+
+        In queue mode only the levels waiting in the queue count,
+        otherwise all the levels of the user in the model.
+        """
+        limit = self.quotas.get(tier_of(tags), 0)
+        if(limit <= 0):
+            return False
+
+        if(self.queue is not None):
+            return self.queue.user_count(user) >= limit
+        return len(self.user_levels.get(user, ())) >= limit
+
+    def _count_submission(self, user):
+        """Count a submission of the user, and refresh the count shown for each of their levels.
+        """
+        self.user_submissions[user] = self.user_submissions.get(user, 0) + 1
+
+        for level in self.user_levels.get(user, ()):
+            row = self.row_of_level(level)
+            if(row is not None):
+                index = self.createIndex(row, Columns.Submissions)
+                self.dataChanged.emit(index, index)
+
+    def _find_near_duplicate(self, code):
+        """Return the level a new code should be grouped with, or None.
+
+        The code is grouped with the most requested level having a code
+        (or a variant) differing by one digit.
+        """
+        level = self.variant_of.get(code, None)
+        if(level is not None):
+            return level
+
+        candidates = set()
+        for neighbor in self.neighbor_index.neighbors(code):
+            candidate = self.levels_dict.get(neighbor, None) or self.variant_of.get(neighbor, None)
+            if(candidate is not None):
+                candidates.add(candidate)
+
+        if(not candidates):
+            return None
+
+        level = max(candidates, key=lambda x: x.times_requested)
+        self.neighbor_index.add(code)
+        self.variant_of[code] = level
+        return level
+
+    def _count_variant(self, level, code):
+        """Count a request for code in the level's variants.
+
+        If the variant becomes the majority, it becomes the level's code.
+        """
+        if(level.variants is None):
+            level.variants = { level.code: level.times_requested - 1 }
+        level.variants[code] = level.variants.get(code, 0) + 1
+
+        if(code == level.code or level.variants[code] <= level.variants[level.code]):
+            return
+
+        # The variant is now the most requested code, it represents the level
+        row = self.row_of_level(level)
+        if(row is not None):
+            self.removeRows(row, 1)
+        else:
+            del self.levels_dict[level.code]
+            self._unindex_level(level)
+
+        if(self.queue is not None): # Queued by its code
+            self.queue.rekey(level, code)
+        level.code = code
+        level.filters = Filters.NoFilter
+        level.check_filters()
+        self.levels_dict[code] = level
+        self._index_level(level)
+
+        if(self._check_filters(level)):
+            self._add_level_to_view(level)
+
+    def _view_key(self, level):
+        """Return the key of the level in view_keys.
+        The creation order breaks ties, so each level has its own key.
+        """
+        return (Level.key(self.sorting)(level), level.seq)
+
+    def _load_levels(self, filename):
+        """Read the codes then the levels from filename. Run by the thread started by
+        load_model_from_file_async, the levels are given back to the GUI thread with a signal.
+        """
+        try:
+            with open(filename + ".codes", "r") as infile:
+                self.loading_codes = set(infile.read().split())
+        except OSError: # No codes file (older version), lookups will be checked again once loaded
+            pass
+
+        levels = {}
+        try:
+            with open(filename, "rb") as infile:
+                levels = pickle.load(_ProgressReader(infile, self.load_progress.emit))
+            if(os.path.isfile(filename + ".imported")):
+                self.loaded_imported_codes = FakeImporter.CodeSet.load(filename + ".imported")
+        except Exception as e: # Failed to load the model
+            print("Failed to load the model from {filename}".format(filename=filename))
+            print(e)
+
+        self._loaded.emit(levels)
+
+    def _finish_loading(self, levels):
+        """Put the levels loaded by the loading thread in the model.
+        Slot of the _loaded signal, run in the GUI thread.
+        """
+        self.dict_lock.acquire()
+
+        # Levels added while loading are kept
+        for code, level in self.levels_dict.items():
+            levels.setdefault(code, level)
+        self.levels_dict = levels
+        self._rebuild_indexes()
+
+        # Codes imported while loading are kept too
+        if(self.loaded_imported_codes is not None):
+            self.imported_codes = self.loaded_imported_codes.union(self.imported_codes)[0]
+            self.loaded_imported_codes = None
+
+        # The codes looked up until now are checked again, the next ones are found without
+        self.loading_lock.acquire()
+        self.loading = False
+        self.loading_codes = None
+        looked_up, self.looked_up_while_loading = self.looked_up_while_loading, set()
+        self.loading_lock.release()
+        found = { code for code in looked_up if self.check_code_in_model(code) }
+
+        self.dict_lock.release()
+
+        self._reset_view()
+        self.load_progress.emit(100)
+        self.load_finished.emit(found)
+
+    def _import_codes(self, filename):
+        """Read the codes of an external list. Run by the thread started by import_codes_async,
+        the codes are given back to the GUI thread with a signal.
+        """
+        try:
+            with open(filename, "rb") as infile:
+                codes, stats = FakeImporter.read_codes(infile)
+        except OSError as e:
+            self.import_failed.emit(filename, str(e))
+            return
+
+        self._imported.emit(codes, stats)
+
+    def _finish_import(self, codes, stats):
+        """Merge the codes read by the importing thread with the imported ones.
+        Slot of the _imported signal, run in the GUI thread.
+        """
+        self.imported_codes, stats['added'] = self.imported_codes.union(codes)
+        self.import_finished.emit(stats)
+
+    def check_fakes_again(self, codes):
+        """Check again the filters of the levels with these codes,
+        after the fakes model finished loading them or another instance marked fakes.
+        """
+        self.dict_lock.acquire()
+        changed = False
+        for code in codes:
+            level = self.levels_dict.get(code, None)
+            if(level is not None and not level.filters & Filters.Fake):
+                level.check_filters()
+                changed = changed or bool(level.filters & Filters.Fake)
+        self.dict_lock.release()
+
+        if(changed):
+            self._reset_view()
+
+    MESSAGE_INDEX_SIZE = 10000 # Messages whose level can be removed when they are deleted
+    MEMORY_SAMPLE = 10000 # Levels sized by memory_usage, the others are estimated from them
+
+    EXPORT_FIELDS = ("#", "code", "user", "privileges", "times_requested", "date",
+                     "fake", "potentially_fake", "already_played")
+
+    def _export_levels(self, filename, levels):
+        """Write the levels to filename. Run by the thread started by export_view.
+        """
+        try:
+            with open(filename, "w", newline="", encoding="utf-8") as outfile:
+                rows = ( (row + 1, level.code, level.name, level.privileges(), level.times_requested,
+                          level.date.isoformat(), bool(level.filters & Filters.Fake),
+                          bool(level.filters & Filters.PotentiallyFake),
+                          bool(level.filters & Filters.AlreadyPlayed))
+                         for row, level in enumerate(levels) )
+
+                if(filename.lower().endswith(".csv")):
+                    writer = csv.writer(outfile)
+                    writer.writerow(self.EXPORT_FIELDS)
+                    writer.writerows(rows)
+                else:
+                    for row in rows:
+                        outfile.write(json.dumps(dict(zip(self.EXPORT_FIELDS, row))))
+                        outfile.write("\n")
+
+        except Exception as e: # Failed to export the view
+            print("Failed to export the model to {filename}".format(filename=filename))
+            print(e)
+            self.export_failed.emit(filename, str(e))
+            return
+
+        self.export_finished.emit(filename, len(levels))
+
     def _toggle_filter(self, filter, toggle):
         """Toggle the filter on/off according to toggle and rebuild the view
         If it already is on/off, do nothing.
@@ -449,15 +1547,23 @@ class LevelListModel(QtCore.QAbstractTableModel):
 
         self.beginResetModel()
 
+        # Forget the keys of the levels currently shown
+        for level in self.view_list:
+            level.view_key = None
+
         # Rebuild view with only items that should show
-        self.view_list = [ level for level in self.levels_dict.values() if self._check_filters(level) ]
+        self.view_list = [ level for level in self._search_candidates() if self._check_filters(level) ]
 
         # Sorting the view, creating the list of keys, and reversing if needed
-        self.view_list.sort(key=Level.key(self.sorting))
-        self.view_keys = [Level.key(self.sorting)(x) for x in self.view_list]
+        for level in self.view_list:
+            level.view_key = self._view_key(level)
+        self.view_list.sort(key=lambda x: x.view_key)
+        self.view_keys = [x.view_key for x in self.view_list]
         if(self.sorting & Sorting.Reversed):
             self.view_list.reverse()
 
+        self.sampler.rebuild(self.view_list)
+
         self.endResetModel()
 
         self.list_lock.release()
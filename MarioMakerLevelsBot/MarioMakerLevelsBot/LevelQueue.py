@@ -0,0 +1,238 @@
+import bisect
+import pickle
+import threading
+
+from RandomSelection import FenwickTree
+
+
+class LevelQueue(object):
+    """First come, first served queue of levels.
+
+    Each level gets a ticket, numbered in order of arrival, and the FenwickTree
+    counts the tickets still in the queue: the position of a ticket is the
+    number of tickets before it, an O(log n) prefix sum. Levels leave the queue
+    by clearing their ticket, so nothing has to be shifted.
+    A per-user index gives the tickets of each user, so finding where
+    a user's level is doesn't scan the queue either.
+
+    The levels are known by their code: the levels restored by load_from_file
+    aren't the ones of the levels list, they are replaced by them when pushed again.
+    A level whose code changes has to be told with rekey before.
+    """
+
+    COMPACT_MIN = 1024 # Tickets used before considering renumbering them
+
+    def __init__(self):
+        super().__init__()
+        self.tree = FenwickTree() # 1 for each ticket still in the queue
+        self.tickets = [] # Level of each ticket, None once it left the queue
+        self.ticket_of = {} # Key: code of the level, value: its ticket
+        self.user_tickets = {} # Key: user login, value: list of tickets, in order
+        self.head = 0 # No ticket before this one is in the queue anymore
+        self.current = None # Level being played
+        self.lock = threading.RLock() # The chat commands read the queue from their own threads
+
+    def __len__(self):
+        return len(self.ticket_of)
+
+    def __contains__(self, level):
+        return level.code in self.ticket_of
+
+    def push(self, level):
+        """Put a level at the end of the queue. If its code is already in,
+        the level takes the place of the one queued (restored from a file for instance).
+        """
+        with self.lock:
+            ticket = self.ticket_of.get(level.code, None)
+            if(ticket is not None):
+                self._replace(ticket, level)
+                return
+
+            ticket = len(self.tickets)
+            self.tickets.append(level)
+            self.ticket_of[level.code] = ticket
+            self.tree.set(ticket, 1)
+            self.user_tickets.setdefault(level.user, []).append(ticket)
+
+    def remove(self, level):
+        """Take a level out of the queue. Does nothing if it isn't in.
+        """
+        with self.lock:
+            ticket = self.ticket_of.pop(level.code, None)
+            if(ticket is None):
+                return
+
+            self.tree.set(ticket, 0)
+            user = self.tickets[ticket].user # Maybe another level with the same code
+            self.tickets[ticket] = None
+            self._remove_user_ticket(user, ticket)
+
+            self._compact()
+
+    def rekey(self, level, code):
+        """The code of a level becomes code (a variant of it became the most requested,
+        see LevelListModel._count_variant): its ticket follows. Call before level.code changes.
+        Does nothing if the level isn't in. If the new code is already in, the level keeps
+        the first of the two tickets.
+        """
+        with self.lock:
+            if(level.code not in self.ticket_of or code == level.code):
+                return
+
+            other = self.ticket_of.get(code, None)
+            if(other is None):
+                self.ticket_of[code] = self.ticket_of.pop(level.code)
+                self._replace(self.ticket_of[code], level)
+                return
+
+            ticket = self.ticket_of[level.code]
+            if(ticket < other):
+                self.ticket_of[code] = ticket
+                ticket, other = other, ticket
+            del self.ticket_of[level.code]
+            self.tree.set(ticket, 0)
+            user = self.tickets[ticket].user
+            self.tickets[ticket] = None
+            self._remove_user_ticket(user, ticket)
+            self._replace(other, level)
+
+    def peek(self):
+        """Return the first level of the queue, or None if the queue is empty.
+        O(1) amortized: the head only moves forward.
+        """
+        with self.lock:
+            while(self.head < len(self.tickets) and self.tickets[self.head] is None):
+                self.head += 1
+            return self.tickets[self.head] if self.head < len(self.tickets) else None
+
+    def next(self):
+        """The current level was played: the first level of the queue becomes the current one.
+        Return (played level, new current level), either may be None.
+        """
+        with self.lock:
+            played = self.current
+            self._pop()
+            return played, self.current
+
+    def skip(self):
+        """The current level is dropped without being played, the first one of the queue
+        becomes the current one. Return (skipped level, new current level).
+        """
+        with self.lock:
+            skipped = self.current
+            self._pop()
+            return skipped, self.current
+
+    def requeue(self):
+        """The current level goes back to the end of the queue, the first one of the queue
+        becomes the current one. Return the new current level.
+        """
+        with self.lock:
+            requeued = self.current
+            self._pop()
+            if(requeued is not None):
+                self.push(requeued)
+                if(self.current is None): # It was alone
+                    self._pop()
+            return self.current
+
+    def position(self, level):
+        """Return the position of a level in the queue (1 is next), or None if it isn't in.
+        """
+        with self.lock:
+            ticket = self.ticket_of.get(level.code, None)
+            if(ticket is None):
+                return None
+            return self.tree.prefix_sum(ticket) + 1
+
+    def user_positions(self, user):
+        """Return the positions of the levels of a user in the queue, first one first.
+        O(log n) per level of the user.
+        """
+        with self.lock:
+            return [ self.tree.prefix_sum(ticket) + 1 for ticket in self.user_tickets.get(user.lower(), ()) ]
+
+    def user_count(self, user):
+        """Return the number of levels of a user in the queue. O(1).
+        """
+        with self.lock:
+            return len(self.user_tickets.get(user.lower(), ()))
+
+    def levels(self):
+        """Return the list of the levels in the queue, in order.
+        """
+        with self.lock:
+            return [ level for level in self.tickets[self.head:] if level is not None ]
+
+    def clear(self, keep_current=False):
+        """Empty the queue, the current level included unless keep_current is True.
+        """
+        with self.lock:
+            self._renumber([])
+            if(not keep_current):
+                self.current = None
+
+    def save_to_file(self, filename):
+        """Save the current level and the queue to a file.
+        """
+        with self.lock:
+            state = { 'current': self.current, 'levels': self.levels() }
+
+        with open(filename, "wb") as outfile:
+            pickle.dump(state, outfile)
+
+    def load_from_file(self, filename):
+        """Load the current level and the queue from a file.
+        """
+        try:
+            with open(filename, "rb") as infile:
+                state = pickle.load(infile)
+        except Exception as e: # Failed to load the queue
+            print("Failed to load the queue from {filename}".format(filename=filename))
+            print(e)
+            return
+
+        with self.lock:
+            self._renumber(state['levels'])
+            self.current = state['current']
+
+    def _pop(self):
+        """Make the first level of the queue the current one.
+        """
+        self.current = self.peek()
+        if(self.current is not None):
+            self.remove(self.current)
+
+    def _replace(self, ticket, level):
+        """Put level in a ticket, in place of the same level (by code) queued.
+        """
+        queued = self.tickets[ticket]
+        if(queued is not level):
+            self.tickets[ticket] = level
+            if(queued.user != level.user):
+                self._remove_user_ticket(queued.user, ticket)
+                bisect.insort(self.user_tickets.setdefault(level.user, []), ticket)
+
+    def _remove_user_ticket(self, user, ticket):
+        tickets = self.user_tickets[user]
+        tickets.remove(ticket) # A user only has a few levels in the queue
+        if(not tickets):
+            del self.user_tickets[user]
+
+    def _compact(self):
+        """Renumber the tickets when most of them left the queue,
+        so the tree doesn't grow forever. O(n), amortized over the removals.
+        """
+        if(len(self.tickets) > self.COMPACT_MIN and len(self.tickets) > 4 * len(self.ticket_of)):
+            self._renumber(self.levels())
+
+    def _renumber(self, levels):
+        """Give new tickets to the levels, in order.
+        """
+        self.tickets = list(levels)
+        self.ticket_of = { level.code: ticket for ticket, level in enumerate(self.tickets) }
+        self.user_tickets = {}
+        for ticket, level in enumerate(self.tickets):
+            self.user_tickets.setdefault(level.user, []).append(ticket)
+        self.tree.rebuild([1] * len(self.tickets))
+        self.head = 0
@@ -1,20 +1,31 @@
 ﻿
 import os
-import re
-import random
+import time
 import functools
 
 from PySide import QtCore, QtGui
 from ui.window import Ui_MainWindow
 
+import ChannelLevelModel
 import ChatListener
+import CodeMatcher
+import HeavyHitters
+import IngestionProcess
 import LevelListModel
+import LevelQueue
+import MemoryUsage
+import OverlayServer
+import PlayedHistory
+import Profiling
+import SharedFakeStore
 
 
 class LevelsBotWindow(Ui_MainWindow, QtGui.QMainWindow):
     """The QMainWindow class for the Mario Maker Levels Bot, 
     containing all the UI logic."""
 
+    lists_loaded = QtCore.Signal() # Emitted once the saved and fake lists are loaded
+
     def __init__(self):
         super().__init__(None)
         self.setupUi(self)
@@ -32,6 +43,10 @@ class LevelsBotWindow(Ui_MainWindow, QtGui.QMainWindow):
             self.settings.value("irc_info/nick", ""))
         self.twitch_oauth_lineedit.setText(
             self.settings.value("irc_info/oauth", ""))
+        self.separate_process_checkbox.setChecked(
+            self.settings.value("irc_info/separate_process", "false") == "true")
+        self.matching_rules_lineedit.setText(
+            self.settings.value("irc_info/matching_rules", ""))
 
         # Menu bar
         self.actionAbout.triggered.connect(self.about)
@@ -42,13 +57,46 @@ class LevelsBotWindow(Ui_MainWindow, QtGui.QMainWindow):
         self.oauth_help_button.clicked.connect(self.oauth_help)
         self.connect_button.clicked.connect(self.connect)
 
+        # Rules telling which messages are level submissions
+        self.matcher = CodeMatcher.MessageMatcher()
+        self.apply_matching_rules()
+        self.matching_rules_lineedit.editingFinished.connect(self.apply_matching_rules)
+        for text, repeats in (("Copies count every time", CodeMatcher.RepeatCounting.Every),
+                              ("Copies count once per user", CodeMatcher.RepeatCounting.PerUser),
+                              ("Copies count once", CodeMatcher.RepeatCounting.Once)):
+            self.repeats_combobox.addItem(text, int(repeats))
+        self.repeats_combobox.setCurrentIndex(max(0,
+            self.repeats_combobox.findData(int(self.settings.value("irc_info/repeats", 0)))))
+        self.repeat_counting_changed(self.repeats_combobox.currentIndex())
+        self.repeats_combobox.currentIndexChanged.connect(self.repeat_counting_changed)
+
+        # Shows how far behind the chat the callbacks are
+        self.lag_label = QtGui.QLabel(self)
+        self.statusbar.addPermanentWidget(self.lag_label)
+        self.lag_timer = QtCore.QTimer(self)
+        self.lag_timer.timeout.connect(self.update_lag_label)
+        self.lag_timer.start(1000)
+
         # Levels list tab
 
-        self.level_list_model = LevelListModel.LevelListModel()
+        self.level_list_model = ChannelLevelModel.ChannelLevelModel()
         self.levels_tableView.setModel(self.level_list_model)
         self.levels_tableView.horizontalHeader().setResizeMode(
             QtGui.QHeaderView.Stretch)
 
+        # A tab for each channel joined, above the levels
+        self.channel_tabbar = QtGui.QTabBar(self.levels_tab)
+        self.channel_tabbar.addTab("All channels")
+        self.horizontalLayout_3.removeWidget(self.levels_tableView)
+        self.levels_layout = QtGui.QVBoxLayout()
+        self.levels_layout.addWidget(self.channel_tabbar)
+        self.levels_layout.addWidget(self.levels_tableView)
+        self.horizontalLayout_3.addLayout(self.levels_layout)
+        self.level_list_model.channel_added.connect(self.channel_added_slot)
+        self.channel_tabbar.currentChanged.connect(self.show_channel)
+
+        self.levels_search_lineedit.textChanged.connect(
+            self.level_list_model.set_search)
         self.find_codes_checkbox.stateChanged.connect(self.toggle_check_codes)
         self.hide_likely_fakes_checkbox.stateChanged.connect(
             self.level_list_model.hide_fake_levels)
@@ -58,40 +106,165 @@ class LevelsBotWindow(Ui_MainWindow, QtGui.QMainWindow):
             self.level_list_model.show_subs_levels_only)
         self.mods_only_checkbox.stateChanged.connect(
             self.level_list_model.show_mods_levels_only)
+        self.hide_played_checkbox.stateChanged.connect(
+            self.level_list_model.hide_already_played_levels)
+        self.group_near_duplicates_checkbox.stateChanged.connect(
+            self.level_list_model.set_group_near_duplicates)
+        self.hot_sort_checkbox.toggled.connect(self.level_list_model.sort_by_hotness)
+        # Sorting by a column replaces the hotness sorting
+        self.levels_tableView.horizontalHeader().sectionClicked.connect(
+            lambda section: self.hot_sort_checkbox.setChecked(False))
 
         self.select_random_button.clicked.connect(self.select_random_level)
+        for text, strategy in (("Uniform", LevelListModel.RandomStrategy.Uniform),
+                               ("By times requested", LevelListModel.RandomStrategy.TimesRequested),
+                               ("By privileges", LevelListModel.RandomStrategy.Priviledges),
+                               ("Recent first", LevelListModel.RandomStrategy.Recency)):
+            self.random_strategy_combobox.addItem(text, int(strategy))
+        self.random_strategy_combobox.currentIndexChanged.connect(
+            self.random_strategy_changed)
         self.open_in_brower_button.clicked.connect(self.open_code_in_browser)
+        self.mark_played_button.clicked.connect(self.mark_selected_played)
+
+        # Codes played in this session and the earlier ones
+        self.played_history = None
+        try:
+            self.played_history = PlayedHistory.PlayedHistory(
+                self.settings.value("history/file", "user/played_history.bin"))
+        except (OSError, ValueError) as e:
+            print("Failed to open the played levels history")
+            print(e)
+        LevelListModel.Level.set_history(self.played_history)
+
+        # Queue mode: the levels are played first come, first served
+        self.level_queue = LevelQueue.LevelQueue()
+        self.level_queue.load_from_file("user/queue.bin")
+        self.position_replies = {} # Key: user login, value: time of the last !position reply
+        self.queue_mode_checkbox.stateChanged.connect(self.toggle_queue_mode)
+        self.queue_mode_checkbox.setChecked(
+            self.settings.value("queue/enabled", "false") == "true")
+        self.next_level_button.clicked.connect(self.next_level)
+        self.skip_level_button.clicked.connect(self.skip_level)
+        self.requeue_level_button.clicked.connect(self.requeue_level)
+        self.update_current_level()
+
+        # Maximum number of levels per user, by privileges
+        self.level_list_model.quota_exceeded.connect(self.quota_exceeded_slot)
+        for spinbox, tier in ((self.viewer_quota_spinbox, LevelListModel.Tier.Viewer),
+                              (self.sub_quota_spinbox, LevelListModel.Tier.Sub),
+                              (self.mod_quota_spinbox, LevelListModel.Tier.Mod)):
+            spinbox.valueChanged.connect(functools.partial(self.set_quota, tier))
+            spinbox.setValue(int(self.settings.value("quotas/" + tier.name.lower(), 0)))
+
+        # Levels of the users banned or timed out, and of the deleted messages, are removed
+        self.remove_moderated_checkbox.setChecked(
+            self.settings.value("moderation/remove_levels", "true") == "true")
+        self.remove_moderated_checkbox.stateChanged.connect(
+            lambda checked: self.settings.setValue("moderation/remove_levels", "true" if checked else "false"))
+
+        # Codes posted the most in the last minute
+        self.trending = HeavyHitters.SlidingTopK(window=60)
+        self.trending_timer = QtCore.QTimer(self)
+        self.trending_timer.timeout.connect(self.update_trending_list)
+        self.trending_timer.start(1000)
 
         self.delete_level_button.clicked.connect(functools.partial(
             self.delete_selected_slot, self.levels_tableView, self.level_list_model))
+        self.delete_user_levels_button.clicked.connect(self.delete_selected_users_levels)
         self.reset_levels_button.clicked.connect(self.level_list_model.reset)
+        self.reset_levels_button.clicked.connect(self.update_current_level)
 
         # Saved list tab
 
         self.save_list_model = LevelListModel.LevelListModel()
-        self.save_list_model.load_model_from_file("user/saved_levels.bin")
         self.saved_tableView.setModel(self.save_list_model)
         self.saved_tableView.horizontalHeader().setResizeMode(
             QtGui.QHeaderView.Stretch)
 
+        self.saved_search_lineedit.textChanged.connect(
+            self.save_list_model.set_search)
         self.delete_saved_button.clicked.connect(functools.partial(
             self.delete_selected_slot, self.saved_tableView, self.save_list_model))
         self.reset_saved_button.clicked.connect(self.save_list_model.reset)
 
         # Fake list tab
         self.fake_list_model = LevelListModel.LevelListModel()
-        self.fake_list_model.load_model_from_file("user/fake_levels.bin")
         self.fakes_tableView.setModel(self.fake_list_model)
         self.fakes_tableView.horizontalHeader().setResizeMode(
             QtGui.QHeaderView.Stretch)
 
+        self.fakes_search_lineedit.textChanged.connect(
+            self.fake_list_model.set_search)
         self.delete_fake_button.clicked.connect(functools.partial(
             self.delete_selected_slot, self.fakes_tableView, self.fake_list_model))
         self.reset_fakes_button.clicked.connect(self.fake_list_model.reset)
+        self.reset_fakes_button.clicked.connect(self.update_imported_fakes_label)
+
+        # Fake codes imported from external lists
+        self.import_fakes_button.clicked.connect(self.import_fakes)
+        self.fake_list_model.import_finished.connect(self.import_finished_slot)
+        self.fake_list_model.import_failed.connect(self.import_failed_slot)
+        self.fake_list_model.load_finished.connect(self.update_imported_fakes_label)
 
         # Back to levels list tab with the new models
 
-        LevelListModel.Level.set_fake_model(self.fake_list_model)
+        # Fake codes shared with the other instances of the bot running on this computer
+        self.fake_store = None
+        try:
+            self.fake_store = SharedFakeStore.SharedFakeStore(
+                self.settings.value("fakes/shared_store", "") or SharedFakeStore.default_filename(),
+                fallback=self.fake_list_model)
+        except (OSError, ValueError) as e:
+            print("Failed to open the shared fake codes store")
+            print(e)
+
+        if(self.fake_store is not None):
+            self.fake_list_model.set_shared_store(self.fake_store)
+            LevelListModel.Level.set_fake_model(self.fake_store)
+            self.fake_store_sequence = self.fake_store.sequence()
+            self.fake_store_timer = QtCore.QTimer(self)
+            self.fake_store_timer.timeout.connect(self.check_fake_store)
+            self.fake_store_timer.start(250)
+        else:
+            LevelListModel.Level.set_fake_model(self.fake_list_model)
+
+        # Loading the saved and fake lists in the background, the window shows meanwhile
+        self.loading_progressbar = QtGui.QProgressBar(self)
+        self.loading_progressbar.setFormat("Loading lists: %p%")
+        self.statusbar.addPermanentWidget(self.loading_progressbar)
+        self.loading_progress = {}
+        self.all_lists_loaded = False
+        for model, filename in ((self.save_list_model, "user/saved_levels.bin"),
+                                (self.fake_list_model, "user/fake_levels.bin")):
+            self.loading_progress[model] = 0
+            model.load_progress.connect(functools.partial(self.loading_progress_slot, model))
+            model.load_model_from_file_async(filename)
+
+        # Levels checked against the fake list before it was fully loaded
+        self.fake_list_model.load_finished.connect(self.level_list_model.check_fakes_again)
+
+        # Exports of the lists
+        for action, model, name in ((self.actionExportLevels, self.level_list_model, "levels"),
+                                    (self.actionExportSaved, self.save_list_model, "saved_levels"),
+                                    (self.actionExportFakes, self.fake_list_model, "fake_levels")):
+            action.triggered.connect(functools.partial(self.export_slot, model, name))
+            model.export_finished.connect(self.export_finished_slot)
+            model.export_failed.connect(self.export_failed_slot)
+        # Profiling, to find what slows the bot down
+        self.profiler = Profiling.Profiler("user/profiles")
+        self.actionProfile.toggled.connect(functools.partial(self.toggle_profiling, False))
+        self.actionProfileMemory.toggled.connect(functools.partial(self.toggle_profiling, True))
+        self.actionMemoryUsage.triggered.connect(self.memory_usage)
+
+        # Levels list shown in OBS by a browser source
+        self.overlay_server = OverlayServer.OverlayServer(
+            self.level_list_model,
+            port=int(self.settings.value("overlay/port", OverlayServer.OverlayServer.DEFAULT_PORT)),
+            rows=int(self.settings.value("overlay/rows", 20)))
+        self.actionOverlayServer.toggled.connect(self.toggle_overlay_server)
+        self.actionOverlayServer.setChecked(
+            self.settings.value("overlay/enabled", "false") == "true")
+
         self.save_level_button.clicked.connect(
             functools.partial(self.move_selected_slot, self.save_list_model))
         self.fake_level_button.clicked.connect(
@@ -117,6 +290,145 @@ class LevelsBotWindow(Ui_MainWindow, QtGui.QMainWindow):
             "twitter.com/LaraephFR\n"
             "laraephddo@gmail.com\n")
 
+    def export_slot(self, model, name):
+        """Ask for a file and export the shown levels of the model to it.
+        """
+        filename, selected_filter = QtGui.QFileDialog.getSaveFileName(
+            self,
+            "Export list",
+            "user/{}.csv".format(name),
+            "CSV (*.csv);;JSON Lines (*.jsonl)")
+
+        if(filename):
+            self.statusbar.showMessage("Exporting to {}...".format(filename))
+            model.export_view(filename)
+
+    def export_finished_slot(self, filename, count):
+        """Slot connected to the "export finished" signal of the models.
+        """
+        self.statusbar.showMessage("Exported {count} levels to {filename}".format(
+            count=count, filename=filename))
+
+    def export_failed_slot(self, filename, error):
+        """Slot connected to the "export failed" signal of the models.
+        """
+        QtGui.QMessageBox.information(
+            self,
+            "Unable to export the list",
+            "Unable to export the list to {filename}\n{error}".format(
+                filename=filename, error=error)
+        )
+
+    def toggle_profiling(self, memory, checked):
+        """Start or stop profiling, with the memory allocations or not.
+        The results are written when it stops.
+        """
+        # One profiling at a time
+        other = self.actionProfile if memory else self.actionProfileMemory
+        other.setEnabled(not checked)
+
+        if(checked):
+            self.profiler.start(memory)
+            self.statusbar.showMessage("Profiling...")
+        else:
+            files = self.profiler.stop()
+            if(files):
+                self.statusbar.showMessage("Profile written to {}".format(os.path.dirname(files[0])))
+
+    def memory_usage(self):
+        """Display a messagebox with the memory used by each list.
+        """
+        lines = []
+        for name, model in (("Levels list", self.level_list_model),
+                            ("Saved levels", self.save_list_model),
+                            ("Fake levels", self.fake_list_model)):
+            usage = model.memory_usage()
+            lines.append("{name}: {count} levels, {total} ({per_level} per level)\n"
+                         "    levels {levels}, containers {containers}, indexes {indexes}".format(
+                name=name, count=usage['count'],
+                total=MemoryUsage.format_bytes(usage['total']),
+                per_level=MemoryUsage.format_bytes(usage['per_level']),
+                levels=MemoryUsage.format_bytes(usage['levels']),
+                containers=MemoryUsage.format_bytes(
+                    usage['levels_dict'] + usage['view_list'] + usage['view_keys']),
+                indexes=MemoryUsage.format_bytes(usage['indexes'])))
+
+        QtGui.QMessageBox.information(self, "Memory usage", "\n".join(lines))
+
+    def toggle_overlay_server(self, checked):
+        """Start or stop serving the levels list to the overlays, and remember it.
+        """
+        if(checked):
+            try:
+                self.overlay_server.start()
+            except OSError as e:
+                print("Failed to start the overlay server")
+                print(e)
+                self.statusbar.showMessage("Unable to start the overlay server: {}".format(e))
+                self.actionOverlayServer.setChecked(False)
+                return
+            self.statusbar.showMessage("Overlay at {}".format(self.overlay_server.url))
+        else:
+            self.overlay_server.stop()
+        self.settings.setValue("overlay/enabled", "true" if checked else "false")
+
+    def import_fakes(self):
+        """Ask for a list of fake codes and import it in the fake list.
+        """
+        filename, selected_filter = QtGui.QFileDialog.getOpenFileName(
+            self,
+            "Import a fake codes list",
+            "user",
+            "Codes lists (*.txt *.csv);;All files (*)")
+
+        if(filename):
+            self.statusbar.showMessage("Importing {}...".format(filename))
+            self.import_fakes_button.setEnabled(False)
+            self.fake_list_model.import_codes_async(filename)
+
+    def import_finished_slot(self, stats):
+        """Slot connected to the "import finished" signal of the fake list.
+        """
+        self.import_fakes_button.setEnabled(True)
+        self.statusbar.showMessage(
+            "Imported {added} new fake codes ({valid} read, {duplicates} duplicates, "
+            "{malformed} malformed entries skipped) at {codes_per_s:.0f} codes/s".format(**stats))
+        self.update_imported_fakes_label()
+
+        # The levels already in the list may be fakes now
+        self.level_list_model.check_fakes_again(self.level_list_model.codes())
+
+    def import_failed_slot(self, filename, error):
+        """Slot connected to the "import failed" signal of the fake list.
+        """
+        self.import_fakes_button.setEnabled(True)
+        self.statusbar.clearMessage()
+        QtGui.QMessageBox.information(
+            self,
+            "Unable to import the list",
+            "Unable to import the list {filename}\n{error}".format(
+                filename=filename, error=error)
+        )
+
+    def update_imported_fakes_label(self, *args):
+        """Show the number of fake codes imported from external lists.
+        """
+        count = len(self.fake_list_model.imported_codes)
+        self.imported_fakes_label.setText("{} imported codes".format(count) if count else "")
+
+    def loading_progress_slot(self, model, percent):
+        """Slot receiving the loading progress of the saved and fake lists.
+        """
+        self.loading_progress[model] = percent
+        self.loading_progressbar.setValue(
+            sum(self.loading_progress.values()) // len(self.loading_progress))
+
+        if(not self.all_lists_loaded and
+           all(not model.loading for model in self.loading_progress)):
+            self.all_lists_loaded = True
+            self.loading_progressbar.hide()
+            self.lists_loaded.emit()
+
     ###########################################################################
     # IRC info tab
     ###########################################################################
@@ -140,23 +452,61 @@ class LevelsBotWindow(Ui_MainWindow, QtGui.QMainWindow):
 
     def connect(self):
         """Create a ChatListener and connect it to Twitch chat to start receiving messages.
+
+        If asked to, the chat is read in a separate process (IngestionProcess).
         """
         if(self.chat_listener is None):
-            self.chat_listener = ChatListener.ChatListener(
-                self.twitch_name_lineedit.text(),
-                self.twitch_oauth_lineedit.text(),
-                map(lambda x: x.strip(),
-                    self.channel_lineedit.text().split(",")),
-                self)
+            name = self.twitch_name_lineedit.text()
+            oauth = self.twitch_oauth_lineedit.text()
+            channels = [ x.strip() for x in self.channel_lineedit.text().split(",") ]
+            for channel in channels: # Their tabs, before any level
+                if(channel):
+                    self.level_list_model.partition(channel)
+            if(self.separate_process_checkbox.isChecked()):
+                self.chat_listener = IngestionProcess.IngestionProcess(
+                    name, oauth, channels, self, matcher=self.matcher)
+            else:
+                self.chat_listener = ChatListener.ChatListener(
+                    name, oauth, channels, self)
 
             self.chat_listener.wrong_password.connect(self.wrong_password_slot)
             self.chat_listener.connection_failed.connect(
                 self.connection_failed_slot)
             self.chat_listener.connection_successful.connect(
                 self.connection_successful_slot)
+            self.chat_listener.user_cleared.connect(self.user_cleared_slot)
+            self.chat_listener.message_deleted.connect(self.message_deleted_slot)
+            self.chat_listener.room_state.connect(self.room_state_slot)
+            self.chat_listener.add_command_callback("!position", self.position_command)
 
             self.chat_listener.start()
 
+    def apply_matching_rules(self):
+        """Use the matching rules typed in the Twitch chat info tab, and save them.
+        """
+        try:
+            rules = CodeMatcher.parse_rules(self.matching_rules_lineedit.text())
+        except ValueError as e:
+            self.statusbar.showMessage(str(e))
+            return
+
+        if(isinstance(self.chat_listener, IngestionProcess.IngestionProcess)):
+            self.chat_listener.set_rules(rules) # The codes are found by the ingestion process
+        else:
+            self.matcher.set_rules(rules)
+        self.settings.setValue(
+            "irc_info/matching_rules", self.matching_rules_lineedit.text())
+
+    def repeat_counting_changed(self, index):
+        """Slot receiving how the copies of a message count, and saving it.
+        """
+        repeats = CodeMatcher.RepeatCounting(self.repeats_combobox.itemData(index))
+        if(isinstance(self.chat_listener, IngestionProcess.IngestionProcess)):
+            self.chat_listener.set_repeat_counting(repeats)
+        else:
+            self.matcher.set_repeat_counting(repeats)
+        self.settings.setValue("irc_info/repeats", int(repeats))
+
     def wrong_password_slot(self):
         """Slot connected to the "wrong password" signal that may be emitted by the ChatListener.
         """
@@ -191,6 +541,40 @@ class LevelsBotWindow(Ui_MainWindow, QtGui.QMainWindow):
             "irc_info/nick", self.twitch_name_lineedit.text())
         self.settings.setValue(
             "irc_info/oauth", self.twitch_oauth_lineedit.text())
+        self.settings.setValue(
+            "irc_info/separate_process",
+            "true" if self.separate_process_checkbox.isChecked() else "false")
+
+    def update_lag_label(self):
+        """Display the number of pending messages and the latency of the chat callbacks.
+        """
+        if(self.chat_listener is None):
+            self.lag_label.setText("")
+            return
+
+        texts = []
+        for callback, lag in self.chat_listener.callbacks_lag().items():
+            texts.append("{name}: {pending} pending, {latency:.0f} ms, {dropped} dropped".format(
+                name=getattr(callback, "__name__", "callback"),
+                pending=lag['pending'],
+                latency=lag['last_latency'] * 1000,
+                dropped=lag['dropped']))
+        texts.append("rules: " + ", ".join(
+            "{} {}".format(name, hits) for name, hits in self.matcher.hit_counts()))
+        cache = self.matcher.cache_stats()
+        texts.append("copies: {:.0%} of messages, {} not counted".format(cache['hit_rate'], cache['dropped']))
+        self.lag_label.setText(" | ".join(texts))
+
+    def check_fake_store(self):
+        """Check the levels list again if fakes were marked in the shared store,
+        by this instance or another one.
+        """
+        sequence = self.fake_store.sequence()
+        if(sequence == self.fake_store_sequence):
+            return
+
+        self.fake_store_sequence = sequence
+        self.level_list_model.check_fakes_again(self.level_list_model.codes())
 
     ###########################################################################
     # Levels list tab
@@ -200,7 +584,9 @@ class LevelsBotWindow(Ui_MainWindow, QtGui.QMainWindow):
         """Slot receiving information about if chat should be parsed or not.
         """
         if(checked):
-            if(self.chat_listener is not None):
+            if(isinstance(self.chat_listener, IngestionProcess.IngestionProcess)):
+                self.chat_listener.add_callback(self.add_code) # Messages already matched
+            elif(self.chat_listener is not None):
                 self.chat_listener.add_callback(self.parse_message)
             else:
                 box = QtGui.QMessageBox.information(
@@ -214,37 +600,193 @@ class LevelsBotWindow(Ui_MainWindow, QtGui.QMainWindow):
         else:
             if(self.chat_listener is not None):
                 self.chat_listener.remove_callback(self.parse_message)
-
-    # RegExp used to find codes. Pre-compiled to go faster when receiving
-    # messages.
-    code_re = re.compile(
-        "[0-9A-F]{4}[ \-_][0-9A-F]{4}[ \-_][0-9A-F]{4}[ \-_][0-9A-F]{4}")
+                self.chat_listener.remove_callback(self.add_code)
 
     def parse_message(self, channel, name, tags, message):
         """Parse a message read from chat. This is the callback for the ChatListener.
         """
-        s = self.code_re.search(message.upper())
+        match = self.matcher.match(message, channel, name)
 
-        if(s is None):
+        if(match is None):
             return
         else:
-            code = message[s.start(): s.end()].upper().replace(
-                " ", "-").replace("_", "-")
-            self.level_list_model.add_level(code, name, tags)
+            self.add_code(channel, name, tags, match[0])
+
+    def add_code(self, channel, name, tags, code):
+        """Add a code submitted in chat to the levels list.
+        This is the callback for the IngestionProcess, which already matched the messages.
+        """
+        self.trending.add(code)
+        self.level_list_model.add_level(code, name, tags, channel)
+
+    def channel_added_slot(self, channel):
+        """Slot receiving the channels of the levels list, to give each one its tab.
+        """
+        self.channel_tabbar.addTab("#" + channel)
+
+    def show_channel(self, index):
+        """Slot receiving the tab chosen above the levels: all channels, or one of them.
+        """
+        channels = self.level_list_model.channels()
+        self.level_list_model.show_channel(channels[index - 1] if 0 < index <= len(channels) else None)
+
+    def update_trending_list(self):
+        """Refresh the list of the codes posted the most in the last minute.
+        """
+        self.trending_listwidget.clear()
+        for code, count in self.trending.top(5):
+            self.trending_listwidget.addItem("{code} ({count})".format(code=code, count=count))
+
+    def random_strategy_changed(self, index):
+        """Slot receiving the new choice of random strategy.
+        """
+        self.level_list_model.set_random_strategy(
+            self.random_strategy_combobox.itemData(index))
 
     def select_random_level(self):
         """Select a random level in the level view.
         """
         self.levels_tableView.clearSelection()
 
-        row_nb = self.level_list_model.rowCount()
-        selection = random.randrange(0, row_nb)
+        level = self.level_list_model.random_level()
+        selection = None if level is None else self.level_list_model.row_of_level(level)
+        if(selection is None): # No level to select
+            self.statusbar.showMessage("No level to select")
+            return
 
         self.levels_tableView.selectRow(selection)
         self.levels_tableView.scrollTo(
             self.levels_tableView.selectedIndexes()[0])
         self.levels_tableView.setFocus()
 
+    def toggle_queue_mode(self, checked):
+        """Slot receiving if the new levels should be put in the queue.
+        """
+        self.level_list_model.set_queue(self.level_queue if checked else None)
+        for button in (self.next_level_button, self.skip_level_button, self.requeue_level_button):
+            button.setEnabled(bool(checked))
+        self.settings.setValue("queue/enabled", "true" if checked else "false")
+
+    def next_level(self):
+        """The current level was played, move to the next one in the queue.
+        """
+        played, current = self.level_queue.next()
+        if(played is not None):
+            self.level_list_model.mark_played([played])
+        self.update_current_level()
+
+    def skip_level(self):
+        """Drop the current level without playing it, move to the next one in the queue.
+        """
+        self.level_queue.skip()
+        self.update_current_level()
+
+    def requeue_level(self):
+        """Put the current level back at the end of the queue, move to the next one.
+        """
+        self.level_queue.requeue()
+        self.update_current_level()
+
+    def mark_selected_played(self):
+        """Mark the selected levels as played, so they are known as such in the next sessions too.
+        """
+        levels = [ self.level_list_model.data(index, LevelListModel.Level)
+                   for index in self.levels_tableView.selectionModel().selectedRows() ]
+        self.level_list_model.mark_played(levels)
+
+    def update_current_level(self):
+        """Show the current level of the queue, and select it in the levels list if it is shown.
+        """
+        level = self.level_queue.current
+        if(level is None):
+            self.current_level_label.setText("{} levels in the queue".format(len(self.level_queue)))
+            return
+
+        self.current_level_label.setText("Playing {} by {}\n{} levels in the queue".format(
+            level.code, level.name, len(self.level_queue)))
+
+        row = self.level_list_model.row_of_level(level)
+        if(row is not None):
+            self.levels_tableView.selectRow(row)
+            self.levels_tableView.scrollTo(self.levels_tableView.selectedIndexes()[0])
+
+    def set_quota(self, tier, limit):
+        """Slot receiving the maximum number of levels per user of a tier, 0 for no limit.
+        """
+        self.level_list_model.set_quota(tier, limit)
+        self.settings.setValue("quotas/" + tier.name.lower(), limit)
+
+    def user_cleared_slot(self, channel, user, duration):
+        """Slot receiving the users timed out (for duration seconds) or banned (duration 0).
+        Their levels in the channel are removed, if asked to.
+        """
+        if(not self.remove_moderated_checkbox.isChecked()):
+            return
+
+        count = self.level_list_model.remove_user_levels(user, channel)
+        if(count):
+            self.statusbar.showMessage("Removed {} levels from {} ({})".format(
+                count, user, "timed out" if duration else "banned"))
+
+    def message_deleted_slot(self, channel, user, message_id):
+        """Slot receiving the messages deleted by the moderators.
+        The level submitted by the message is removed, if asked to.
+        """
+        if(self.remove_moderated_checkbox.isChecked() and
+           self.level_list_model.remove_message_level(message_id)):
+            self.statusbar.showMessage("Removed the level of a message from {} deleted by a moderator".format(user))
+
+    def room_state_slot(self, channel, state):
+        """Slot receiving the room settings of a channel, and their changes.
+        """
+        modes = []
+        if(state.get("subs-only", "0") != "0"):
+            modes.append("subs only")
+        if(state.get("emote-only", "0") != "0"):
+            modes.append("emote only")
+        if(state.get("r9k", "0") != "0"):
+            modes.append("unique messages")
+        if(state.get("slow", "0") != "0"):
+            modes.append("slow mode ({}s)".format(state["slow"]))
+        if(state.get("followers-only", "-1") != "-1"):
+            modes.append("followers only")
+        if(modes):
+            self.statusbar.showMessage("#{}: {}".format(channel, ", ".join(modes)))
+
+    def quota_exceeded_slot(self, name, code):
+        """Slot receiving the levels refused because their user reached their quota.
+        """
+        self.statusbar.showMessage("{} refused: {} has too many levels already".format(code, name))
+
+    POSITION_COOLDOWN = 30 # Seconds between two !position replies to the same user
+
+    def position_command(self, channel, name, tags, message):
+        """Reply to !position with the position of the user's levels in the queue.
+        Callback of the chat listener, may run in its thread: the queue has its own lock.
+        """
+        if(self.level_list_model.queue is None): # Not in queue mode
+            return
+
+        user = name.lower()
+        if(tags is not None and tags.get("display-name", "") != ""):
+            name = tags["display-name"] # Same name as the levels
+
+        now = time.monotonic()
+        if(now - self.position_replies.get(user, -self.POSITION_COOLDOWN) < self.POSITION_COOLDOWN):
+            return # Not to flood the chat
+        self.position_replies[user] = now
+
+        current = self.level_queue.current
+        positions = self.level_queue.user_positions(user)
+        if(current is not None and current.user == user):
+            reply = "@{} your level is being played!".format(name)
+        elif(positions):
+            reply = "@{} your level is #{} in the queue ({} levels)".format(
+                name, ", #".join(str(position) for position in positions), len(self.level_queue))
+        else:
+            reply = "@{} you have no level in the queue".format(name)
+        self.chat_listener.send_message(channel, reply)
+
     def open_code_in_browser(self):
         """Open all the selected codes in a browser, to check if they are real.
         """
@@ -253,6 +795,10 @@ class LevelsBotWindow(Ui_MainWindow, QtGui.QMainWindow):
 
         for index in selected_indexes:
             code = self.level_list_model.data(index, LevelListModel.Level).code
+            if(CodeMatcher.code_format(code) != CodeMatcher.CodeFormat.SMM1):
+                # Only Super Mario Maker has a bookmark website
+                self.statusbar.showMessage("No course page for {}".format(code))
+                continue
             QtGui.QDesktopServices.openUrl(
                 "https://supermariomakerbookmark.nintendo.net/courses/"
                 "{!s}".format(code))
@@ -263,9 +809,8 @@ class LevelsBotWindow(Ui_MainWindow, QtGui.QMainWindow):
         selected_indexes = self.levels_tableView.selectionModel(
         ).selectedRows()
 
-        for index in selected_indexes:
-            level = self.level_list_model.data(index, LevelListModel.Level)
-            target_model.add_level(level.code, level.name, level.tags)
+        target_model.add_levels([ self.level_list_model.data(index, LevelListModel.Level)
+                                  for index in selected_indexes ])
 
         self.level_list_model.remove_indexes(selected_indexes)
 
@@ -279,6 +824,15 @@ class LevelsBotWindow(Ui_MainWindow, QtGui.QMainWindow):
         selected_indexes = target_view.selectionModel().selectedRows()
         target_model.remove_indexes(selected_indexes)
 
+    def delete_selected_users_levels(self):
+        """Delete all the levels of the users of the selected levels, in the levels list.
+        """
+        levels = [ self.level_list_model.data(index, LevelListModel.Level)
+                   for index in self.levels_tableView.selectionModel().selectedRows() ]
+        users = { level.user: level.name for level in levels }
+        count = sum(self.level_list_model.remove_user_levels(user) for user in users)
+        self.statusbar.showMessage("Deleted {} levels from {}".format(count, ", ".join(sorted(users.values()))))
+
     ###########################################################################
     # Qt standard slots
     ###########################################################################
@@ -286,5 +840,12 @@ class LevelsBotWindow(Ui_MainWindow, QtGui.QMainWindow):
     def closeEvent(self, event):
         """Method called as the program exits.
         """
+        self.profiler.stop()
+        self.overlay_server.stop()
+        if(isinstance(self.chat_listener, IngestionProcess.IngestionProcess)):
+            self.chat_listener.stop()
         self.save_list_model.save_model_to_file("user/saved_levels.bin")
         self.fake_list_model.save_model_to_file("user/fake_levels.bin")
+        self.level_queue.save_to_file("user/queue.bin")
+        if(self.played_history is not None):
+            self.played_history.close()
@@ -1,24 +1,67 @@
 ﻿import os
 import sys
+import time
+
+START_TIME = time.perf_counter()
 
 def main():
-    
-    from PySide import QtGui
-    from LevelsBotWindow import LevelsBotWindow
+    """Start the bot.
+
+    Logs the import and startup times. With --startup-benchmark,
+    quits as soon as the saved and fake lists are loaded.
+    With --profile, profiles from the start (see Profiling.Profiler),
+    with --profile-memory, the memory allocations too.
+    """
+    benchmark = "--startup-benchmark" in sys.argv
+
+    if(not benchmark):
+        logfile = open("log.txt", "w")
+        sys.stdout = logfile
+        sys.stderr = logfile
+
+    timings = []
+    def timing(step):
+        timings.append((step, time.perf_counter() - START_TIME))
+        print("Startup: {step} after {time:.3f} s".format(step=step, time=timings[-1][1]))
 
-    logfile = open("log.txt", "w")
-    sys.stdout = logfile
-    sys.stderr = logfile
+    from PySide import QtCore, QtGui
+    timing("PySide imported")
+    from LevelsBotWindow import LevelsBotWindow
+    timing("LevelsBotWindow imported")
 
     app = QtGui.QApplication(sys.argv)
     win = LevelsBotWindow()
+    timing("window created")
+    if("--profile-memory" in sys.argv):
+        win.actionProfileMemory.setChecked(True)
+    elif("--profile" in sys.argv):
+        win.actionProfile.setChecked(True)
+
+    class FirstPaintFilter(QtCore.QObject):
+        """Notes the time of the first paint of the window."""
+        def eventFilter(self, obj, event):
+            if(event.type() == QtCore.QEvent.Paint):
+                obj.removeEventFilter(self)
+                timing("first paint")
+            return False
+
+    first_paint_filter = FirstPaintFilter()
+    win.installEventFilter(first_paint_filter)
+    win.lists_loaded.connect(lambda: timing("lists loaded"))
+    if(benchmark):
+        win.lists_loaded.connect(app.quit)
+
     win.show()
     app.exec_()
 
-    logfile.close()
+    if(not benchmark):
+        logfile.close()
 
 if(__name__ == "__main__"):
 
+    import multiprocessing
+    multiprocessing.freeze_support() # For the chat ingestion process of frozen executables
+
     if getattr(sys,'frozen',False):
         # if trap for frozen script wrapping
         sys.path.append(os.path.join(os.path.dirname(sys.executable),'bin'))
@@ -0,0 +1,80 @@
+import sys
+import types
+import random
+import collections
+
+
+# Objects sized without looking inside
+_LEAVES = (str, bytes, bytearray, int, float, complex, bool, type(None), range)
+# Shared by the whole program, not counted
+_SHARED = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType,
+           types.MethodType, types.CodeType)
+
+_random = random.Random() # Not to change the draws of the random levels
+
+
+def _references(obj):
+    """Return the objects referenced by obj that are counted with it.
+    """
+    if(isinstance(obj, dict)):
+        return list(obj.keys()) + list(obj.values())
+    if(isinstance(obj, (tuple, list, set, frozenset, collections.deque))):
+        return obj
+    if(type(obj).__module__.startswith(("PySide", "shiboken"))): # Qt objects, sized by their wrapper
+        return ()
+
+    references = []
+    state = getattr(obj, "__dict__", None)
+    if(state is not None):
+        references.append(state)
+    for cls in type(obj).__mro__:
+        for slot in cls.__dict__.get("__slots__", ()):
+            if(slot not in ("__dict__", "__weakref__") and hasattr(obj, slot)):
+                references.append(getattr(obj, slot))
+    return references
+
+def deep_sizeof(obj, seen=None, sample=None):
+    """Return the bytes used by obj and the objects it references, each object counted once.
+
+    seen is a set of the ids of the objects already counted, updated. It can be shared between
+    calls so the objects referenced from several structures are counted by the first one.
+    Containers of more than sample items are estimated from sample random items of them,
+    so sizing a million levels doesn't go through all of them.
+    Functions, classes and modules are shared by the program and not counted.
+    """
+    if(seen is None):
+        seen = set()
+
+    size = 0
+    stack = [ (obj, 1.0) ] # Objects to size, with how many times they count
+    while(stack):
+        obj, factor = stack.pop()
+        if(id(obj) in seen or isinstance(obj, _SHARED)):
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj) * factor
+        if(isinstance(obj, _LEAVES)):
+            continue
+
+        references = _references(obj)
+        if(sample is not None and isinstance(obj, dict) and len(obj) > sample):
+            # The keys and values of the sampled items
+            keys = _random.sample(list(obj.keys()), sample)
+            references = keys + [ obj[key] for key in keys ]
+            factor = factor * len(obj) / sample
+        elif(sample is not None and len(references) > sample):
+            count = len(references)
+            references = _random.sample(list(references), sample)
+            factor = factor * count / sample
+        stack.extend((reference, factor) for reference in references)
+
+    return int(size)
+
+def format_bytes(size):
+    """Return a size in bytes as a short text (12.3 MB).
+    """
+    for unit in ("bytes", "KB", "MB"):
+        if(size < 1024):
+            return "{:.0f} {}".format(size, unit) if unit == "bytes" else "{:.1f} {}".format(size, unit)
+        size /= 1024
+    return "{:.1f} GB".format(size)
@@ -0,0 +1,331 @@
+import json
+import difflib
+import itertools
+import threading
+import collections
+import socketserver
+import http.server
+import urllib.parse
+
+from PySide.QtCore import Qt
+
+import LevelListModel
+
+
+_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Levels</title>
+<style>
+body { margin: 0; background: transparent; color: white; font: bold 22px sans-serif; text-shadow: 1px 1px 2px black; }
+ol { margin: 0.5em; padding-left: 2em; }
+.times { color: #ffd700; }
+#count { margin: 0 0.5em; font-size: 18px; }
+</style></head>
+<body><ol id="levels"></ol><div id="count"></div>
+<script>
+var levels = [];
+var rows = 0;
+function render_count() {
+    document.getElementById("count").textContent = rows > levels.length ? rows + " levels in the list" : "";
+}
+function render() {
+    var list = document.getElementById("levels");
+    list.innerHTML = "";
+    levels.forEach(function(level) {
+        var item = document.createElement("li");
+        item.textContent = level.code + " " + level.name + " ";
+        if(level.times_requested > 1) {
+            var times = document.createElement("span");
+            times.className = "times";
+            times.textContent = "x" + level.times_requested;
+            item.appendChild(times);
+        }
+        list.appendChild(item);
+    });
+    render_count();
+}
+var source = new EventSource("/events");
+source.addEventListener("snapshot", function(e) { var d = JSON.parse(e.data); levels = d.levels; rows = d.rows; render(); });
+source.addEventListener("insert", function(e) { var d = JSON.parse(e.data); Array.prototype.splice.apply(levels, [d.row, 0].concat(d.levels)); render(); });
+source.addEventListener("remove", function(e) { var d = JSON.parse(e.data); levels.splice(d.row, d.count); render(); });
+source.addEventListener("update", function(e) { var d = JSON.parse(e.data); levels[d.row] = d.level; render(); });
+source.addEventListener("count", function(e) { rows = JSON.parse(e.data).rows; render_count(); });
+</script></body></html>
+"""
+
+
+def _encode_level(level):
+    """Return what the overlays get of a level.
+    """
+    return { 'code': level.code, 'name': level.name,
+             'times_requested': level.times_requested, 'privileges': level.privileges() }
+
+
+class _EventStream(object):
+    """The events sent to the overlays, each one encoded once for all of them.
+
+    The last events are kept in a ring: each client only has its position in it,
+    and a client too far behind (its next event left the ring) gets a snapshot instead.
+    """
+
+    def __init__(self, size):
+        super().__init__()
+        self.events = collections.deque(maxlen=size) # (id, encoded event) tuples
+        self.last_id = 0
+        self.condition = threading.Condition()
+
+    def add(self, name, data):
+        """Encode and add an event. Must be called holding the condition.
+        """
+        self.last_id += 1
+        self.events.append((self.last_id, self.encode(self.last_id, name, data)))
+        self.condition.notify_all()
+
+    def since(self, event_id):
+        """Return the encoded events after event_id, None if some of them left the ring.
+        Must be called holding the condition.
+        """
+        if(event_id == self.last_id):
+            return []
+        first_id = self.events[0][0] if self.events else self.last_id + 1
+        if(not first_id <= event_id + 1 <= self.last_id): # From another run of the server too
+            return None
+        return [ encoded for current_id, encoded in
+                 itertools.islice(self.events, event_id + 1 - first_id, None) ]
+
+    @staticmethod
+    def encode(event_id, name, data):
+        return "id: {}\nevent: {}\ndata: {}\n\n".format(
+            event_id, name, json.dumps(data, separators=(",", ":"))).encode()
+
+
+class _Server(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True # The event streams never end, they don't keep the bot running
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    """Answers the requests of the overlays, for the OverlayServer set as server.overlay.
+    """
+
+    def do_GET(self):
+        url = urllib.parse.urlparse(self.path)
+        if(url.path == "/"):
+            self._send(200, "text/html; charset=utf-8", _PAGE.encode())
+        elif(url.path == "/levels.json"):
+            self._snapshot()
+        elif(url.path == "/events"):
+            self._events(urllib.parse.parse_qs(url.query))
+        else:
+            self._send(404, "text/plain", b"Not found")
+
+    def log_message(self, format, *args):
+        pass # Every poll of every overlay would be printed
+
+    def _send(self, code, content_type, body, headers=()):
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for header in headers:
+            self.send_header(*header)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _snapshot(self):
+        """The levels shown, with the id of the last event as ETag:
+        304 Not Modified if the client has them already.
+        """
+        overlay = self.server.overlay
+        stream = overlay.stream
+        stream.condition.acquire()
+        snapshot = overlay.snapshot()
+        stream.condition.release()
+
+        etag = '"{}"'.format(snapshot['version'])
+        if(self.headers.get("If-None-Match", "") == etag):
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self._send(200, "application/json", json.dumps(snapshot).encode(),
+                   (("ETag", etag), ("Cache-Control", "no-cache")))
+
+    def _events(self, query):
+        """Server-Sent Events: a snapshot if the client has nothing (or is too far behind),
+        then the changes as they happen, until the client leaves or the server stops.
+        """
+        overlay = self.server.overlay
+        stream = overlay.stream
+        last_id = self.headers.get("Last-Event-ID", query.get("since", [""])[0])
+        try:
+            position = int(last_id)
+        except ValueError:
+            position = -1 # Starts with a snapshot
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        try:
+            while(overlay.running):
+                stream.condition.acquire()
+                if(position == stream.last_id):
+                    stream.condition.wait(overlay.KEEPALIVE)
+                events = stream.since(position) if position >= 0 else None
+                if(events is None):
+                    snapshot = overlay.snapshot()
+                    position = snapshot['version']
+                    events = [ stream.encode(position, "snapshot", snapshot) ]
+                else:
+                    position = stream.last_id
+                stream.condition.release()
+
+                # Written outside of the lock: a slow client only slows itself down
+                self.wfile.write(b"".join(events) if events else b": keepalive\n\n")
+                self.wfile.flush()
+        except OSError: # The client left
+            pass
+
+
+class OverlayServer(object):
+    """Serves the first rows of a levels model to overlays (OBS browser sources) on the computer.
+
+    An HTTP server on the loopback interface, in a background thread:
+        /             an overlay page showing the levels
+        /levels.json  the levels shown, with an ETag
+        /events       Server-Sent Events: a snapshot, then the rows inserted, removed or updated
+    The model's row signals trigger a diff of the rows shown, run in the thread changing the model:
+    the changes after the first rows only change the count of levels.
+    """
+
+    DEFAULT_PORT = 8765
+    KEEPALIVE = 15 # Seconds between two keepalive comments on an idle event stream
+
+    def __init__(self, model, port=DEFAULT_PORT, rows=20, buffer=1024):
+        """Create the server for the first rows of model (a LevelListModel or ChannelLevelModel).
+        buffer is the number of events kept for the clients behind.
+        """
+        super().__init__()
+        self.model = model
+        self.port = port
+        self.rows = rows
+        self.stream = _EventStream(buffer)
+        self.running = False
+        self.httpd = None
+        self.thread = None
+
+        # Rows sent to the overlays: (level seq, encoded level) tuples, and the number of levels
+        self.shown = []
+        self.count = 0
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:{}/".format(self.port)
+
+    def start(self):
+        """Start serving. Raise OSError if the port can't be used.
+        """
+        if(self.running):
+            return
+
+        self.httpd = _Server(("127.0.0.1", self.port), _Handler)
+        self.httpd.overlay = self
+        self.running = True
+
+        # Called right away, in the thread changing the model
+        for signal, slot in self._slots():
+            signal.connect(slot, Qt.DirectConnection)
+        self._refresh()
+
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="OverlayServer")
+        self.thread.setDaemon(True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop serving, the event streams end.
+        """
+        if(not self.running):
+            return
+
+        self.running = False
+        for signal, slot in self._slots():
+            signal.disconnect(slot)
+
+        self.stream.condition.acquire()
+        self.stream.condition.notify_all()
+        self.stream.condition.release()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def snapshot(self):
+        """Return the rows shown as sent to the overlays. Must be called holding stream.condition.
+        """
+        return { 'version': self.stream.last_id, 'rows': self.count,
+                 'levels': [ encoded for seq, encoded in self.shown ] }
+
+    def _slots(self):
+        """Return the (signal of the model, slot) pairs to connect.
+        """
+        return ((self.model.rowsInserted, self._rows_changed),
+                (self.model.rowsRemoved, self._rows_changed),
+                (self.model.rowsMoved, self._rows_moved),
+                (self.model.dataChanged, self._data_changed),
+                (self.model.modelReset, self._refresh),
+                (self.model.layoutChanged, self._refresh))
+
+    def _rows_changed(self, parent, first, last):
+        self._changed(first)
+
+    def _rows_moved(self, parent, start, end, destination, row):
+        self._changed(min(start, row))
+
+    def _data_changed(self, top_left, bottom_right):
+        self._changed(top_left.row())
+
+    def _changed(self, row):
+        """The rows of the model changed from row: the rows shown are compared again
+        if it is one of them, otherwise only the count of levels may have changed.
+        """
+        if(row < self.rows):
+            self._refresh()
+        else:
+            self.stream.condition.acquire()
+            self._set_count()
+            self.stream.condition.release()
+
+    def _refresh(self):
+        """Send the differences between the rows shown and the first rows of the model.
+        """
+        levels = []
+        for row in range(min(self.rows, self.model.rowCount())):
+            level = self.model.data(self.model.index(row, 0), LevelListModel.Level)
+            if(level is None): # Removed meanwhile: the rows after it aren't the model's rows anymore
+                break
+            levels.append((level.seq, _encode_level(level)))
+
+        self.stream.condition.acquire()
+
+        old, self.shown = self.shown, levels
+        matcher = difflib.SequenceMatcher(None, [ seq for seq, encoded in old ],
+                                          [ seq for seq, encoded in levels ], autojunk=False)
+        # Applied in order, the rows before j1 are the new ones already
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if(tag == "equal"):
+                for offset in range(i2 - i1):
+                    if(old[i1 + offset][1] != levels[j1 + offset][1]):
+                        self.stream.add("update", { 'row': j1 + offset, 'level': levels[j1 + offset][1] })
+                continue
+            if(tag in ("delete", "replace")):
+                self.stream.add("remove", { 'row': j1, 'count': i2 - i1 })
+            if(tag in ("insert", "replace")):
+                self.stream.add("insert", { 'row': j1, 'levels': [ encoded for seq, encoded in levels[j1:j2] ] })
+        self._set_count()
+
+        self.stream.condition.release()
+
+    def _set_count(self):
+        """Send the number of levels if it changed. Must be called holding stream.condition.
+        """
+        count = self.model.rowCount()
+        if(count != self.count):
+            self.count = count
+            self.stream.add("count", { 'rows': count })
@@ -0,0 +1,273 @@
+import os
+import sys
+import zlib
+import array
+import bisect
+import struct
+import threading
+import collections
+
+import CodeMatcher
+
+
+def _encode_values(values):
+    """Return the compressed block of sorted values.
+
+    The values are little-endian uint64, with their bytes regrouped by significance
+    (all the lowest bytes, then all the next ones...): the high bytes of sorted values
+    are mostly the same and compress well with zlib.
+    """
+    data = array.array("Q", values)
+    if(sys.byteorder == "big"):
+        data.byteswap()
+    data = data.tobytes()
+    return zlib.compress(b"".join(data[i::8] for i in range(8)))
+
+def _decode_values(count, block):
+    """Return the sorted values of a block made by _encode_values, as an array.
+    Only slicing and copies, no Python loop over the values.
+    """
+    shuffled = zlib.decompress(block)
+    if(len(shuffled) != count * 8):
+        raise ValueError("Corrupted block: {} bytes instead of {}".format(len(shuffled), count * 8))
+
+    data = bytearray(count * 8)
+    for i in range(8):
+        data[i::8] = shuffled[i * count:(i + 1) * count]
+    values = array.array("Q")
+    values.frombytes(data)
+    if(sys.byteorder == "big"):
+        values.byteswap()
+    return values
+
+
+class _Run(object):
+    """Sparse index of a sorted run of blocks in the history file.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.firsts = [] # First key of each block, to bisect
+        self.lasts = [] # Last key of each block
+        self.blocks = [] # (offset of the data, compressed size, count) of each block
+
+    def add(self, first, last, offset, size, count):
+        self.firsts.append(first)
+        self.lasts.append(last)
+        self.blocks.append((offset, size, count))
+
+    def find_block(self, key):
+        """Return the index of the block that may hold key, or None.
+        """
+        index = bisect.bisect_right(self.firsts, key) - 1
+        if(index < 0 or key > self.lasts[index]):
+            return None
+        return index
+
+
+class PlayedHistory(object):
+    """Codes of the levels played in all the sessions, in an append-only file.
+
+    The codes played during a session are appended when saving, as a run of sorted blocks
+    of up to BLOCK_SIZE codes of the same format, each one compressed.
+    Only the first and last code of each block and where it is stay in memory: a lookup
+    bisects them then decompresses a single block, for each run of the file.
+    When there are more than MAX_RUNS runs, they are merged into one, so a lookup stays
+    O(log n) whatever the number of sessions.
+
+    Can be given to Level.set_history.
+    """
+
+    MAGIC = b"MMLBHIST"
+    HEADER = struct.Struct("<8sI") # magic, version
+    VERSION = 1
+    BLOCK = struct.Struct("<BxHQQI") # code format, count, first value, last value, compressed size
+
+    BLOCK_SIZE = 256 # Codes per block
+    MAX_RUNS = 8 # Runs in the file before merging them
+    CACHE_SIZE = 256 # Blocks kept decompressed
+
+    def __init__(self, filename):
+        """Open the history, creating the file if needed.
+        """
+        super().__init__()
+        self.filename = filename
+        self.lock = threading.RLock() # Codes are looked up from the chat threads
+        self.pending = set() # Integer keys of the codes played since the last save
+        self.runs = []
+        self.count = 0 # Codes in the file
+        self.cache = collections.OrderedDict() # Key: block offset, value: its values
+
+        self.file = open(filename, "a+b")
+        self.end = self._load_index() # End of the last complete block
+
+    def __len__(self):
+        return self.count + len(self.pending)
+
+    def close(self):
+        """Save the codes played and close the file.
+        """
+        self.save()
+        self.file.close()
+
+    def add(self, code):
+        """Add a played code (as a string) to the history.
+        """
+        try:
+            key = CodeMatcher.encode_code(code)
+        except ValueError: # Not a code the history can hold
+            return
+
+        with self.lock:
+            self.pending.add(key) # The codes already in the file are dropped when saving
+
+    def contains(self, key):
+        """Return True if the code (as an integer key, see CodeMatcher.encode_code) was played.
+        """
+        with self.lock:
+            return key in self.pending or self._in_file(key)
+
+    def check_code_in_model(self, code):
+        """Return True if the code (as a string) was played.
+        """
+        try:
+            return self.contains(CodeMatcher.encode_code(code))
+        except ValueError: # Not a code the history can hold
+            return False
+
+    def save(self):
+        """Append the codes played since the last save to the file, as a new run.
+        """
+        with self.lock:
+            if(not self.pending):
+                return
+
+            if(len(self.runs) >= self.MAX_RUNS):
+                self._merge()
+                return
+
+            # In order, so each block of the file is decompressed once
+            keys = [ key for key in sorted(self.pending) if not self._in_file(key) ]
+            if(keys):
+                self.file.truncate(self.end) # Drop an incomplete block left by a crash
+                self.file.seek(self.end)
+                self.runs.append(self._write_run(keys))
+                self.file.flush()
+                self.end = self.file.tell()
+                self.count += len(keys)
+            self.pending = set()
+
+    ###########################################################################
+    # Private methods
+    ###########################################################################
+
+    def _in_file(self, key):
+        """Return True if the key is in one of the runs of the file.
+        """
+        for run in self.runs:
+            index = run.find_block(key)
+            if(index is not None):
+                values = self._block_values(run, index)
+                value = CodeMatcher.split_key(key)[1]
+                position = bisect.bisect_left(values, value)
+                if(position < len(values) and values[position] == value):
+                    return True
+        return False
+
+    def _load_index(self):
+        """Read the block headers of the file to build the sparse index.
+        Return where the last complete block ends.
+        """
+        size = os.fstat(self.file.fileno()).st_size
+        self.file.seek(0)
+        if(size == 0):
+            self.file.write(self.HEADER.pack(self.MAGIC, self.VERSION))
+            self.file.flush()
+            return self.HEADER.size
+
+        magic, version = self.HEADER.unpack(self.file.read(self.HEADER.size))
+        if(magic != self.MAGIC or version != self.VERSION):
+            raise ValueError("{} is not a played history file".format(self.filename))
+
+        run = None
+        offset = self.HEADER.size
+        while(offset + self.BLOCK.size <= size):
+            self.file.seek(offset)
+            id_format, count, first, last, block_size = self.BLOCK.unpack(self.file.read(self.BLOCK.size))
+            if(offset + self.BLOCK.size + block_size > size): # Cut by a crash
+                break
+
+            first = CodeMatcher.join_key(id_format, first)
+            last = CodeMatcher.join_key(id_format, last)
+            if(run is None or first <= run.lasts[-1]): # Not following the previous block: new run
+                run = _Run()
+                self.runs.append(run)
+            run.add(first, last, offset + self.BLOCK.size, block_size, count)
+            self.count += count
+            offset += self.BLOCK.size + block_size
+
+        return offset
+
+    def _write_run(self, keys):
+        """Write sorted keys at the current position of the file, as blocks.
+        Return the _Run indexing them.
+        """
+        run = _Run()
+        start = 0
+        while(start < len(keys)):
+            id_format = CodeMatcher.split_key(keys[start])[0]
+            end = min(start + self.BLOCK_SIZE, len(keys))
+            while(CodeMatcher.split_key(keys[end - 1])[0] != id_format): # A block has a single format
+                end -= 1
+
+            values = [ CodeMatcher.split_key(key)[1] for key in keys[start:end] ]
+            block = _encode_values(values)
+            self.file.write(self.BLOCK.pack(id_format, len(values), values[0], values[-1], len(block)))
+            run.add(keys[start], keys[end - 1], self.file.tell(), len(block), len(values))
+            self.file.write(block)
+            start = end
+        return run
+
+    def _block_values(self, run, index):
+        """Return the values of a block of a run, decompressing it if it isn't cached.
+        """
+        offset, size, count = run.blocks[index]
+        values = self.cache.get(offset, None)
+        if(values is not None):
+            self.cache.move_to_end(offset)
+            return values
+
+        self.file.seek(offset)
+        values = _decode_values(count, self.file.read(size))
+        self.cache[offset] = values
+        if(len(self.cache) > self.CACHE_SIZE):
+            self.cache.popitem(last=False)
+        return values
+
+    def _merge(self):
+        """Rewrite the file with all its codes and the pending ones in a single run.
+        """
+        keys = set(self.pending)
+        for run in self.runs:
+            for index in range(len(run.blocks)):
+                id_format = CodeMatcher.split_key(run.firsts[index])[0]
+                keys.update(CodeMatcher.join_key(id_format, value) for value in self._block_values(run, index))
+
+        temporary = self.filename + ".tmp"
+        with open(temporary, "wb") as outfile:
+            outfile.write(self.HEADER.pack(self.MAGIC, self.VERSION))
+            self.file, previous = outfile, self.file
+            try:
+                run = self._write_run(sorted(keys))
+            finally:
+                self.file = previous
+
+        self.file.close()
+        os.replace(temporary, self.filename)
+        self.file = open(self.filename, "a+b")
+
+        self.runs = [run]
+        self.count = len(keys)
+        self.end = os.fstat(self.file.fileno()).st_size
+        self.cache.clear()
+        self.pending = set()
@@ -0,0 +1,77 @@
+import bisect
+
+
+class PrefixIndex(object):
+    """Sorted index of levels by a text key, to find the levels whose key starts with a prefix.
+
+    The keys are kept in a sorted list, so finding the levels matching a prefix
+    costs two bisections plus the number of matches, whatever the number of levels.
+    """
+
+    def __init__(self, normalize=None):
+        """Create the index.
+
+        normalize is applied to the keys and the searched prefixes.
+        """
+        super().__init__()
+        self.normalize = normalize or (lambda text: text)
+        self.keys = [] # Sorted (normalized key, level seq) tuples
+        self.levels = [] # Level for each key, in the same order
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, key, level):
+        """Index a level under key.
+        """
+        entry = (self.normalize(key), level.seq)
+        index = bisect.bisect(self.keys, entry)
+        self.keys.insert(index, entry)
+        self.levels.insert(index, level)
+
+    def add_many(self, entries):
+        """Index (key, level) entries at once.
+
+        The entries are sorted then merged with the index, O(n + k log k) for k entries
+        instead of an O(n) insertion for each of them.
+        """
+        pairs = sorted((((self.normalize(key), level.seq), level) for key, level in entries),
+                       key=lambda pair: pair[0])
+        if(not pairs):
+            return
+
+        # Two sorted runs: the sort merges them in linear time
+        pairs = list(zip(self.keys, self.levels)) + pairs
+        pairs.sort(key=lambda pair: pair[0])
+        self.keys = [ key for key, level in pairs ]
+        self.levels = [ level for key, level in pairs ]
+
+    def remove(self, key, level):
+        """Remove a level indexed under key. Does nothing if it isn't in.
+        """
+        entry = (self.normalize(key), level.seq)
+        index = bisect.bisect_left(self.keys, entry)
+        if(index < len(self.keys) and self.keys[index] == entry):
+            del self.keys[index]
+            del self.levels[index]
+
+    def clear(self):
+        """Remove everything from the index.
+        """
+        self.keys = []
+        self.levels = []
+
+    def rebuild(self, entries):
+        """Replace the index contents with the (key, level) entries, in O(n log n).
+        """
+        pairs = sorted(((self.normalize(key), level.seq), level) for key, level in entries)
+        self.keys = [ key for key, level in pairs ]
+        self.levels = [ level for key, level in pairs ]
+
+    def search(self, prefix):
+        """Return the list of levels whose key starts with prefix.
+        """
+        prefix = self.normalize(prefix)
+        start = bisect.bisect_left(self.keys, (prefix,))
+        end = bisect.bisect_left(self.keys, (prefix + "\U0010FFFF",))
+        return self.levels[start:end]
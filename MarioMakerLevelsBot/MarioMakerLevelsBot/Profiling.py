@@ -0,0 +1,146 @@
+import os
+import sys
+import time
+import cProfile
+import threading
+import tracemalloc
+
+
+class ThreadSampler(object):
+    """Low-overhead sampling profiler for the threads other than the GUI one
+    (chat reader, callbacks, loading...).
+
+    Every interval seconds, a thread looks at the current stack of the other threads
+    and counts it. Nothing is hooked into the sampled threads, so they run
+    at full speed: the cost is one wake-up per interval, whatever they do.
+    The counts are written in the folded stacks format, one "thread;caller;...;callee count"
+    line per stack, read by flame graph tools.
+    """
+
+    def __init__(self, interval=0.005, ignored=()):
+        """ignored is the idents of the threads not to sample (like the GUI thread).
+        """
+        super().__init__()
+        self.interval = interval
+        self.ignored = set(ignored)
+        self.counts = {} # Key: folded stack, value: samples
+        self.samples = 0
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        """Start sampling, in a new thread.
+        """
+        self.running = True
+        self.thread = threading.Thread(target=self._main, name="ThreadSampler")
+        self.thread.setDaemon(True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop sampling.
+        """
+        self.running = False
+        if(self.thread is not None):
+            self.thread.join()
+            self.thread = None
+
+    def write(self, filename):
+        """Write the sampled stacks to filename, most sampled first.
+        """
+        with open(filename, "w", encoding="utf-8") as outfile:
+            for stack, count in sorted(self.counts.items(), key=lambda x: -x[1]):
+                outfile.write("{} {}\n".format(stack, count))
+
+    def _main(self):
+        """Main loop of the sampling thread.
+        """
+        ignored = self.ignored | { threading.get_ident() }
+        while(self.running):
+            names = { thread.ident: thread.name for thread in threading.enumerate() }
+            for ident, frame in sys._current_frames().items():
+                if(ident in ignored):
+                    continue
+                stack = []
+                while(frame is not None):
+                    code = frame.f_code
+                    stack.append("{}:{}".format(os.path.basename(code.co_filename), code.co_name))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                folded = ";".join(reversed(stack))
+                self.counts[folded] = self.counts.get(folded, 0) + 1
+            self.samples += 1
+            time.sleep(self.interval)
+
+
+class Profiler(object):
+    """Profiles the bot while it runs, for offline inspection:
+    - the GUI thread with cProfile (where the time goes in the slots, the models, the painting)
+    - the other threads with a ThreadSampler (the chat reader and callbacks)
+    - the memory with tracemalloc, if asked to (what allocated the memory still used).
+      It slows every allocation down a lot, so the times are off meanwhile.
+
+    Nothing is installed until start() is called, so there is no overhead when not profiling.
+    stop() writes the results to timestamped files in the directory.
+    The ingestion process, when used, is a separate process and isn't profiled.
+    """
+
+    TRACEMALLOC_FRAMES = 10 # Stack depth of the allocations recorded
+
+    def __init__(self, directory="user/profiles"):
+        super().__init__()
+        self.directory = directory
+        self.profile = None
+        self.sampler = None
+        self.started = None # Timestamp of the current profiling, used in the file names
+        self.memory = False # Tracing the memory allocations
+
+    @property
+    def active(self):
+        return self.profile is not None
+
+    def start(self, memory=False):
+        """Start profiling, and tracing the memory allocations if memory is True.
+        Must be called from the GUI thread, the one cProfile profiles.
+        """
+        if(self.active):
+            return
+
+        self.started = time.strftime("%Y%m%d-%H%M%S")
+        self.profile = cProfile.Profile()
+        self.sampler = ThreadSampler(ignored=(threading.get_ident(),))
+        self.memory = memory and not tracemalloc.is_tracing()
+        if(self.memory):
+            tracemalloc.start(self.TRACEMALLOC_FRAMES)
+
+        self.sampler.start()
+        self.profile.enable()
+
+    def stop(self):
+        """Stop profiling and write the results. Return the list of files written.
+        """
+        if(not self.active):
+            return []
+
+        self.profile.disable()
+        self.sampler.stop()
+
+        if(not os.path.isdir(self.directory)):
+            os.makedirs(self.directory)
+        prefix = os.path.join(self.directory, "profile-" + self.started)
+
+        files = [ prefix + "-gui.pstats", prefix + "-threads.folded" ]
+        self.profile.dump_stats(files[0]) # Read with pstats or snakeviz
+        self.sampler.write(files[1])
+
+        if(self.memory):
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            files += [ prefix + "-memory.tracemalloc", prefix + "-memory.txt" ]
+            snapshot.dump(files[2]) # Read with tracemalloc.Snapshot.load
+            with open(files[3], "w", encoding="utf-8") as outfile:
+                for stat in snapshot.statistics("lineno")[:50]:
+                    outfile.write("{}\n".format(stat))
+
+        self.profile = None
+        self.sampler = None
+        return files
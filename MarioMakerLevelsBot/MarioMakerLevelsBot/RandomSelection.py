@@ -0,0 +1,188 @@
+import random
+import datetime
+
+
+class FenwickTree(object):
+    """Fenwick (binary indexed) tree of weights.
+
+    Updating a weight, computing a prefix sum and finding the slot
+    corresponding to a cumulated weight are all O(log n).
+    Slots are numbered from 0, the capacity grows as needed.
+    """
+
+    def __init__(self, capacity=16):
+        super().__init__()
+        self.weights = [0] * capacity
+        self.tree = [0] * (capacity + 1) # tree[0] is unused
+        self.total = 0
+
+    def __len__(self):
+        return len(self.weights)
+
+    def set(self, slot, weight):
+        """Set the weight of a slot.
+        """
+        if(slot >= len(self.weights)):
+            self._grow(slot + 1)
+
+        delta = weight - self.weights[slot]
+        if(delta == 0):
+            return
+        self.weights[slot] = weight
+        self.total += delta
+
+        i = slot + 1
+        while(i < len(self.tree)):
+            self.tree[i] += delta
+            i += i & (-i)
+
+    def get(self, slot):
+        """Return the weight of a slot.
+        """
+        return self.weights[slot] if slot < len(self.weights) else 0
+
+    def prefix_sum(self, slot):
+        """Return the sum of the weights of the slots before slot (excluded).
+        """
+        total = 0
+        i = min(slot, len(self.weights))
+        while(i > 0):
+            total += self.tree[i]
+            i -= i & (-i)
+        return total
+
+    def find(self, target):
+        """Return the first slot whose cumulated weight (itself included) is above target.
+        """
+        slot = 0
+        step = 1 << (len(self.weights).bit_length())
+        while(step > 0):
+            i = slot + step
+            if(i < len(self.tree) and self.tree[i] <= target):
+                slot = i
+                target -= self.tree[i]
+            step >>= 1
+        return min(slot, len(self.weights) - 1)
+
+    def rebuild(self, weights):
+        """Replace all the weights at once, in O(n).
+        """
+        self.weights = list(weights) or [0]
+        self.tree = [0] + self.weights
+        for i in range(1, len(self.tree)):
+            parent = i + (i & (-i))
+            if(parent < len(self.tree)):
+                self.tree[parent] += self.tree[i]
+        self.total = sum(self.weights)
+
+    def _grow(self, capacity):
+        """Make room for at least capacity slots.
+        """
+        new_capacity = len(self.weights)
+        while(new_capacity < capacity):
+            new_capacity *= 2
+        self.rebuild(self.weights + [0] * (new_capacity - len(self.weights)))
+
+
+class WeightedSampler(object):
+    """Draws random levels among a set of levels, according to their weights.
+
+    Each level gets a slot in a FenwickTree holding its weight,
+    so adding, removing, reweighting and drawing a level are O(log n).
+    """
+
+    def __init__(self, weight=None):
+        """Create the sampler.
+
+        weight is a function computing the weight of a level:
+        weight(level, epoch), epoch being a date the weight may be relative to.
+        By default, all levels have the same weight.
+        """
+        super().__init__()
+        self.weight = weight or (lambda level, epoch: 1)
+        self.tree = FenwickTree()
+        self.slots = {} # Key: Level, value: slot
+        self.levels = [] # Level in each slot, None for free slots
+        self.free_slots = []
+        self.epoch = datetime.datetime.now()
+
+    def __len__(self):
+        return len(self.slots)
+
+    def add(self, level):
+        """Add a level that may be drawn.
+        """
+        if(level in self.slots):
+            return self.update(level)
+
+        if(self.free_slots):
+            slot = self.free_slots.pop()
+            self.levels[slot] = level
+        else:
+            slot = len(self.levels)
+            self.levels.append(level)
+        self.slots[level] = slot
+        self._set_weight(slot, level)
+
+    def remove(self, level):
+        """Remove a level from the ones that may be drawn.
+        """
+        slot = self.slots.pop(level, None)
+        if(slot is not None):
+            self.tree.set(slot, 0)
+            self.levels[slot] = None
+            self.free_slots.append(slot)
+
+    def update(self, level):
+        """Update the weight of a level, after its times requested changed for instance.
+        """
+        slot = self.slots.get(level, None)
+        if(slot is not None):
+            self._set_weight(slot, level)
+
+    def clear(self):
+        """Remove all levels.
+        """
+        self.rebuild([])
+
+    def rebuild(self, levels):
+        """Replace all the levels at once, in O(n).
+
+        The epoch given to the weight function is reset to now.
+        """
+        self.epoch = datetime.datetime.now()
+        self.levels = list(levels)
+        self.slots = { level: slot for slot, level in enumerate(self.levels) }
+        self.free_slots = []
+        self.tree.rebuild(self.weight(level, self.epoch) for level in self.levels)
+
+    def set_weight(self, weight):
+        """Change the weight function, recomputing all the weights.
+        """
+        self.weight = weight
+        self.rebuild(level for level in self.levels if level is not None)
+
+    def draw(self):
+        """Return a random level according to the weights, or None if there is none.
+        """
+        for attempt in range(2):
+            if(not self.slots or self.tree.total <= 0):
+                return None
+
+            slot = self.tree.find(random.random() * self.tree.total)
+            level = self.levels[slot] if slot < len(self.levels) else None
+            if(level is not None and self.tree.get(slot) > 0):
+                return level
+
+            # Float rounding made a free slot drawable, start from clean sums
+            self.rebuild(level for level in self.levels if level is not None)
+
+        return None
+
+    def _set_weight(self, slot, level):
+        """Compute and store the weight of the level in its slot.
+        """
+        try:
+            self.tree.set(slot, self.weight(level, self.epoch))
+        except OverflowError: # Weights relative to the epoch grew too much, moving the epoch
+            self.rebuild(level for level in self.levels if level is not None)
@@ -0,0 +1,372 @@
+import os
+import mmap
+import struct
+import threading
+
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+    import msvcrt
+
+import CodeMatcher
+
+
+def default_filename():
+    """Return the store used when none is set: in a folder of the user's data
+    (%APPDATA% on Windows), the same for all the instances whatever folder they run from.
+    The folder is created if needed.
+    """
+    base = os.environ.get("APPDATA") or os.environ.get("XDG_DATA_HOME") or \
+        os.path.join(os.path.expanduser("~"), ".local", "share")
+    directory = os.path.join(base, "MarioMakerLevelsBot")
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, "shared_fakes.bin")
+
+
+class _FileLock(object):
+    """Exclusive lock on a file, shared by all the processes of the host,
+    and on a lock for the threads of this process (the file lock is held by the process).
+    """
+
+    def __init__(self, fileobj, thread_lock):
+        super().__init__()
+        self.fileobj = fileobj
+        self.thread_lock = thread_lock
+
+    def __enter__(self):
+        self.thread_lock.acquire()
+        if(fcntl is not None):
+            fcntl.flock(self.fileobj.fileno(), fcntl.LOCK_EX)
+        else:
+            self.fileobj.seek(0)
+            msvcrt.locking(self.fileobj.fileno(), msvcrt.LK_LOCK, 1)
+        return self
+
+    def __exit__(self, *args):
+        if(fcntl is not None):
+            fcntl.flock(self.fileobj.fileno(), fcntl.LOCK_UN)
+        else:
+            self.fileobj.seek(0)
+            msvcrt.locking(self.fileobj.fileno(), msvcrt.LK_UNLCK, 1)
+        self.thread_lock.release()
+
+
+class SharedFakeStore(object):
+    """Fake codes shared by all the bot instances of the host, in memory mapped files.
+
+    The codes are in an open addressing hash table, in the file filename.<generation>.
+    filename only holds a header: the generation and capacity of the table, its counts
+    and a sequence number. Writers take a lock on the header file, readers don't:
+    they check the sequence number that writers make odd while writing,
+    and read again if it changed (seqlock). A reader still finding the number odd after
+    READ_RETRIES tries reads under the lock instead: if the writer died while writing,
+    the next one holding the lock repairs the table. Every instance maps the same files,
+    so the codes are in the page cache once, and a code marked fake by an instance
+    is seen by the others at their next lookup.
+
+    No file is ever resized (Windows can't resize a file mapped by other processes):
+    growing the table writes the next generation in a new file, and the instances
+    map it as they see the generation change. The older files are removed once
+    no instance maps them anymore.
+
+    Can be given to Level.set_fake_model, like a LevelListModel.
+    """
+
+    MAGIC = b"MMLBFAK3"
+    # magic, sequence number, capacity, count, used slots (deleted included), generation of the table
+    HEADER = struct.Struct("<8sQQQQQ")
+    SLOT = struct.Struct("<QQ") # state, code value
+    EMPTY = 0
+    DELETED = 1
+    USED = 2 # Used slots have USED + the format of their code as state
+
+    MAX_LOAD = 0.6 # Part of the slots used (deleted included) before growing the table
+    READ_RETRIES = 1000 # Reads without the lock before waiting for it
+
+    def __init__(self, filename, capacity=1 << 16, fallback=None):
+        """Open the store, creating the files if needed.
+
+        fallback is a model also checked by check_code_in_model,
+        for the codes not in the store yet.
+        """
+        super().__init__()
+        self.filename = filename
+        self.fallback = fallback
+        self.file = open(filename, "a+b")
+        self.thread_lock = threading.Lock() # Writers of this process, see _FileLock
+        self.map_lock = threading.Lock() # Changing the table mapped, readers included
+        self.header = None
+        self.table = None
+        self.generation = None
+
+        with self._lock():
+            self.file.seek(0)
+            if(self.file.read(len(self.MAGIC)) != self.MAGIC): # New file, or written by an older version
+                self._format(capacity)
+            self.header = mmap.mmap(self.file.fileno(), self.HEADER.size)
+            self._map_table()
+            self._remove_old_tables()
+
+    def close(self):
+        """Close the store.
+        """
+        self.table.close()
+        self.header.close()
+        self.file.close()
+
+    def __len__(self):
+        return self._header()[3]
+
+    def __contains__(self, code):
+        return self.contains(code)
+
+    ###########################################################################
+    # Readers: no lock
+    ###########################################################################
+
+    def sequence(self):
+        """Return a number that changes each time a code is added or removed, by any process.
+        """
+        return self._header()[1]
+
+    def contains(self, code):
+        """Return True if the code (as an integer key, see CodeMatcher.encode_code) is in the store.
+        """
+        for attempt in range(self.READ_RETRIES):
+            magic, sequence, capacity, count, used, generation = self._header()
+            if(sequence & 1): # A writer is busy
+                continue
+            try:
+                if(generation != self.generation): # Another process grew the table
+                    self._map_table()
+                    continue
+                found = self._find(code, self.table)[1]
+            except ValueError: # Another thread mapped the new table and closed the old one
+                continue
+
+            if(self._header()[1] == sequence): # Nothing changed while reading
+                return found
+
+        # A writer that died while writing, or many writes in a row
+        with self._lock():
+            self._sync()
+            return self._find(code, self.table)[1]
+
+    def check_code_in_model(self, code):
+        """Return true if the code (as a string) is in the store, or in the fallback model.
+        """
+        try:
+            if(self.contains(CodeMatcher.encode_code(code))):
+                return True
+        except ValueError: # Not a code the store can hold
+            pass
+
+        return self.fallback is not None and self.fallback.check_code_in_model(code)
+
+    ###########################################################################
+    # Writers: lock on the file
+    ###########################################################################
+
+    def add(self, code):
+        """Add a code (as an integer key) to the store.
+        """
+        self.add_many((code,))
+
+    def add_many(self, codes):
+        """Add codes (as integer keys) to the store, taking the lock once
+        and making room for all of them at once.
+        """
+        codes = list(codes)
+        with self._lock():
+            self._sync()
+            self._reserve(len(codes))
+            for code in codes:
+                index, found = self._find(code, self.table)
+                if(not found):
+                    id_format, value = CodeMatcher.split_key(code)
+                    self._write(lambda: self._set_slot(index, self.USED + id_format, value, 1))
+
+    def remove(self, code):
+        """Remove a code (as an integer key) from the store. Does nothing if it isn't in.
+        """
+        self.remove_many((code,))
+
+    def remove_many(self, codes):
+        """Remove codes (as integer keys) from the store, taking the lock once.
+        """
+        with self._lock():
+            self._sync()
+            for code in codes:
+                index, found = self._find(code, self.table)
+                if(found):
+                    self._write(lambda: self._set_slot(index, self.DELETED, 0, -1))
+
+    ###########################################################################
+    # Private methods
+    ###########################################################################
+
+    def _lock(self):
+        return _FileLock(self.file, self.thread_lock)
+
+    def _header(self):
+        return self.HEADER.unpack_from(self.header, 0)
+
+    def _table_name(self, generation):
+        return "{}.{}".format(self.filename, generation)
+
+    def _format(self, capacity):
+        """Write an empty store: the header, and the first generation of the table.
+        The lock must be held.
+        """
+        self.file.truncate(0)
+        self.file.write(self.HEADER.pack(self.MAGIC, 0, capacity, 0, 0, 1))
+        self.file.flush()
+        self._create_table(1, capacity).close()
+
+    def _create_table(self, generation, capacity):
+        """Create the file of an empty table, and return its mapping. The lock must be held.
+        No instance maps it yet: nothing else can have the file of a later generation open.
+        """
+        with open(self._table_name(generation), "w+b") as table_file:
+            table_file.truncate(capacity * self.SLOT.size)
+            return mmap.mmap(table_file.fileno(), capacity * self.SLOT.size)
+
+    def _map_table(self):
+        """Map the current generation of the table, and close the previous mapping:
+        the other threads reading it get a ValueError, and read again.
+        """
+        self.map_lock.acquire()
+        try:
+            while(True):
+                generation = self._header()[5]
+                if(generation == self.generation):
+                    return
+                try:
+                    with open(self._table_name(generation), "r+b") as table_file:
+                        table = mmap.mmap(table_file.fileno(), 0)
+                    break
+                except FileNotFoundError: # Replaced by a later generation meanwhile
+                    if(self._header()[5] == generation):
+                        raise
+
+            old_table, self.table, self.generation = self.table, table, generation
+            if(old_table is not None):
+                old_table.close()
+        finally:
+            self.map_lock.release()
+
+    def _remove_old_tables(self):
+        """Remove the files of the previous generations of the table. The lock must be held.
+        On Windows the files still mapped by an instance stay, until the next time.
+        """
+        directory = os.path.dirname(os.path.abspath(self.filename))
+        prefix = os.path.basename(self.filename) + "."
+        for name in os.listdir(directory):
+            suffix = name[len(prefix):]
+            if(name.startswith(prefix) and suffix.isdigit() and int(suffix) < self.generation):
+                try:
+                    os.remove(os.path.join(directory, name))
+                except OSError:
+                    pass
+
+    def _sync(self):
+        """Make sure the table mapped is the current one, and is consistent. The lock must be held.
+        """
+        if(self._header()[5] != self.generation):
+            self._map_table()
+        self._recover()
+
+    def _recover(self):
+        """Repair the table if a writer died while writing: with the lock held, an odd sequence
+        number can't be a writer still busy. The counts are computed again from the slots,
+        and the sequence number made even.
+        """
+        sequence = self._header()[1]
+        if(not sequence & 1):
+            return
+
+        count = used = 0
+        for index in range(len(self.table) // self.SLOT.size):
+            state = self.SLOT.unpack_from(self.table, index * self.SLOT.size)[0]
+            if(state != self.EMPTY):
+                used += 1
+            if(state >= self.USED):
+                count += 1
+        struct.pack_into("<QQ", self.header, 24, count, used)
+        struct.pack_into("<Q", self.header, 8, sequence + 1)
+
+    def _find(self, code, table):
+        """Return (slot index, True) if the code (integer key) is in the table mapped,
+        (first free slot index, False) otherwise.
+        """
+        id_format, value = CodeMatcher.split_key(code)
+        used = self.USED + id_format
+        capacity = len(table) // self.SLOT.size # A power of two
+        mask = capacity - 1
+        # First slot to probe (Fibonacci hashing)
+        index = ((value * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF) >> (65 - capacity.bit_length())
+        free = None
+        for probe in range(capacity):
+            state, slot_value = self.SLOT.unpack_from(table, index * self.SLOT.size)
+            if(state == self.EMPTY):
+                return (index if free is None else free), False
+            if(state == used and slot_value == value):
+                return index, True
+            if(state == self.DELETED and free is None):
+                free = index
+            index = (index + 1) & mask
+        return free, False
+
+    def _write(self, change):
+        """Apply a change to the store, making the sequence number odd meanwhile
+        so readers know they have to read again. The lock must be held.
+        """
+        sequence = self._header()[1]
+        struct.pack_into("<Q", self.header, 8, sequence + 1)
+        try:
+            change()
+        finally:
+            struct.pack_into("<Q", self.header, 8, sequence + 2)
+
+    def _set_slot(self, index, state, code, count_change):
+        """Write a slot and update the counts of codes and used slots.
+        """
+        offset = index * self.SLOT.size
+        if(self.SLOT.unpack_from(self.table, offset)[0] == self.EMPTY):
+            used_change = 1 # A deleted slot reused was already counted
+        else:
+            used_change = 0
+        self.SLOT.pack_into(self.table, offset, state, code)
+        magic, sequence, capacity, count, used, generation = self._header()
+        struct.pack_into("<QQ", self.header, 24, count + count_change, used + used_change)
+
+    def _reserve(self, extra):
+        """Grow the table if adding extra codes would make it too full. The lock must be held.
+        O(1) unless the table is rebuilt.
+        """
+        magic, sequence, capacity, count, used, generation = self._header()
+        if(used + extra <= capacity * self.MAX_LOAD):
+            return
+
+        codes = []
+        for index in range(capacity):
+            state, value = self.SLOT.unpack_from(self.table, index * self.SLOT.size)
+            if(state >= self.USED):
+                codes.append((state, value, CodeMatcher.join_key(state - self.USED, value)))
+
+        # Rehashing in a bigger table (deleted slots are dropped)
+        new_capacity = capacity
+        while(len(codes) + extra > new_capacity * self.MAX_LOAD / 2):
+            new_capacity *= 2
+
+        # Filled before the readers know about it: they keep reading the current table meanwhile
+        table = self._create_table(generation + 1, new_capacity)
+        for state, value, code in codes:
+            self.SLOT.pack_into(table, self._find(code, table)[0] * self.SLOT.size, state, value)
+        table.close()
+
+        self._write(lambda: struct.pack_into("<QQQQ", self.header, 16,
+                                             new_capacity, len(codes), len(codes), generation + 1))
+        self._map_table()
+        self._remove_old_tables()
@@ -0,0 +1,357 @@
+import os
+import sys
+import json
+import time
+import random
+import platform
+import tempfile
+
+# Headless benchmark: no window is shown, no network is used
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from PySide import QtCore, QtGui
+
+import TwitchTags
+import ChatListener
+import CodeMatcher
+import LevelListModel
+import ChannelLevelModel
+
+
+WORDS = ("hello", "lol", "Kappa", "gg", "that jump", "nice", "PogChamp", "level", "when", "play mine")
+
+def random_code():
+    """Return a random Mario Maker-like code.
+    """
+    return ("{:04X}-" * 3 + "{:04X}").format(*[random.randint(0, 0xFFFF) for i in range(4)])
+
+def random_tags(user):
+    """Return the tags string of a chat message of user, as sent by Twitch.
+    """
+    return ("@badges=subscriber/12;color=#1E90FF;display-name=User{user};emotes=;id={id};mod=0;"
+            "room-id=1234;subscriber={sub};tmi-sent-ts=1500000000000;turbo=0;user-id={user};user-type=".format(
+                user=user, sub=user % 2, id="{:032x}".format(random.getrandbits(128))))
+
+def random_message():
+    """Return a chat message, one out of five with a code.
+    """
+    text = " ".join(random.choice(WORDS) for j in range(random.randint(1, 8)))
+    if(random.random() < 0.2):
+        text = text + " " + random_code()
+    return text
+
+def random_line(user):
+    """Return a PRIVMSG line as sent by Twitch, without the line ending.
+    """
+    return "{tags} :user{user}!user{user}@user{user}.tmi.twitch.tv PRIVMSG #benchmark :{message}".format(
+        tags=random_tags(user), user=user, message=random_message())
+
+def rate(count, elapsed):
+    return count / elapsed if elapsed > 0 else float("inf")
+
+
+class _ReplaySocket(object):
+    """Socket giving back chunks of data, then failing, to run ChatListener._main without a server.
+    """
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+
+    def recv(self, size):
+        try:
+            return next(self.chunks)
+        except StopIteration:
+            raise OSError("End of the benchmark")
+
+    def close(self):
+        pass
+
+
+class _ReplayListener(ChatListener.ChatListener):
+    """ChatListener reading the chunks of a _ReplaySocket instead of connecting to Twitch.
+    """
+
+    def __init__(self, chunks):
+        super().__init__("bot", "oauth:none", ["benchmark"])
+        self.socket = _ReplaySocket(chunks)
+        self.connected = False
+
+    def _connect(self):
+        # Connected once: the replay socket failing at the end stops the listener
+        connected, self.connected = self.connected, True
+        return not connected
+
+
+###########################################################################
+# Chat ingestion
+###########################################################################
+
+def bench_get_tags(count):
+    """TwitchTags.get_tags on the tags of chat messages.
+    """
+    strings = [ random_tags(random.randint(0, 5000))[1:] for i in range(count) ]
+    start = time.perf_counter()
+    for string in strings:
+        TwitchTags.get_tags(string, "benchmark")
+    return { 'ops': count, 'ops_per_s': rate(count, time.perf_counter() - start) }
+
+def bench_irc_framing(count):
+    """ChatListener._main splitting the data read into lines and parsing the PRIVMSG ones,
+    the data arriving in 1024 bytes chunks like from the socket.
+    """
+    data = "".join(random_line(random.randint(0, 5000)) + "\r\n" for i in range(count)).encode()
+    chunks = [ data[i:i + 1024] for i in range(0, len(data), 1024) ]
+    listener = _ReplayListener(chunks)
+
+    stdout, sys.stdout = sys.stdout, open(os.devnull, "w") # The listener logs everything it reads
+    try:
+        start = time.perf_counter()
+        listener._main()
+        elapsed = time.perf_counter() - start
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+    return { 'ops': count, 'ops_per_s': rate(count, elapsed), 'mbytes_per_s': len(data) / 1e6 / elapsed }
+
+def bench_parse_message(count):
+    """Scanning chat messages for codes, as LevelsBotWindow.parse_message does.
+    """
+    matcher = CodeMatcher.MessageMatcher()
+    messages = [ random_message() for i in range(count) ]
+    start = time.perf_counter()
+    found = sum(1 for message in messages if matcher.match(message, "benchmark") is not None)
+    return { 'ops': count, 'ops_per_s': rate(count, time.perf_counter() - start), 'found': found }
+
+def bench_copypasta(count, pastes=5):
+    """A raid: nine messages out of ten are copies of a few pasted messages with a code,
+    matched and added to a levels list like LevelsBotWindow.parse_message does,
+    without the cache of the matcher, then with it for each RepeatCounting.
+    """
+    pasted = [ "RAID {} PogChamp play our level {} PogChamp".format(i, random_code()) for i in range(pastes) ]
+    messages = [ (random.choice(pasted) if random.random() < 0.9 else random_message(),
+                  "user{}".format(random.randint(0, count // 10))) for i in range(count) ]
+
+    results = {}
+    for name, repeats, cache_size in (("no_cache", CodeMatcher.RepeatCounting.Every, 0),
+                                      ("every", CodeMatcher.RepeatCounting.Every, CodeMatcher.MessageMatcher.CACHE_SIZE),
+                                      ("per_user", CodeMatcher.RepeatCounting.PerUser, CodeMatcher.MessageMatcher.CACHE_SIZE),
+                                      ("once", CodeMatcher.RepeatCounting.Once, CodeMatcher.MessageMatcher.CACHE_SIZE)):
+        matcher = CodeMatcher.MessageMatcher(repeats=repeats, cache_size=cache_size)
+        model = LevelListModel.LevelListModel()
+        start = time.perf_counter()
+        for message, user in messages:
+            match = matcher.match(message, "benchmark", user)
+            if(match is not None):
+                model.add_level(match[0], user)
+        results[name] = { 'ops': count, 'ops_per_s': rate(count, time.perf_counter() - start),
+                          'hit_rate': matcher.cache_stats()['hit_rate'] }
+    return results
+
+
+###########################################################################
+# Levels list model
+###########################################################################
+
+def make_submissions(count):
+    """Return count (code, name, tags) submissions of different codes.
+    """
+    submissions = []
+    for i in range(count):
+        user = random.randint(0, count)
+        tags = { 'subscriber': user % 3 == 0,
+                 'user-type': TwitchTags.user_type.mod if user % 50 == 0 else TwitchTags.user_type.empty,
+                 'display-name': "User{}".format(user) }
+        submissions.append((random_code(), "user{}".format(user), tags))
+    return submissions
+
+def bench_add_level_new(model, submissions):
+    """add_level of codes not in the model yet, filling it.
+    """
+    start = time.perf_counter()
+    for code, name, tags in submissions:
+        model.add_level(code, name, tags)
+    return { 'ops': len(submissions), 'ops_per_s': rate(len(submissions), time.perf_counter() - start) }
+
+def bench_add_level_repeat(model, submissions, count):
+    """add_level of codes already in the model.
+    """
+    repeats = [ random.choice(submissions) for i in range(count) ]
+    start = time.perf_counter()
+    for code, name, tags in repeats:
+        model.add_level(code, name, tags)
+    return { 'ops': count, 'ops_per_s': rate(count, time.perf_counter() - start) }
+
+def bench_reset_view(model, repeat):
+    """Rebuilding the whole view, as when a filter changes.
+    """
+    start = time.perf_counter()
+    for i in range(repeat):
+        model._reset_view()
+    return { 'ms': (time.perf_counter() - start) / repeat * 1000 }
+
+def bench_sort(model):
+    """Sorting the view by each column, then back by date.
+    """
+    result = {}
+    for name, column, order in (("code", LevelListModel.Columns.Code, QtCore.Qt.AscendingOrder),
+                                ("user", LevelListModel.Columns.User, QtCore.Qt.AscendingOrder),
+                                ("privileges", LevelListModel.Columns.Tags, QtCore.Qt.DescendingOrder),
+                                ("times_requested", LevelListModel.Columns.TimesRequested, QtCore.Qt.DescendingOrder),
+                                ("date", LevelListModel.Columns.Date, QtCore.Qt.AscendingOrder)):
+        start = time.perf_counter()
+        model.sort(column, order)
+        result[name + "_ms"] = (time.perf_counter() - start) * 1000
+    return result
+
+def bench_remove_indexes(model, count):
+    """Removing count rows selected all over the view.
+    """
+    rows = random.sample(range(model.rowCount()), min(count, model.rowCount()))
+    indexes = [ model.index(row, 0) for row in rows ]
+    start = time.perf_counter()
+    model.remove_indexes(indexes)
+    elapsed = time.perf_counter() - start
+    return { 'ops': len(rows), 'ms': elapsed * 1000, 'ops_per_s': rate(len(rows), elapsed) }
+
+def bench_save_load(model, directory):
+    """save_model_to_file then load_model_from_file in a new model.
+    """
+    filename = os.path.join(directory, "levels.pickle")
+    start = time.perf_counter()
+    model.save_model_to_file(filename)
+    save = time.perf_counter() - start
+
+    loaded = LevelListModel.LevelListModel()
+    start = time.perf_counter()
+    loaded.load_model_from_file(filename)
+    load = time.perf_counter() - start
+
+    result = { 'save_ms': save * 1000, 'load_ms': load * 1000,
+               'file_bytes': os.path.getsize(filename), 'loaded': loaded.rowCount() }
+    os.remove(filename)
+    os.remove(filename + ".codes")
+    return result
+
+def bench_model(size, directory):
+    """Return the results of the model benchmarks with size levels.
+    """
+    submissions = make_submissions(size)
+    model = LevelListModel.LevelListModel()
+    return { 'add_level_new': bench_add_level_new(model, submissions),
+             'add_level_repeat': bench_add_level_repeat(model, submissions, min(size, 100000)),
+             'reset_view': bench_reset_view(model, 3),
+             'sort': bench_sort(model),
+             'save_load': bench_save_load(model, directory),
+             'remove_indexes': bench_remove_indexes(model, 1000) }
+
+
+def bench_channels(size, channels=4):
+    """ChannelLevelModel with size levels over channels channels: add_level showing all the channels,
+    then reading the rows of the combined view page by page like a scrolling view.
+    """
+    submissions = make_submissions(size)
+    model = ChannelLevelModel.ChannelLevelModel()
+    start = time.perf_counter()
+    for number, (code, name, tags) in enumerate(submissions):
+        model.add_level(code, name, tags, "channel{}".format(number % channels))
+    add = time.perf_counter() - start
+
+    rows = min(model.rowCount(), 10000)
+    start = time.perf_counter()
+    for row in range(rows):
+        model.data(model.index(row, LevelListModel.Columns.Code))
+    read = time.perf_counter() - start
+
+    return { 'add_level': { 'ops': size, 'ops_per_s': rate(size, add) },
+             'read_rows': { 'ops': rows, 'ops_per_s': rate(rows, read) } }
+
+
+###########################################################################
+# Running and comparing
+###########################################################################
+
+def run(sizes, messages):
+    """Run all the benchmarks, return the results as a dict.
+    """
+    results = { 'python': platform.python_version(), 'platform': platform.platform(),
+                'date': time.strftime("%Y-%m-%d %H:%M:%S"), 'benchmarks': {} }
+    benchmarks = results['benchmarks']
+
+    random.seed(0)
+    benchmarks['get_tags'] = bench_get_tags(messages)
+    benchmarks['irc_framing'] = bench_irc_framing(messages)
+    benchmarks['parse_message'] = bench_parse_message(messages)
+    benchmarks['copypasta'] = bench_copypasta(messages)
+
+    directory = tempfile.mkdtemp()
+    for size in sizes:
+        print("Model with {} levels...".format(size), file=sys.stderr)
+        benchmarks['model_{}'.format(size)] = bench_model(size, directory)
+        benchmarks['channels_{}'.format(size)] = bench_channels(size)
+    os.rmdir(directory)
+
+    return results
+
+def flatten(results, prefix=""):
+    """Return the numbers of nested result dicts as a flat dict, keys joined by dots.
+    """
+    flat = {}
+    for key, value in results.items():
+        if(isinstance(value, dict)):
+            flat.update(flatten(value, prefix + key + "."))
+        elif(isinstance(value, (int, float))):
+            flat[prefix + key] = value
+    return flat
+
+COUNTS = ("ops", "found", "loaded") # Sizes of the benchmarks, not measures
+
+def compare(old_file, new_file):
+    """Print the change of every measure between two results files.
+    """
+    with open(old_file, "r") as infile:
+        old = flatten(json.load(infile)['benchmarks'])
+    with open(new_file, "r") as infile:
+        new = flatten(json.load(infile)['benchmarks'])
+
+    for key in sorted(old.keys() & new.keys()):
+        if(old[key] == 0 or key.rpartition(".")[2] in COUNTS):
+            continue
+        # Higher is better for the rates, lower for the times
+        change = new[key] / old[key] - 1
+        better = change > 0 if key.endswith("_per_s") else change < 0
+        print("{:45} {:>14.1f} {:>14.1f} {:>+8.1%}{}".format(
+            key, old[key], new[key], change, "" if abs(change) < 0.1 else (" better" if better else " WORSE")))
+
+
+if(__name__ == "__main__"):
+    # Benchmarks.py [sizes...] [--messages N] [--output results.json]
+    # Benchmarks.py --compare old.json new.json
+    args = sys.argv[1:]
+    if(args[:1] == ["--compare"]):
+        compare(args[1], args[2])
+        sys.exit(0)
+
+    output = None
+    messages = 100000
+    sizes = []
+    while(args):
+        arg = args.pop(0)
+        if(arg == "--output"):
+            output = args.pop(0)
+        elif(arg == "--messages"):
+            messages = int(args.pop(0))
+        else:
+            sizes.append(int(arg))
+    sizes = sizes or [ 1000, 100000, 1000000 ]
+
+    app = QtGui.QApplication(sys.argv[:1])
+    results = run(sizes, messages)
+
+    if(output is not None):
+        with open(output, "w") as outfile:
+            json.dump(results, outfile, indent=2, sort_keys=True)
+    else:
+        json.dump(results, sys.stdout, indent=2, sort_keys=True)
+        print()
@@ -0,0 +1,71 @@
+import os
+import sys
+import time
+import random
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import CodeMatcher
+import PlayedHistory
+
+
+def random_code():
+    """Return a random code, a real-looking Super Mario Maker code or a Super Mario Maker 2 ID.
+    """
+    if(random.random() < 0.5):
+        return "{:04X}-0000-{:04X}-{:04X}".format(
+            random.randint(0, 0xFFFF), random.randint(0, 0xFFFF), random.randint(0, 0xFFFF))
+    return "-".join("".join(random.choice(CodeMatcher.SMM2_ALPHABET) for j in range(3)) for i in range(3))
+
+def benchmark(code_count, sessions, lookup_count):
+    """Return the time to build a history of code_count codes played over sessions sessions,
+    its size on disk and in memory, and the lookups per second of played and unknown codes.
+    """
+    codes = [ random_code() for i in range(code_count) ]
+    filename = os.path.join(tempfile.mkdtemp(), "played_history.bin")
+
+    start = time.perf_counter()
+    per_session = max(code_count // sessions, 1)
+    for session in range(0, code_count, per_session):
+        history = PlayedHistory.PlayedHistory(filename)
+        for code in codes[session:session + per_session]:
+            history.add(code)
+        history.close()
+    build = time.perf_counter() - start
+
+    tracemalloc.start()
+    history = PlayedHistory.PlayedHistory(filename)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    played = random.sample(codes, min(lookup_count, len(codes)))
+    start = time.perf_counter()
+    found = sum(1 for code in played if history.check_code_in_model(code))
+    hits = len(played) / (time.perf_counter() - start)
+
+    unknown = [ random_code() for i in range(lookup_count) ]
+    start = time.perf_counter()
+    for code in unknown:
+        history.check_code_in_model(code)
+    misses = len(unknown) / (time.perf_counter() - start)
+
+    result = { 'codes': len(history), 'runs': len(history.runs), 'build': build,
+               'file': os.path.getsize(filename), 'memory': memory,
+               'hits': hits, 'misses': misses, 'found': found, 'looked_up': len(played) }
+    history.file.close()
+    os.remove(filename)
+    return result
+
+
+if(__name__ == "__main__"):
+    sizes = [ int(x) for x in sys.argv[1:] ] or [ 10000, 100000, 1000000 ]
+
+    random.seed(0)
+    for code_count in sizes:
+        result = benchmark(code_count, sessions=20, lookup_count=20000)
+        print("{codes} codes in {runs} runs: built in {build:.1f}s, "
+              "{file} bytes on disk ({bytes_per_code:.1f} per code), {memory} bytes in memory, "
+              "{hits:.0f} played lookups/s ({found}/{looked_up} found), {misses:.0f} unknown lookups/s".format(
+                  bytes_per_code=result['file'] / max(result['codes'], 1), **result))
@@ -0,0 +1,149 @@
+import os
+import sys
+import time
+import random
+import socket
+import threading
+
+# Headless benchmark: no window is shown
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from PySide import QtCore, QtGui
+
+import ChatListener
+import IngestionProcess
+import LevelListModel
+import CodeMatcher
+
+
+class FakeTwitchServer(object):
+    """Local IRC server imitating Twitch chat: accepts one connection
+    and sends chat messages with random codes at a given rate.
+    """
+
+    def __init__(self, rate, channel="benchmark"):
+        super().__init__()
+        self.rate = rate
+        self.channel = channel
+        self.sent = 0
+        self.server = socket.socket()
+        self.server.bind(("127.0.0.1", 0))
+        self.server.listen(1)
+        self.port = self.server.getsockname()[1]
+        self.thread = threading.Thread(target=self._main)
+        self.thread.setDaemon(True)
+        self.running = True
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        """Stop sending messages. The connection stays open not to make the listener reconnect.
+        """
+        self.running = False
+
+    def _main(self):
+        connection, address = self.server.accept()
+        connection.send(":tmi.twitch.tv 001 bot :Welcome, GLHF!\r\n".encode())
+        time.sleep(0.5) # Let the listener request the tags and join
+        connection.send(":bot.tmi.twitch.tv 353 bot = #{0} :bot\r\n".format(self.channel).encode())
+
+        start = time.perf_counter()
+        while(True):
+            if(not self.running):
+                time.sleep(0.1)
+                continue
+
+            # Sending the messages due since the start, by batches
+            due = int((time.perf_counter() - start) * self.rate)
+            lines = []
+            while(self.sent < due):
+                user = random.randint(0, 5000)
+                code = ("{:04X}-" * 3 + "{:04X}").format(*[random.randint(0, 0xFFFF) for i in range(4)])
+                lines.append("@badges=;color=;display-name=User{user};emotes=;mod=0;subscriber={sub};"
+                             "turbo=0;user-type= :user{user}!user{user}@user{user}.tmi.twitch.tv "
+                             "PRIVMSG #{channel} :please play {code} Kappa\r\n".format(
+                                 user=user, sub=user % 2, channel=self.channel, code=code))
+                self.sent += 1
+            if(lines):
+                try:
+                    connection.sendall("".join(lines).encode())
+                except OSError:
+                    return
+            time.sleep(0.005)
+
+
+def measure_frames(app, duration, interval=16):
+    """Run the event loop for duration seconds with a timer ticking every interval ms.
+    Return the list of delays (ms) between the expected and actual ticks.
+    """
+    delays = []
+    last = [time.perf_counter()]
+
+    def tick():
+        now = time.perf_counter()
+        delays.append(max(0.0, (now - last[0]) * 1000 - interval))
+        last[0] = now
+
+    timer = QtCore.QTimer()
+    timer.timeout.connect(tick)
+    timer.start(interval)
+    QtCore.QTimer.singleShot(int(duration * 1000), app.quit)
+    app.exec_()
+    timer.stop()
+    return delays
+
+def benchmark(app, separate_process, rate, duration):
+    """Return the frame delays statistics while ingesting rate messages per second.
+    """
+    server = FakeTwitchServer(rate)
+    server.start()
+
+    model = LevelListModel.LevelListModel()
+    view = QtGui.QTableView()
+    view.setModel(model)
+    view.resize(1000, 700)
+    view.show()
+
+    def parse_message(channel, name, tags, message):
+        code = CodeMatcher.find_code(message)
+        if(code is not None):
+            model.add_level(code, name, tags)
+
+    if(separate_process):
+        listener = IngestionProcess.IngestionProcess("bot", "oauth:none", [server.channel],
+                                                     host="127.0.0.1", port=server.port)
+    else:
+        listener = ChatListener.ChatListener("bot", "oauth:none", [server.channel],
+                                             host="127.0.0.1", port=server.port)
+    listener.add_callback(parse_message)
+    listener.start()
+
+    delays = sorted(measure_frames(app, duration))
+    server.stop()
+    if(separate_process):
+        listener.stop()
+    else:
+        listener.reset_callbacks()
+
+    return { 'mode': "separate process" if separate_process else "same process",
+             'sent': server.sent,
+             'levels': model.rowCount(),
+             'mean_delay': sum(delays) / max(len(delays), 1),
+             'p99_delay': delays[int(len(delays) * 0.99)] if delays else 0.0,
+             'max_delay': delays[-1] if delays else 0.0 }
+
+
+if(__name__ == "__main__"):
+    rate = int(sys.argv[1]) if len(sys.argv) > 1 else 2000 # messages per second
+    duration = float(sys.argv[2]) if len(sys.argv) > 2 else 10 # seconds per mode
+
+    sys.stdout = open(os.devnull, "w") # The listener logs everything it reads
+    report = sys.__stdout__
+
+    app = QtGui.QApplication(sys.argv)
+    for separate_process in (False, True):
+        result = benchmark(app, separate_process, rate, duration)
+        print("{mode}: {sent} messages, {levels} levels, frame delay mean {mean_delay:.1f} ms, "
+              "p99 {p99_delay:.1f} ms, max {max_delay:.1f} ms".format(**result), file=report)
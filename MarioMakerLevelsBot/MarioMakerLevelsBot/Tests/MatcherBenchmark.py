@@ -0,0 +1,161 @@
+import os
+import re
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import CodeMatcher
+
+
+WORDS = ("hello", "lol", "Kappa", "gg", "that jump", "nice", "PogChamp", "level", "when", "play mine")
+
+def random_code():
+    """Return a random Mario Maker-like code, with a random separator.
+    """
+    separator = random.choice("- _")
+    return separator.join("{:04X}".format(random.randint(0, 0xFFFF)) for i in range(4))
+
+def random_smm2_code():
+    """Return a random Super Mario Maker 2-like ID, with a random separator.
+    """
+    separator = random.choice("- _")
+    return separator.join("".join(random.choice(CodeMatcher.SMM2_ALPHABET) for j in range(3))
+                          for i in range(3))
+
+def make_chat(count, smm2_part):
+    """Return count chat messages, one out of five with a course ID,
+    smm2_part of those being Super Mario Maker 2 IDs.
+    """
+    messages = []
+    for i in range(count):
+        text = " ".join(random.choice(WORDS) for j in range(random.randint(1, 8)))
+        if(random.random() < 0.2):
+            code = random_smm2_code() if random.random() < smm2_part else random_code()
+            text = text + " " + code
+        messages.append(text)
+    return messages
+
+def two_pass_scan(smm1_re, smm2_re, message):
+    """Search each format with its own regexp, as without the single-pass scanner.
+    """
+    s = smm1_re.search(message)
+    if(s is not None):
+        return s
+    return smm2_re.search(message)
+
+def benchmark_formats(message_count, smm2_part):
+    """Return the messages per second of the single-pass scanner and of one scan
+    per format, on chat where smm2_part of the IDs are Super Mario Maker 2 IDs.
+    """
+    messages = make_chat(message_count, smm2_part)
+
+    start = time.perf_counter()
+    found = sum(1 for message in messages if CodeMatcher.scan(message) is not None)
+    single = message_count / (time.perf_counter() - start)
+
+    smm1_re = re.compile(CodeMatcher.code_re.pattern, re.IGNORECASE)
+    smm2_re = re.compile(CodeMatcher.smm2_re.pattern, re.IGNORECASE)
+    start = time.perf_counter()
+    for message in messages:
+        two_pass_scan(smm1_re, smm2_re, message)
+    two_pass = message_count / (time.perf_counter() - start)
+
+    keys = time.perf_counter()
+    for message in messages:
+        code = CodeMatcher.find_code(message)
+        if(code is not None):
+            CodeMatcher.encode_code(code)
+    keys = message_count / (time.perf_counter() - keys)
+
+    return { 'smm2_part': smm2_part * 100, 'single': single, 'two_pass': two_pass,
+             'keys': keys, 'found': found }
+
+def make_rules(count):
+    """Return count rules: the plain code rule, then commands and keywords.
+    """
+    rules = [ CodeMatcher.MatchRule(CodeMatcher.RuleKind.Code) ]
+    for i in range(1, count):
+        if(i % 2):
+            rules.append(CodeMatcher.MatchRule(CodeMatcher.RuleKind.Command, "!add{}".format(i)))
+        else:
+            rules.append(CodeMatcher.MatchRule(CodeMatcher.RuleKind.Keyword, "kw{}".format(i)))
+    return rules[:count]
+
+def make_messages(count, rules):
+    """Return count chat messages, one out of five submitting a code with a random rule.
+    """
+    messages = []
+    for i in range(count):
+        text = " ".join(random.choice(WORDS) for j in range(random.randint(1, 8)))
+        if(random.random() < 0.2):
+            rule = random.choice(rules)
+            if(rule.kind == CodeMatcher.RuleKind.Code):
+                text = text + " " + random_code()
+            else:
+                text = rule.text + " " + random_code() + " " + text
+        messages.append(text)
+    return messages
+
+def rule_pattern(rule):
+    """Return the regexp of a rule on its own, without groups.
+    """
+    if(rule.kind == CodeMatcher.RuleKind.Command):
+        return "^" + re.escape(rule.text) + r"\s+"
+    if(rule.kind == CodeMatcher.RuleKind.Keyword):
+        return r"\b" + re.escape(rule.text) + r"\b.*?"
+    return ""
+
+def naive_match(patterns, message):
+    """Try every rule's regexp in turn, as without the combined matcher.
+    """
+    for index, pattern in enumerate(patterns):
+        s = pattern.search(message)
+        if(s is not None):
+            return s.group(1).upper().replace(" ", "-").replace("_", "-"), index
+    return None
+
+def benchmark(rule_count, message_count):
+    """Return the messages per second of the combined matcher
+    and of one regexp per rule, for rule_count rules,
+    and the number of messages they disagree on.
+    """
+    rules = make_rules(rule_count)
+    messages = make_messages(message_count, rules)
+
+    matcher = CodeMatcher.MessageMatcher(rules, cache_size=0) # Every message scanned, like the naive way
+    start = time.perf_counter()
+    for message in messages:
+        matcher.match(message, "channel")
+    combined = message_count / (time.perf_counter() - start)
+
+    # Codes don't start in the middle of a word
+    patterns = [ re.compile(rule_pattern(rule) + "(?<![0-9A-Z])(" + CodeMatcher.code_re.pattern + ")", re.IGNORECASE)
+                 for rule in rules ]
+    start = time.perf_counter()
+    for message in messages:
+        naive_match(patterns, message)
+    naive = message_count / (time.perf_counter() - start)
+
+    mismatches = sum(1 for message in messages
+                     if matcher.match(message, "channel") != naive_match(patterns, message))
+
+    return { 'rules': rule_count, 'combined': combined, 'naive': naive,
+             'hits': sum(matcher.hits), 'mismatches': mismatches }
+
+
+if(__name__ == "__main__"):
+    message_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    random.seed(0)
+    for smm2_part in (0, 0.5, 1):
+        result = benchmark_formats(message_count, smm2_part)
+        print("{smm2_part:.0f}% SMM2 IDs: single pass {single:.0f} messages/s, "
+              "one scan per format {two_pass:.0f} messages/s, "
+              "with integer keys {keys:.0f} messages/s, {found} IDs".format(**result))
+
+    for rule_count in (1, 2, 4, 8, 16, 32, 64):
+        result = benchmark(rule_count, message_count)
+        print("{rules} rules: combined {combined:.0f} messages/s, "
+              "one regexp per rule {naive:.0f} messages/s, {mismatches} mismatches".format(**result))
@@ -0,0 +1,71 @@
+import os
+import sys
+import random
+import tracemalloc
+
+# Headless test: no window is shown
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from PySide import QtGui
+
+import TwitchTags
+import LevelListModel
+import MemoryUsage
+
+
+# Bytes per level not to go over, a bit above what they use now
+LEVEL_BUDGET = 700 # The Level objects, with their codes, names, dates, tags and view keys
+MODEL_BUDGET = 1400 # Everything in the model
+
+def chat_tags(user):
+    """Return the tags of a chat message of user, all of them like Twitch sends.
+    """
+    return TwitchTags.get_tags(
+        "badges=subscriber/12;color=#1E90FF;display-name=User{user};emotes=;id={id:032x};mod=0;room-id=1234;"
+        "subscriber={sub};tmi-sent-ts=1500000000000;turbo=0;user-id={user};user-type=".format(
+            user=user, id=random.getrandbits(128), sub=user % 2))
+
+def fill_model(count):
+    """Return a model with count levels from count // 3 users, and the bytes tracemalloc saw allocated.
+    """
+    model = LevelListModel.LevelListModel()
+    tracemalloc.start()
+    for i in range(count):
+        user = random.randint(0, count // 3)
+        code = ("{:04X}-" * 3 + "{:04X}").format(*[random.randint(0, 0xFFFF) for j in range(4)])
+        model.add_level(code, "user{}".format(user), chat_tags(user))
+    traced = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return model, traced
+
+def check(name, value, budget):
+    """Print a measure against its budget, return True if it is within it.
+    """
+    ok = value <= budget
+    print("{:30} {:>8.0f} bytes per level, budget {:>5} {}".format(name, value, budget, "ok" if ok else "OVER BUDGET"))
+    return ok
+
+
+if(__name__ == "__main__"):
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+    app = QtGui.QApplication(sys.argv[:1])
+    random.seed(0)
+    model, traced = fill_model(count)
+    usage = model.memory_usage()
+
+    ok = True
+    ok &= check("levels", usage['levels'] / count, LEVEL_BUDGET)
+    ok &= check("model", usage['per_level'], MODEL_BUDGET)
+    # memory_usage misses what it can't see (Qt side, allocator overhead): tracemalloc double-checks it
+    ok &= check("model (tracemalloc)", traced / count, int(MODEL_BUDGET * 1.2))
+
+    # The levels of a user share their tags
+    levels = list(model.levels_dict.values())
+    shared = len({ id(level.tags) for level in levels }) <= len({ level.user for level in levels })
+    print("tags shared by the levels of each user:", "ok" if shared else "NO")
+    ok &= shared
+
+    print("{} levels: {}".format(count, MemoryUsage.format_bytes(usage['total'])))
+    sys.exit(0 if ok else 1)
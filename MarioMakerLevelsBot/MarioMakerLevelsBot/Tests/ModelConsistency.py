@@ -0,0 +1,172 @@
+import os
+import sys
+import random
+import threading
+
+# Headless test: no window is shown
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from PySide import QtCore, QtGui
+
+import LevelListModel
+import LevelQueue
+import ChannelLevelModel
+
+
+DEADLOCK_TIMEOUT = 30 # Seconds before the threads are thought stuck
+
+def random_code():
+    return ("{:04X}-" * 3 + "{:04X}").format(*[random.randint(0, 0xFFFF) for j in range(4)])
+
+def check(name, ok):
+    """Print the result of a check, return ok.
+    """
+    print("{:50} {}".format(name, "ok" if ok else "FAILED"))
+    return ok
+
+def check_no_deadlock(count):
+    """add_level in a chat thread while the GUI thread removes rows: the locks are always
+    taken in the same order, neither thread waits forever.
+    """
+    model = LevelListModel.LevelListModel()
+    for i in range(100):
+        model.add_level(random_code(), "user{}".format(i))
+
+    def chat():
+        for i in range(count):
+            model.add_level(random_code(), "user{}".format(i))
+    thread = threading.Thread(target=chat)
+    thread.setDaemon(True)
+    thread.start()
+
+    def gui():
+        while(thread.is_alive()):
+            rows = model.rowCount()
+            if(rows > 2):
+                model.remove_indexes([ model.index(random.randrange(rows - 1), 0) ])
+    remover = threading.Thread(target=gui)
+    remover.setDaemon(True)
+    remover.start()
+
+    thread.join(DEADLOCK_TIMEOUT)
+    remover.join(DEADLOCK_TIMEOUT)
+    return check("add_level and remove_indexes at once", not thread.is_alive() and not remover.is_alive())
+
+def consistent(model):
+    """Return True if the view shows each level of the model at most once, and only those.
+    """
+    shown = [ model.data(model.index(row, 0), LevelListModel.Level) for row in range(model.rowCount()) ]
+    return (len(set(map(id, shown))) == len(shown)
+            and all(model.levels_dict.get(level.code, None) is level for level in shown))
+
+def check_add_levels_repeats():
+    """add_levels of a batch where codes come back, as themselves or as near-duplicates:
+    each level is shown once, and all of them can be removed.
+    """
+    source = LevelListModel.LevelListModel()
+    for code in ("0000-0000-0000-0001", "0000-0000-0000-0002", "1111-1111-1111-1111"):
+        source.add_level(code, "user")
+    levels = list(source.levels_dict.values())
+    batch = levels + levels[:1] + levels
+
+    ok = True
+    for group in (False, True):
+        model = LevelListModel.LevelListModel()
+        model.set_group_near_duplicates(group)
+        model.add_level("2222-2222-2222-2222", "user") # Not in the batches, its row stays
+        model.add_levels(batch + [ levels[2] ] * 2 + list(source.levels_dict.values()))
+        model.add_levels(batch) # All of them in already
+        expected = 3 if group else 4 # Near-duplicates grouped into one level
+        ok &= check("add_levels with repeats, grouping {}".format("on" if group else "off"),
+                    consistent(model) and model.rowCount() == expected == len(model.levels_dict))
+        model.remove_indexes([ model.index(row, 0) for row in range(model.rowCount()) ])
+        ok &= check("  then removing all the levels", model.rowCount() == 0 and not model.levels_dict)
+    return ok
+def check_variant_in_queue():
+    """A queued level whose code becomes one of its variants: the queue still finds it,
+    and removing it takes it out of the queue.
+    """
+    queue = LevelQueue.LevelQueue()
+    model = LevelListModel.LevelListModel()
+    model.set_group_near_duplicates(True)
+    model.set_queue(queue)
+    model.add_level("0000-0000-0000-0001", "user")
+    model.add_level("1111-1111-1111-1111", "other")
+    level = model.levels_dict["0000-0000-0000-0001"]
+    for i in range(2): # The variant becomes the most requested code
+        model.add_level("0000-0000-0000-0002", "user{}".format(i))
+    queue.push(level) # Already in, under its new code
+
+    ok = check("queued level renamed by a variant",
+               level.code == "0000-0000-0000-0002" and len(queue) == 2 and queue.position(level) == 1)
+    model.remove_indexes([ model.index(model.row_of_level(level), 0) ])
+    ok &= check("  then removed from the queue too",
+                len(queue) == 1 and queue.position(level) is None and queue.next()[1] is not level)
+    return ok
+
+def check_channels_threads(count):
+    """Levels added to a channel in a chat thread while the GUI thread removes levels
+    of another channel: the rows signals of the combined view, played again on a list,
+    give the rows shown.
+    """
+    model = ChannelLevelModel.ChannelLevelModel()
+    for i in range(100):
+        model.add_level(random_code(), "user{}".format(i), channel="gui")
+
+    def shown():
+        return [ model.data(model.index(row, 0), LevelListModel.Level) for row in range(model.rowCount()) ]
+    mirror = shown()
+    def inserted(parent, first, last):
+        mirror[first:first] = [ model.data(model.index(row, 0), LevelListModel.Level) for row in range(first, last + 1) ]
+    def removed(parent, first, last):
+        del mirror[first:last + 1]
+    def moved(parent, first, last, destination_parent, destination):
+        levels = mirror[first:last + 1]
+        del mirror[first:last + 1]
+        if(destination > first):
+            destination -= len(levels)
+        mirror[destination:destination] = levels
+    def reset():
+        mirror[:] = shown()
+    for signal, slot in ((model.rowsInserted, inserted), (model.rowsRemoved, removed),
+                         (model.rowsMoved, moved), (model.modelReset, reset)):
+        signal.connect(slot, QtCore.Qt.DirectConnection)
+
+    def chat():
+        for i in range(count):
+            model.add_level(random_code(), "user{}".format(i), channel="chat")
+    thread = threading.Thread(target=chat)
+    thread.setDaemon(True)
+    thread.start()
+
+    def gui():
+        gui_levels = model.partition("gui")
+        while(thread.is_alive() and gui_levels.view_list):
+            level = random.choice(gui_levels.view_list)
+            row = model.row_of_level(level)
+            if(row is not None):
+                model.remove_indexes([ model.index(row, 0) ])
+    remover = threading.Thread(target=gui)
+    remover.setDaemon(True)
+    remover.start()
+
+    thread.join(DEADLOCK_TIMEOUT)
+    remover.join(DEADLOCK_TIMEOUT)
+    ok = not thread.is_alive() and not remover.is_alive()
+    return check("channels changed by two threads at once", ok and mirror == shown())
+
+
+if(__name__ == "__main__"):
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+    app = QtGui.QApplication(sys.argv[:1])
+    random.seed(0)
+
+    ok = True
+    ok &= check_add_levels_repeats()
+    ok &= check_variant_in_queue()
+    ok &= check_no_deadlock(count)
+    ok &= check_channels_threads(count // 10)
+    # Exit right away, the threads may still be stuck
+    os._exit(0 if ok else 1)
@@ -0,0 +1,82 @@
+import os
+import sys
+import time
+import random
+
+# Headless benchmark: no window is shown
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from PySide import QtCore, QtGui
+
+import LevelListModel
+
+
+def random_code():
+    """Return a random Mario Maker-like code.
+    """
+    return ("{:04X}-" * 3 + "{:04X}").format(random.randint(0, 0xFFFF),
+                                             random.randint(0, 0xFFFF),
+                                             random.randint(0, 0xFFFF),
+                                             random.randint(0, 0xFFFF))
+
+def fill_model(model, count):
+    """Add count random levels to the model, with random privileges.
+    """
+    for i in range(count):
+        tags = {'subscriber': random.random() < 0.3,
+                'user-type': random.choice((0, 0, 0, 1)),
+                'display-name': "user{}".format(i)}
+        model.add_level(random_code(), "user{}".format(i), tags)
+
+def benchmark_data(model, rows, frames):
+    """Return the average milliseconds spent in model.data for a screen of rows,
+    without the Qt painting.
+    """
+    indexes = [ model.index(row, col) for row in range(rows) for col in range(model.columnCount()) ]
+    roles = (QtCore.Qt.DisplayRole, QtCore.Qt.TextColorRole)
+    start = time.perf_counter()
+    for frame in range(frames):
+        for index in indexes:
+            for role in roles:
+                model.data(index, role)
+    return (time.perf_counter() - start) / frames * 1000
+
+def benchmark(view, frames):
+    """Return the average milliseconds to repaint the view and to scroll it by a page.
+    """
+    viewport = view.viewport()
+    start = time.perf_counter()
+    for frame in range(frames):
+        viewport.repaint()
+    repaint = (time.perf_counter() - start) / frames * 1000
+
+    scrollbar = view.verticalScrollBar()
+    start = time.perf_counter()
+    for frame in range(frames):
+        scrollbar.setValue((frame * scrollbar.pageStep()) % (scrollbar.maximum() + 1))
+        viewport.repaint()
+    scroll = (time.perf_counter() - start) / frames * 1000
+
+    return repaint, scroll
+
+
+if(__name__ == "__main__"):
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    frames = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    app = QtGui.QApplication(sys.argv)
+    model = LevelListModel.LevelListModel()
+    fill_model(model, count)
+
+    view = QtGui.QTableView()
+    view.setModel(model)
+    view.resize(1000, 700)
+    view.show()
+    app.processEvents()
+
+    data = benchmark_data(model, 30, frames)
+    repaint, scroll = benchmark(view, frames)
+    print("{count} levels: data {data:.2f} ms/screen, repaint {repaint:.2f} ms/frame, "
+          "scroll {scroll:.2f} ms/frame".format(
+              count=count, data=data, repaint=repaint, scroll=scroll))
@@ -0,0 +1,130 @@
+import os
+import sys
+import time
+import random
+import shutil
+import tempfile
+import threading
+import multiprocessing
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import CodeMatcher
+import SharedFakeStore
+
+
+WRITERS = 3 # Processes writing at once
+BATCHES = 100 # Batches of codes added by each writer
+BATCH_SIZE = 50
+KILL_TIMEOUT = 10 # Seconds a reader may wait for the lock of a killed writer
+
+def random_key(generator):
+    return CodeMatcher.encode_code("{:016X}".format(generator.getrandbits(63)))
+
+def check(name, ok):
+    """Print the result of a check, return ok.
+    """
+    print("{:50} {}".format(name, "ok" if ok else "FAILED"))
+    return ok
+
+def _write_codes(filename, seed):
+    """Writer process: adds BATCHES batches of random codes to a small store,
+    growing it many times.
+    """
+    store = SharedFakeStore.SharedFakeStore(filename, capacity=16)
+    generator = random.Random(seed)
+    for i in range(BATCHES):
+        store.add_many([ random_key(generator) for j in range(BATCH_SIZE) ])
+    store.close()
+
+def _die_writing(filename, key, writing):
+    """Writer process killed in the middle of a write: the sequence number is odd,
+    the slot written but not counted, and the lock held.
+    """
+    store = SharedFakeStore.SharedFakeStore(filename)
+
+    def change():
+        index = store._find(key, store.table)[0]
+        id_format, value = CodeMatcher.split_key(key)
+        store.SLOT.pack_into(store.table, index * store.SLOT.size, store.USED + id_format, value)
+        writing.set()
+        time.sleep(60) # Killed meanwhile
+
+    with store._lock():
+        store._write(change)
+
+def check_readers_during_writes(directory):
+    """Threads of this process look codes up while other processes add codes
+    and grow the table: the codes are always found, and the codes of the other processes
+    are seen once they are done.
+    """
+    filename = os.path.join(directory, "grow.bin")
+    store = SharedFakeStore.SharedFakeStore(filename, capacity=16)
+    generator = random.Random(0)
+    mine = [ random_key(generator) for i in range(100) ]
+    store.add_many(mine)
+
+    misses = []
+    writers = [ multiprocessing.Process(target=_write_codes, args=(filename, seed)) for seed in range(1, WRITERS + 1) ]
+    def read():
+        while(any(writer.is_alive() for writer in writers)):
+            misses.extend(key for key in mine if not store.contains(key))
+    readers = [ threading.Thread(target=read) for i in range(3) ]
+
+    for writer in writers:
+        writer.start()
+    for reader in readers:
+        reader.start()
+    for writer in writers:
+        writer.join()
+    for reader in readers:
+        reader.join()
+
+    theirs = []
+    for seed in range(1, WRITERS + 1):
+        generator = random.Random(seed)
+        theirs.extend(random_key(generator) for i in range(BATCHES * BATCH_SIZE))
+
+    ok = check("codes read while other processes write", not misses)
+    ok &= check("  table grown past its capacity", store.generation > 1 and len(store.table) // store.SLOT.size > 16)
+    ok &= check("  codes of the other processes seen",
+                all(store.contains(key) for key in theirs) and len(store) == len(set(mine + theirs)))
+    store.close()
+    return ok
+
+def check_writer_killed(directory):
+    """A writer killed while holding the lock: the readers don't wait forever,
+    and the next writer repairs the counts.
+    """
+    filename = os.path.join(directory, "killed.bin")
+    store = SharedFakeStore.SharedFakeStore(filename)
+    generator = random.Random(0)
+    keys = [ random_key(generator) for i in range(11) ]
+    store.add_many(keys[:10])
+
+    writing = multiprocessing.Event()
+    writer = multiprocessing.Process(target=_die_writing, args=(filename, keys[10], writing))
+    writer.start()
+    writing.wait()
+    writer.kill()
+    writer.join()
+
+    start = time.perf_counter()
+    found = store.contains(keys[0]) and store.contains(keys[10])
+    ok = check("reader after a writer was killed", found and time.perf_counter() - start < KILL_TIMEOUT)
+    ok &= check("  store repaired", len(store) == 11 and not store.sequence() & 1)
+    store.add(random_key(generator))
+    ok &= check("  then written again", len(store) == 12 and not store.sequence() & 1)
+    store.close()
+    return ok
+
+
+if(__name__ == "__main__"):
+    directory = tempfile.mkdtemp()
+    try:
+        ok = True
+        ok &= check_readers_during_writes(directory)
+        ok &= check_writer_killed(directory)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    sys.exit(0 if ok else 1)
@@ -1,4 +1,7 @@
-﻿import enum
+﻿import re
+import sys
+import enum
+import weakref
 
 
 class user_type(enum.IntEnum):
@@ -20,6 +23,22 @@ def user_type__new__(cls, value):
 setattr(user_type, "__new__", user_type__new__)
 
 
+_ESCAPES = { ":": ";", "s": " ", "\\": "\\", "r": "\r", "n": "\n" }
+_escape_re = re.compile(r"\\(.?)")
+
+def parse_tags(string):
+    """Return the tags of any IRC message as a dict of strings, values unescaped.
+    Unlike get_tags, doesn't expect the tags of a chat message.
+    """
+    tags = {}
+    for tag in string.lstrip("@").split(";"):
+        key, equal, value = tag.partition("=")
+        if("\\" in value):
+            value = _escape_re.sub(lambda x: _ESCAPES.get(x.group(1), x.group(1)), value)
+        tags[key] = value
+    return tags
+
+
 def get_tags(string, channel=None):
     tags = dict({(x.split("=")[0], x.split("=")[1])
                  for x in string.split(";")})
@@ -32,3 +51,63 @@ def get_tags(string, channel=None):
     tags['user-type'] = user_type(tags['user-type'])
 
     return tags
+
+
+class CompactTags(object):
+    """The tags of a message kept with a level: subscriber, user-type and display-name.
+    The rest (badges, color, emotes, message id...) is never read again once the level is added.
+
+    Immutable and interned by compact_tags: all the levels of a user share one instance.
+    Reads like the tags dict (tags.get('subscriber'), tags['display-name']).
+    """
+
+    __slots__ = ("subscriber", "user_type", "display_name", "__weakref__")
+
+    _KEYS = { 'subscriber': "subscriber", 'user-type': "user_type", 'display-name': "display_name" }
+    _interned = weakref.WeakValueDictionary() # Key: (subscriber, user type, display name)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, self._KEYS[key])
+        except KeyError:
+            raise KeyError(key) from None
+
+    def __contains__(self, key):
+        return key in self._KEYS
+
+    def get(self, key, default=None):
+        attribute = self._KEYS.get(key, None)
+        return default if attribute is None else getattr(self, attribute)
+
+    def items(self):
+        return [ (key, getattr(self, attribute)) for key, attribute in self._KEYS.items() ]
+
+    def __reduce__(self):
+        # Interned again when unpickled
+        return (_intern_tags, (self.subscriber, self.user_type, self.display_name))
+
+
+def _intern_tags(subscriber, user_type, display_name):
+    """Return the CompactTags of these values, created if no level uses them yet.
+    """
+    key = (subscriber, user_type, display_name)
+    tags = CompactTags._interned.get(key, None)
+    if(tags is None):
+        tags = object.__new__(CompactTags)
+        tags.subscriber = subscriber
+        tags.user_type = user_type
+        tags.display_name = display_name
+        CompactTags._interned[key] = tags
+    return tags
+
+def compact_tags(tags):
+    """Return the CompactTags of a tags dict (from get_tags or parse_tags), or None if tags is None.
+    """
+    if(tags is None or isinstance(tags, CompactTags)):
+        return tags
+    return _intern_tags(bool(tags.get('subscriber', False)),
+                        user_type(tags.get('user-type', 0) or 0),
+                        sys.intern(tags.get('display-name', "")))
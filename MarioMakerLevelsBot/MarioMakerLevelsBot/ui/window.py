@@ -34,6 +34,15 @@ class Ui_MainWindow(object):
         self.channel_lineedit = QtGui.QLineEdit(self.widget)
         self.channel_lineedit.setObjectName("channel_lineedit")
         self.horizontalLayout.addWidget(self.channel_lineedit)
+        self.matching_rules_label = QtGui.QLabel(self.widget)
+        self.matching_rules_label.setObjectName("matching_rules_label")
+        self.horizontalLayout.addWidget(self.matching_rules_label)
+        self.matching_rules_lineedit = QtGui.QLineEdit(self.widget)
+        self.matching_rules_lineedit.setObjectName("matching_rules_lineedit")
+        self.horizontalLayout.addWidget(self.matching_rules_lineedit)
+        self.repeats_combobox = QtGui.QComboBox(self.widget)
+        self.repeats_combobox.setObjectName("repeats_combobox")
+        self.horizontalLayout.addWidget(self.repeats_combobox)
         self.verticalLayout_2.addWidget(self.widget)
         self.groupBox = QtGui.QGroupBox(self.irc_info_tab)
         self.groupBox.setObjectName("groupBox")
@@ -71,6 +80,9 @@ class Ui_MainWindow(object):
         self.connect_button = QtGui.QPushButton(self.widget_6)
         self.connect_button.setObjectName("connect_button")
         self.horizontalLayout_6.addWidget(self.connect_button)
+        self.separate_process_checkbox = QtGui.QCheckBox(self.widget_6)
+        self.separate_process_checkbox.setObjectName("separate_process_checkbox")
+        self.horizontalLayout_6.addWidget(self.separate_process_checkbox)
         spacerItem = QtGui.QSpacerItem(40, 20, QtGui.QSizePolicy.Expanding, QtGui.QSizePolicy.Minimum)
         self.horizontalLayout_6.addItem(spacerItem)
         self.verticalLayout_2.addWidget(self.widget_6)
@@ -89,6 +101,9 @@ class Ui_MainWindow(object):
         self.label_4 = QtGui.QLabel(self.widget_3)
         self.label_4.setObjectName("label_4")
         self.verticalLayout_3.addWidget(self.label_4)
+        self.levels_search_lineedit = QtGui.QLineEdit(self.widget_3)
+        self.levels_search_lineedit.setObjectName("levels_search_lineedit")
+        self.verticalLayout_3.addWidget(self.levels_search_lineedit)
         self.find_codes_checkbox = QtGui.QCheckBox(self.widget_3)
         self.find_codes_checkbox.setObjectName("find_codes_checkbox")
         self.verticalLayout_3.addWidget(self.find_codes_checkbox)
@@ -104,14 +119,62 @@ class Ui_MainWindow(object):
         self.mods_only_checkbox = QtGui.QCheckBox(self.widget_3)
         self.mods_only_checkbox.setObjectName("mods_only_checkbox")
         self.verticalLayout_3.addWidget(self.mods_only_checkbox)
+        self.hide_played_checkbox = QtGui.QCheckBox(self.widget_3)
+        self.hide_played_checkbox.setObjectName("hide_played_checkbox")
+        self.verticalLayout_3.addWidget(self.hide_played_checkbox)
+        self.group_near_duplicates_checkbox = QtGui.QCheckBox(self.widget_3)
+        self.group_near_duplicates_checkbox.setObjectName("group_near_duplicates_checkbox")
+        self.verticalLayout_3.addWidget(self.group_near_duplicates_checkbox)
+        self.hot_sort_checkbox = QtGui.QCheckBox(self.widget_3)
+        self.hot_sort_checkbox.setObjectName("hot_sort_checkbox")
+        self.verticalLayout_3.addWidget(self.hot_sort_checkbox)
+        self.queue_mode_checkbox = QtGui.QCheckBox(self.widget_3)
+        self.queue_mode_checkbox.setObjectName("queue_mode_checkbox")
+        self.verticalLayout_3.addWidget(self.queue_mode_checkbox)
+        self.viewer_quota_spinbox = QtGui.QSpinBox(self.widget_3)
+        self.viewer_quota_spinbox.setObjectName("viewer_quota_spinbox")
+        self.verticalLayout_3.addWidget(self.viewer_quota_spinbox)
+        self.sub_quota_spinbox = QtGui.QSpinBox(self.widget_3)
+        self.sub_quota_spinbox.setObjectName("sub_quota_spinbox")
+        self.verticalLayout_3.addWidget(self.sub_quota_spinbox)
+        self.mod_quota_spinbox = QtGui.QSpinBox(self.widget_3)
+        self.mod_quota_spinbox.setObjectName("mod_quota_spinbox")
+        self.verticalLayout_3.addWidget(self.mod_quota_spinbox)
+        self.remove_moderated_checkbox = QtGui.QCheckBox(self.widget_3)
+        self.remove_moderated_checkbox.setObjectName("remove_moderated_checkbox")
+        self.verticalLayout_3.addWidget(self.remove_moderated_checkbox)
         spacerItem2 = QtGui.QSpacerItem(20, 40, QtGui.QSizePolicy.Minimum, QtGui.QSizePolicy.Expanding)
         self.verticalLayout_3.addItem(spacerItem2)
         self.select_random_button = QtGui.QPushButton(self.widget_3)
         self.select_random_button.setObjectName("select_random_button")
         self.verticalLayout_3.addWidget(self.select_random_button)
+        self.random_strategy_combobox = QtGui.QComboBox(self.widget_3)
+        self.random_strategy_combobox.setObjectName("random_strategy_combobox")
+        self.verticalLayout_3.addWidget(self.random_strategy_combobox)
+        self.current_level_label = QtGui.QLabel(self.widget_3)
+        self.current_level_label.setObjectName("current_level_label")
+        self.verticalLayout_3.addWidget(self.current_level_label)
+        self.next_level_button = QtGui.QPushButton(self.widget_3)
+        self.next_level_button.setObjectName("next_level_button")
+        self.verticalLayout_3.addWidget(self.next_level_button)
+        self.skip_level_button = QtGui.QPushButton(self.widget_3)
+        self.skip_level_button.setObjectName("skip_level_button")
+        self.verticalLayout_3.addWidget(self.skip_level_button)
+        self.requeue_level_button = QtGui.QPushButton(self.widget_3)
+        self.requeue_level_button.setObjectName("requeue_level_button")
+        self.verticalLayout_3.addWidget(self.requeue_level_button)
         self.open_in_brower_button = QtGui.QPushButton(self.widget_3)
         self.open_in_brower_button.setObjectName("open_in_brower_button")
         self.verticalLayout_3.addWidget(self.open_in_brower_button)
+        self.mark_played_button = QtGui.QPushButton(self.widget_3)
+        self.mark_played_button.setObjectName("mark_played_button")
+        self.verticalLayout_3.addWidget(self.mark_played_button)
+        self.trending_label = QtGui.QLabel(self.widget_3)
+        self.trending_label.setObjectName("trending_label")
+        self.verticalLayout_3.addWidget(self.trending_label)
+        self.trending_listwidget = QtGui.QListWidget(self.widget_3)
+        self.trending_listwidget.setObjectName("trending_listwidget")
+        self.verticalLayout_3.addWidget(self.trending_listwidget)
         spacerItem3 = QtGui.QSpacerItem(20, 40, QtGui.QSizePolicy.Minimum, QtGui.QSizePolicy.Expanding)
         self.verticalLayout_3.addItem(spacerItem3)
         self.save_level_button = QtGui.QPushButton(self.widget_3)
@@ -123,6 +186,9 @@ class Ui_MainWindow(object):
         self.delete_level_button = QtGui.QPushButton(self.widget_3)
         self.delete_level_button.setObjectName("delete_level_button")
         self.verticalLayout_3.addWidget(self.delete_level_button)
+        self.delete_user_levels_button = QtGui.QPushButton(self.widget_3)
+        self.delete_user_levels_button.setObjectName("delete_user_levels_button")
+        self.verticalLayout_3.addWidget(self.delete_user_levels_button)
         spacerItem4 = QtGui.QSpacerItem(20, 40, QtGui.QSizePolicy.Minimum, QtGui.QSizePolicy.Expanding)
         self.verticalLayout_3.addItem(spacerItem4)
         self.reset_levels_button = QtGui.QPushButton(self.widget_3)
@@ -152,6 +218,9 @@ class Ui_MainWindow(object):
         self.label_5 = QtGui.QLabel(self.widget_4)
         self.label_5.setObjectName("label_5")
         self.verticalLayout_4.addWidget(self.label_5)
+        self.saved_search_lineedit = QtGui.QLineEdit(self.widget_4)
+        self.saved_search_lineedit.setObjectName("saved_search_lineedit")
+        self.verticalLayout_4.addWidget(self.saved_search_lineedit)
         self.delete_saved_button = QtGui.QPushButton(self.widget_4)
         self.delete_saved_button.setObjectName("delete_saved_button")
         self.verticalLayout_4.addWidget(self.delete_saved_button)
@@ -184,6 +253,9 @@ class Ui_MainWindow(object):
         self.label_6 = QtGui.QLabel(self.widget_5)
         self.label_6.setObjectName("label_6")
         self.verticalLayout_5.addWidget(self.label_6)
+        self.fakes_search_lineedit = QtGui.QLineEdit(self.widget_5)
+        self.fakes_search_lineedit.setObjectName("fakes_search_lineedit")
+        self.verticalLayout_5.addWidget(self.fakes_search_lineedit)
         self.delete_fake_button = QtGui.QPushButton(self.widget_5)
         self.delete_fake_button.setObjectName("delete_fake_button")
         self.verticalLayout_5.addWidget(self.delete_fake_button)
@@ -192,6 +264,12 @@ class Ui_MainWindow(object):
         self.reset_fakes_button = QtGui.QPushButton(self.widget_5)
         self.reset_fakes_button.setObjectName("reset_fakes_button")
         self.verticalLayout_5.addWidget(self.reset_fakes_button)
+        self.import_fakes_button = QtGui.QPushButton(self.widget_5)
+        self.import_fakes_button.setObjectName("import_fakes_button")
+        self.verticalLayout_5.addWidget(self.import_fakes_button)
+        self.imported_fakes_label = QtGui.QLabel(self.widget_5)
+        self.imported_fakes_label.setObjectName("imported_fakes_label")
+        self.verticalLayout_5.addWidget(self.imported_fakes_label)
         self.horizontalLayout_5.addWidget(self.widget_5)
         self.fakes_tableView = QtGui.QTableView(self.fake_tab)
         self.fakes_tableView.setEditTriggers(QtGui.QAbstractItemView.NoEditTriggers)
@@ -219,8 +297,34 @@ class Ui_MainWindow(object):
         MainWindow.setStatusBar(self.statusbar)
         self.actionQuit = QtGui.QAction(MainWindow)
         self.actionQuit.setObjectName("actionQuit")
+        self.actionExportLevels = QtGui.QAction(MainWindow)
+        self.actionExportLevels.setObjectName("actionExportLevels")
+        self.actionExportSaved = QtGui.QAction(MainWindow)
+        self.actionExportSaved.setObjectName("actionExportSaved")
+        self.actionExportFakes = QtGui.QAction(MainWindow)
+        self.actionExportFakes.setObjectName("actionExportFakes")
+        self.actionProfile = QtGui.QAction(MainWindow)
+        self.actionProfile.setCheckable(True)
+        self.actionProfile.setObjectName("actionProfile")
+        self.actionProfileMemory = QtGui.QAction(MainWindow)
+        self.actionProfileMemory.setCheckable(True)
+        self.actionProfileMemory.setObjectName("actionProfileMemory")
+        self.actionMemoryUsage = QtGui.QAction(MainWindow)
+        self.actionMemoryUsage.setObjectName("actionMemoryUsage")
+        self.actionOverlayServer = QtGui.QAction(MainWindow)
+        self.actionOverlayServer.setCheckable(True)
+        self.actionOverlayServer.setObjectName("actionOverlayServer")
         self.actionAbout = QtGui.QAction(MainWindow)
         self.actionAbout.setObjectName("actionAbout")
+        self.menuFile.addAction(self.actionExportLevels)
+        self.menuFile.addAction(self.actionExportSaved)
+        self.menuFile.addAction(self.actionExportFakes)
+        self.menuFile.addSeparator()
+        self.menuFile.addAction(self.actionProfile)
+        self.menuFile.addAction(self.actionProfileMemory)
+        self.menuFile.addAction(self.actionMemoryUsage)
+        self.menuFile.addAction(self.actionOverlayServer)
+        self.menuFile.addSeparator()
         self.menuFile.addAction(self.actionQuit)
         self.menuAbout.addAction(self.actionAbout)
         self.menubar.addAction(self.menuFile.menuAction())
@@ -235,35 +339,68 @@ class Ui_MainWindow(object):
         MainWindow.setWindowTitle(QtGui.QApplication.translate("MainWindow", "Mario Maker Levels", None, QtGui.QApplication.UnicodeUTF8))
         self.label.setText(QtGui.QApplication.translate("MainWindow", "Channel", None, QtGui.QApplication.UnicodeUTF8))
         self.channel_lineedit.setToolTip(QtGui.QApplication.translate("MainWindow", "The name of the channel to pull Mario Maker levels from", None, QtGui.QApplication.UnicodeUTF8))
+        self.matching_rules_label.setText(QtGui.QApplication.translate("MainWindow", "Matching rules", None, QtGui.QApplication.UnicodeUTF8))
+        self.matching_rules_lineedit.setToolTip(QtGui.QApplication.translate("MainWindow", "Rules separated by semicolons: code (a code anywhere), !add (a command followed by a code), keyword:word (a word followed by a code). Add @channel to a rule to use it in some channels only.", None, QtGui.QApplication.UnicodeUTF8))
+        self.matching_rules_lineedit.setPlaceholderText(QtGui.QApplication.translate("MainWindow", "code", None, QtGui.QApplication.UnicodeUTF8))
+        self.repeats_combobox.setToolTip(QtGui.QApplication.translate("MainWindow", "How the copies of a message pasted again and again in chat count toward the times its level was requested", None, QtGui.QApplication.UnicodeUTF8))
         self.groupBox.setTitle(QtGui.QApplication.translate("MainWindow", "Twitch account to connect to chat", None, QtGui.QApplication.UnicodeUTF8))
         self.label_2.setText(QtGui.QApplication.translate("MainWindow", "Name", None, QtGui.QApplication.UnicodeUTF8))
         self.label_3.setText(QtGui.QApplication.translate("MainWindow", "Oauth", None, QtGui.QApplication.UnicodeUTF8))
         self.oauth_help_button.setText(QtGui.QApplication.translate("MainWindow", "?", None, QtGui.QApplication.UnicodeUTF8))
         self.connect_button.setText(QtGui.QApplication.translate("MainWindow", "Connect", None, QtGui.QApplication.UnicodeUTF8))
+        self.separate_process_checkbox.setText(QtGui.QApplication.translate("MainWindow", "Read chat in a separate process", None, QtGui.QApplication.UnicodeUTF8))
         self.tabWidget.setTabText(self.tabWidget.indexOf(self.irc_info_tab), QtGui.QApplication.translate("MainWindow", "Twich chat info", None, QtGui.QApplication.UnicodeUTF8))
         self.label_4.setText(QtGui.QApplication.translate("MainWindow", "Controls", None, QtGui.QApplication.UnicodeUTF8))
+        self.levels_search_lineedit.setPlaceholderText(QtGui.QApplication.translate("MainWindow", "Search code or user", None, QtGui.QApplication.UnicodeUTF8))
         self.find_codes_checkbox.setText(QtGui.QApplication.translate("MainWindow", "Find codes from chat", None, QtGui.QApplication.UnicodeUTF8))
         self.hide_likely_fakes_checkbox.setText(QtGui.QApplication.translate("MainWindow", "Hide levels on fakes list", None, QtGui.QApplication.UnicodeUTF8))
         self.hide_potentially_checkbox.setText(QtGui.QApplication.translate("MainWindow", "Hide potentially fakes", None, QtGui.QApplication.UnicodeUTF8))
         self.subs_only_checkbox.setText(QtGui.QApplication.translate("MainWindow", "Show levels from subs only", None, QtGui.QApplication.UnicodeUTF8))
         self.mods_only_checkbox.setText(QtGui.QApplication.translate("MainWindow", "Show levels from mods only", None, QtGui.QApplication.UnicodeUTF8))
+        self.hide_played_checkbox.setText(QtGui.QApplication.translate("MainWindow", "Hide levels already played", None, QtGui.QApplication.UnicodeUTF8))
+        self.group_near_duplicates_checkbox.setText(QtGui.QApplication.translate("MainWindow", "Group codes differing by one digit", None, QtGui.QApplication.UnicodeUTF8))
+        self.hot_sort_checkbox.setText(QtGui.QApplication.translate("MainWindow", "Sort the hottest levels first", None, QtGui.QApplication.UnicodeUTF8))
+        self.queue_mode_checkbox.setText(QtGui.QApplication.translate("MainWindow", "Queue mode (first come, first served)", None, QtGui.QApplication.UnicodeUTF8))
+        self.viewer_quota_spinbox.setSpecialValueText(QtGui.QApplication.translate("MainWindow", "Levels per viewer: no limit", None, QtGui.QApplication.UnicodeUTF8))
+        self.viewer_quota_spinbox.setPrefix(QtGui.QApplication.translate("MainWindow", "Levels per viewer: ", None, QtGui.QApplication.UnicodeUTF8))
+        self.sub_quota_spinbox.setSpecialValueText(QtGui.QApplication.translate("MainWindow", "Levels per sub: no limit", None, QtGui.QApplication.UnicodeUTF8))
+        self.sub_quota_spinbox.setPrefix(QtGui.QApplication.translate("MainWindow", "Levels per sub: ", None, QtGui.QApplication.UnicodeUTF8))
+        self.mod_quota_spinbox.setSpecialValueText(QtGui.QApplication.translate("MainWindow", "Levels per mod: no limit", None, QtGui.QApplication.UnicodeUTF8))
+        self.mod_quota_spinbox.setPrefix(QtGui.QApplication.translate("MainWindow", "Levels per mod: ", None, QtGui.QApplication.UnicodeUTF8))
+        self.remove_moderated_checkbox.setText(QtGui.QApplication.translate("MainWindow", "Remove the levels of banned users and deleted messages", None, QtGui.QApplication.UnicodeUTF8))
         self.select_random_button.setText(QtGui.QApplication.translate("MainWindow", "Select random", None, QtGui.QApplication.UnicodeUTF8))
         self.open_in_brower_button.setText(QtGui.QApplication.translate("MainWindow", "Open level in browser", None, QtGui.QApplication.UnicodeUTF8))
+        self.mark_played_button.setText(QtGui.QApplication.translate("MainWindow", "Mark selected level(s) as played", None, QtGui.QApplication.UnicodeUTF8))
+        self.trending_label.setText(QtGui.QApplication.translate("MainWindow", "Most requested right now", None, QtGui.QApplication.UnicodeUTF8))
         self.save_level_button.setText(QtGui.QApplication.translate("MainWindow", "Add selected level(s) to saved list", None, QtGui.QApplication.UnicodeUTF8))
         self.fake_level_button.setText(QtGui.QApplication.translate("MainWindow", "Add selected level(s) to fakes list", None, QtGui.QApplication.UnicodeUTF8))
         self.delete_level_button.setText(QtGui.QApplication.translate("MainWindow", "Delete selected level(s)", None, QtGui.QApplication.UnicodeUTF8))
+        self.delete_user_levels_button.setText(QtGui.QApplication.translate("MainWindow", "Delete the selected user's levels", None, QtGui.QApplication.UnicodeUTF8))
         self.reset_levels_button.setText(QtGui.QApplication.translate("MainWindow", "Reset levels list", None, QtGui.QApplication.UnicodeUTF8))
         self.tabWidget.setTabText(self.tabWidget.indexOf(self.levels_tab), QtGui.QApplication.translate("MainWindow", "Levels List", None, QtGui.QApplication.UnicodeUTF8))
         self.label_5.setText(QtGui.QApplication.translate("MainWindow", "Controls", None, QtGui.QApplication.UnicodeUTF8))
+        self.saved_search_lineedit.setPlaceholderText(QtGui.QApplication.translate("MainWindow", "Search code or user", None, QtGui.QApplication.UnicodeUTF8))
         self.delete_saved_button.setText(QtGui.QApplication.translate("MainWindow", "Delete selected saved level(s)", None, QtGui.QApplication.UnicodeUTF8))
         self.reset_saved_button.setText(QtGui.QApplication.translate("MainWindow", "Reset saved list", None, QtGui.QApplication.UnicodeUTF8))
         self.tabWidget.setTabText(self.tabWidget.indexOf(self.saved_tab), QtGui.QApplication.translate("MainWindow", "Saved levels list", None, QtGui.QApplication.UnicodeUTF8))
         self.label_6.setText(QtGui.QApplication.translate("MainWindow", "Controls", None, QtGui.QApplication.UnicodeUTF8))
+        self.fakes_search_lineedit.setPlaceholderText(QtGui.QApplication.translate("MainWindow", "Search code or user", None, QtGui.QApplication.UnicodeUTF8))
         self.delete_fake_button.setText(QtGui.QApplication.translate("MainWindow", "Delete selected fake level(s)", None, QtGui.QApplication.UnicodeUTF8))
         self.reset_fakes_button.setText(QtGui.QApplication.translate("MainWindow", "Reset fakes list", None, QtGui.QApplication.UnicodeUTF8))
+        self.import_fakes_button.setText(QtGui.QApplication.translate("MainWindow", "Import a fake codes list...", None, QtGui.QApplication.UnicodeUTF8))
         self.tabWidget.setTabText(self.tabWidget.indexOf(self.fake_tab), QtGui.QApplication.translate("MainWindow", "Fake levels list", None, QtGui.QApplication.UnicodeUTF8))
+        self.next_level_button.setText(QtGui.QApplication.translate("MainWindow", "Next level", None, QtGui.QApplication.UnicodeUTF8))
+        self.skip_level_button.setText(QtGui.QApplication.translate("MainWindow", "Skip level", None, QtGui.QApplication.UnicodeUTF8))
+        self.requeue_level_button.setText(QtGui.QApplication.translate("MainWindow", "Requeue level", None, QtGui.QApplication.UnicodeUTF8))
         self.menuFile.setTitle(QtGui.QApplication.translate("MainWindow", "File", None, QtGui.QApplication.UnicodeUTF8))
         self.menuAbout.setTitle(QtGui.QApplication.translate("MainWindow", "?", None, QtGui.QApplication.UnicodeUTF8))
         self.actionQuit.setText(QtGui.QApplication.translate("MainWindow", "Quit", None, QtGui.QApplication.UnicodeUTF8))
+        self.actionExportLevels.setText(QtGui.QApplication.translate("MainWindow", "Export levels list...", None, QtGui.QApplication.UnicodeUTF8))
+        self.actionExportSaved.setText(QtGui.QApplication.translate("MainWindow", "Export saved list...", None, QtGui.QApplication.UnicodeUTF8))
+        self.actionExportFakes.setText(QtGui.QApplication.translate("MainWindow", "Export fakes list...", None, QtGui.QApplication.UnicodeUTF8))
+        self.actionProfile.setText(QtGui.QApplication.translate("MainWindow", "Profile", None, QtGui.QApplication.UnicodeUTF8))
+        self.actionProfileMemory.setText(QtGui.QApplication.translate("MainWindow", "Profile with memory allocations (slow)", None, QtGui.QApplication.UnicodeUTF8))
+        self.actionMemoryUsage.setText(QtGui.QApplication.translate("MainWindow", "Memory usage", None, QtGui.QApplication.UnicodeUTF8))
+        self.actionOverlayServer.setText(QtGui.QApplication.translate("MainWindow", "Overlay server for OBS", None, QtGui.QApplication.UnicodeUTF8))
         self.actionAbout.setText(QtGui.QApplication.translate("MainWindow", "About", None, QtGui.QApplication.UnicodeUTF8))
 